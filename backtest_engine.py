@@ -1,59 +1,125 @@
 import numpy as np
 import pandas as pd
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
 import datetime
-from sw import SwingIndex
+from sw import SwingIndex, SWING_COLUMNS
 from datetime import timedelta
 from broker import Broker
 from capital_manager import CapitalManager
-from position import SwingIndexPosition
-import mplfinance as mpf
-import yfinance as yf
-from settings import LONG, SHORT, INITIAL, api, tz
+from position import SwingIndexPosition, generate_signals, generate_signals_from_arrays, positions_to_trades, trades_to_positions
+from settings import LONG, SHORT, INITIAL, BAR_STORE_DIRECTORY, LIST_OF_SECURITIES_FILE, UNIVERSE_FILE, KEY_ID, SECRET_KEY, get_api, tz
+from bar_store import BarStore, default_timeframe
+from downloader import BarDownloader, AiohttpTransport
+from sweep import ParameterSweep
+from panel import Panel
+from shared_bars import SharedBars
+from universe import Universe
+from portfolio import PortfolioSimulator
+from ledger import TradeLedger
+from trade_stats import trade_statistics
+from charts import marker_series, render_chart, render_charts
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # Number of assets to sample from the list of tradable assets
 N = 500
 
-# Instantiate client used for fetching historical data
-client = StockHistoricalDataClient("AKI29DKDVUCK0HHOWS29","exq36aNVg61VtaAhoiJnuBYofXvbNtGkaBYplDC0")
+# downloader used for fetching historical data (one pooled connection for every request), created on first use
+_downloader = None
+
+
+def get_downloader() -> BarDownloader:
+    global _downloader
+    if _downloader is None:
+        _downloader = BarDownloader(AiohttpTransport(KEY_ID, SECRET_KEY))
+    return _downloader
+
 
 class Backtest():
-    def __init__(self):
-        pass
+    '''
+     - bar_store : where historical bars come from. By default they are cached on disk in BAR_STORE_DIRECTORY
+                   and only the missing date ranges are downloaded from Alpaca, in concurrent chunks. A bar store
+                   with a base timeframe (e.g. `BarStore(..., base_timeframe=TimeFrame.Minute)`) downloads minute
+                   bars once and resamples them to whatever timeframe is backtested.
+     - universe  : what the assets are sampled from. By default the index saved in UNIVERSE_FILE by
+                   `build_universe()`; without one, the active assets are listed from Alpaca on every sample.
+                   The availability of the sampled assets is refreshed whenever their bars are fetched (and saved
+                   back to UNIVERSE_FILE if that is where the index came from).
+    '''
+    def __init__(self, bar_store: BarStore = None, universe: Universe = None):
+        if bar_store is None:
+            bar_store = BarStore(BAR_STORE_DIRECTORY, get_downloader())
+        self.__universe_file = None
+        if universe is None and os.path.exists(UNIVERSE_FILE):
+            universe = Universe.load(UNIVERSE_FILE)
+            self.__universe_file = UNIVERSE_FILE
+        self.__bar_store = bar_store
+        self.__universe = universe
+
+    def build_universe(self, timeframe=None, start_date: pd.Timestamp = None, end_date: pd.Timestamp = None) -> Universe:
+        '''
+        Builds the universe index from LIST_OF_SECURITIES_FILE, the active assets on Alpaca and the bars in the
+        bar store, and saves it to UNIVERSE_FILE. Later backtests sample from it without any network call.
 
-    def sample_data(self, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=TimeFrame.Day):
-        # Each element is of type <class 'alpaca_trade_api.entity.Asset'>
-        active_assets = api.list_assets(status='active')
+        Parameters:
+            - start_date, end_date : range the bars of every tradable asset are downloaded for first, so assets that
+                                     were never backtested can be sampled (see `Universe.build()`)
+        '''
+        self.__universe = Universe.build(LIST_OF_SECURITIES_FILE, get_api().list_assets(status='active'), self.__bar_store,
+                                         default_timeframe(timeframe), start_date, end_date)
+        self.__universe.save(UNIVERSE_FILE)
+        self.__universe_file = UNIVERSE_FILE
+        return self.__universe
 
-        # Get subset of assets that are tradable, then the symbol
-        tradable_assets = [a for a in active_assets if a.tradable]
-        sample_tradable_assets = random.sample(tradable_assets, N)
-        sample_tradable_assets_symbols = [a.symbol for a in sample_tradable_assets]
-
-        # Define parameters to send to the server
-        request_params = StockBarsRequest(
-                        symbol_or_symbols=sample_tradable_assets_symbols,
-                        timeframe=timeframe,
-                        start=start_date,
-                        end=end_date
-        )
-        # Send request to the server, convert to dataframe
-        bars = client.get_stock_bars(request_params).df
+    def sample_data(self, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=None, seed=None):
+        sample_tradable_assets_symbols = self.__sample_symbols(start_date, end_date, seed)
+
+        # Fetch the bars that are not cached yet, convert to dataframe
+        bars = self.__bar_store.get_bars(sample_tradable_assets_symbols, start_date, end_date, default_timeframe(timeframe))
+
+        self.__refresh_universe(sample_tradable_assets_symbols, default_timeframe(timeframe))
 
         # deal with assets that did not have historical data
-        for i in range(len(sample_tradable_assets_symbols)):
-            asset = sample_tradable_assets_symbols[i]
-            try:
-                bars.loc[asset]
-            except KeyError:
-                sample_tradable_assets_symbols.pop(i)
+        symbols_with_bars = set(bars.index.get_level_values(0)) if bars.shape[0] > 0 else set()
+        sample_tradable_assets_symbols = [asset for asset in sample_tradable_assets_symbols if asset in symbols_with_bars]
         return sample_tradable_assets_symbols,bars
         
 
-    def get_data_bars(self, symbols: list, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=TimeFrame.Day):
+    def sample_arrays(self, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=None, seed=None):
+        '''
+        Same as `sample_data()`, but the bars are memory-mapped from the bar store instead of loaded into a dataframe.
+
+        Returns:
+            - list of the sampled symbols that have bars
+            - dict mapping each of them to its bars (see `BarStore.read_arrays()`)
+        '''
+        symbols = self.__sample_symbols(start_date, end_date, seed)
+        arrays = self.__bar_store.get_arrays(symbols, start_date, end_date, default_timeframe(timeframe))
+        self.__refresh_universe(symbols, default_timeframe(timeframe))
+        return [symbol for symbol in symbols if symbol in arrays], arrays
+
+    def __refresh_universe(self, symbols: list, timeframe) -> None:
+        # the bar store may hold more bars of the sampled assets than the universe index knows of
+        if self.__universe is not None:
+            self.__universe.refresh(self.__bar_store, timeframe, symbols)
+            if self.__universe_file is not None:
+                self.__universe.save(self.__universe_file)
+
+    def __sample_symbols(self, start_date: pd.Timestamp, end_date: pd.Timestamp, seed=None) -> list:
+        # only the assets with bars in the range are sampled from the universe index
+        if self.__universe is not None:
+            return self.__universe.sample(N, start_date, end_date, seed)
+
+        # Each element is of type <class 'alpaca_trade_api.entity.Asset'>
+        active_assets = get_api().list_assets(status='active')
+
+        # Get subset of assets that are tradable, then the symbol
+        tradable_assets = [a for a in active_assets if a.tradable]
+        sample_tradable_assets = random.Random(seed).sample(tradable_assets, min(N, len(tradable_assets)))
+        return [a.symbol for a in sample_tradable_assets]
+
+    def get_data_bars(self, symbols: list, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=None):
 
         '''
         This method will get data for symbols starting on start_date. The timeframe is by default 1 day
@@ -68,54 +134,201 @@ class Backtest():
 
         '''
 
-        # Define parameters to send to the server
-        request_params = StockBarsRequest(
-                        symbol_or_symbols=symbols,
-                        timeframe=timeframe,
-                        start=start_date,
-                        end=end_date
-        )
-        # Send request to the server, convert to dataframe
-        bars = client.get_stock_bars(request_params).df
+        # Fetch the bars that are not cached yet, convert to dataframe
+        bars = self.__bar_store.get_bars(symbols, start_date, end_date, default_timeframe(timeframe))
 
         return bars
 
     
-    def plot(self, df: pd.DataFrame, orders: list):
-        # Initialize the series with NaN values
-        long_positions = pd.Series([np.nan] * len(df))
-        short_positions = pd.Series([np.nan] * len(df))
-        price = pd.Series([np.nan] * len(df))
-        for i in range(len(df)):
-            for order in orders:
-                if order._start_index == i and order.state != INITIAL:
-                    if order.state == LONG:
-                        long_positions.iloc[i] = order.buy_price
-                    elif order.state == SHORT:
-                        short_positions.iloc[i] = order.buy_price
-        long_positions.index = df.index
-        short_positions.index = df.index
-
-        # Define the colors for the markers
-        event_colors = {'LONG': 'green', 'SHORT': 'red'}
-
-        buy_markers = mpf.make_addplot(long_positions, type='scatter', markersize=120, marker='^')
-        sell_markers = mpf.make_addplot(short_positions, type='scatter', markersize=120, marker='v')
-
-        markers = [buy_markers, sell_markers]
+    def parameter_sweep(self, symbols: list, start_dt: str, end_dt: str, timeframe=None) -> ParameterSweep:
+        '''
+        Loads the bars of `symbols` once and returns a ParameterSweep over them, which caches the parameter
+        independent indicators between evaluations.
+        '''
+        initial_date = pd.to_datetime(start_dt).tz_localize('America/New_York')
+        end_date = pd.to_datetime(end_dt).tz_localize('America/New_York')
+        bars = self.get_data_bars(symbols, initial_date, end_date, timeframe)
+        return ParameterSweep(bars, [symbol for symbol in symbols if symbol in bars.index.get_level_values(0)])
 
-        mpf.plot(df[['open', 'high', 'low', 'close']], title='Swing Index System', ylabel='Price', addplot=markers)
+    def backtest_asset(self, asset: str, df_init_one_asset: pd.DataFrame, swing_index: SwingIndex, broker: Broker, fast=False, check=False) -> tuple:
+        '''
+        Backtests a single asset.
 
+        Parameters:
+            - asset             : The asset to backtest
+            - df_init_one_asset : OHLCV bars of the asset
+            - swing_index       : SwingIndex holding the parameters of the system. Its incremental state is reset.
+            - broker            : where orders are filled, and what type they are
+            - fast              : generate the signals in a single pass over the whole history instead of bar by bar
+            - check             : also run the other engine and raise a RuntimeError if the trades differ
+        Returns:
+            - list of the closed positions, in the order they were closed
+            - the last dataframe the signal was calculated on (None if the history is too short)
+        '''
+        if fast:
+            orders, df = self.__backtest_asset_fast(asset, df_init_one_asset, swing_index, broker)
+        else:
+            orders, df = self.__backtest_asset(asset, df_init_one_asset, swing_index, broker)
+
+        # compare the trades against the other engine
+        if check:
+            if fast:
+                other_orders, _ = self.__backtest_asset(asset, df_init_one_asset, swing_index, broker)
+            else:
+                other_orders, _ = self.__backtest_asset_fast(asset, df_init_one_asset, swing_index, broker)
+            if not np.array_equal(positions_to_trades(orders), positions_to_trades(other_orders)):
+                raise RuntimeError(f"The fast and bar by bar backtests disagree on the trades of {asset}")
+        return orders, df
+
+    def backtest_asset_arrays(self, asset: str, bars: dict, swing_index: SwingIndex, broker: Broker = None) -> list:
+        '''
+        Backtests a single asset straight from arrays (e.g. memory-mapped from the bar store), without building any
+        dataframe. Gives the same trades as `backtest_asset(..., fast=True)` on the same bars.
 
-        return df
+        Parameters:
+            - asset       : The asset to backtest
+            - bars        : dict of 1-D arrays, as returned by `BarStore.read_arrays()`
+            - swing_index : SwingIndex holding the parameters of the system
+            - broker      : where orders are filled, and what type they are (limit orders by default)
+        Returns:
+            - list of the closed positions, in the order they were closed
+        '''
+        broker = broker if broker is not None else Broker()
+        columns = swing_index.calculate_arrays(bars)
+        columns.update({column: np.asarray(bars[column], dtype=np.float64) for column in ("high", "low", "close")})
+
+        # bars with any invalid values are skipped, as in the backtest
+        valid = np.ones(bars["timestamp"].shape[0], dtype=bool)
+        for column, values in bars.items():
+            if column != "timestamp":
+                valid &= ~np.isnan(values)
+        for column in ("asi", "hsp", "hip", "lsp", "lop"):
+            valid &= ~np.isnan(columns[column])
+        trades = generate_signals_from_arrays(columns, valid, {"order_type": broker.order_type})
+        return trades_to_positions(broker.fill_trades(asset, trades, bars), asset)
+
+    def __backtest_asset(self, asset: str, df_init_one_asset: pd.DataFrame, swing_index: SwingIndex, broker: Broker) -> tuple:
+        '''
+        Backtests one asset bar by bar, feeding each new bar to `swing_index` and asking the position for a signal on the
+        dataframe up to that bar.
+        Returns:
+            - list of the closed positions, in the order they were closed
+            - the last dataframe the signal was calculated on (None if the history is too short)
+        '''
+        inactive_orders = []
+        df = None
+        position = SwingIndexPosition(0, 0, asset, 0, "INITIAL")
+
+        # the swing index variables are updated one bar at a time rather than recalculated over the whole history
+        swing_index.reset()
+        df_swing = self.__allocate_swing_df(df_init_one_asset)
+        # the spreads are estimated over the whole history at once (unless `backtest()` loaded them already), so
+        # orders are filled without reading the dataframe
+        broker.load({asset: df_init_one_asset}, reload=False)
 
-    def backtest(self, stocklist: list, total_capital: float, start_dt: str, end_dt: str, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, a1=20, a2=25):
+        # add logic so that orders pertaining to the same asset are mutually exclusive
+        for i in range(2,df_init_one_asset.shape[0]):
+            # each 'i' is currently happening
+
+            # bring the swing index variables up to date with bar i - 1
+            while swing_index.n_bars < i:
+                self.__write_swing_row(df_swing, swing_index.n_bars, swing_index.update(df_init_one_asset.iloc[swing_index.n_bars]))
+            # take the dataframe up to these indexes
+            df = df_swing.iloc[0:i]
+            # check if any of the values are null (invalid values)
+            if df.iloc[-1].isnull().any():
+                continue
+            # create signal
+            signal, ask_price = position.signal(df)
+            # buy signal 
+            if signal == 1 and position.state != LONG:
+                sell_index = len(df) - 1
+                fill_price = broker.submit_order(asset, df, ask_price, broker.order_type, 1)
+                # buy was a success
+                if fill_price != -1:
+                    position.sell(fill_price, sell_index)
+                    inactive_orders.append(position)
+                    position = SwingIndexPosition(1, fill_price, asset, sell_index, LONG)
+                        
+            # we move LONG -> SHORT (markov property: memoryless) 
+            elif signal == -1 and position.state != SHORT:
+                # we are able to make an order based on the rules of our capital management system
+                sell_index = len(df)
+                fill_price = broker.submit_order(asset, df, ask_price, broker.order_type, -1)
+                # buy was a success
+                if fill_price != -1:
+                    position.sell(fill_price, sell_index)
+                    inactive_orders.append(position)
+                    pl = position.profits_losses
+                    position = SwingIndexPosition(1, fill_price, asset, sell_index, "SHORT")
+        return inactive_orders, df
+
+    def __backtest_asset_fast(self, asset: str, df_init_one_asset: pd.DataFrame, swing_index: SwingIndex, broker: Broker) -> tuple:
+        '''
+        Backtests one asset in a single pass: the swing index variables are calculated over the whole history at once,
+        then `generate_signals()` runs the state machine over the arrays, and the broker fills all the orders at once.
+        Gives the same trades as `__backtest_asset()`.
+        '''
+        df_swing = swing_index.initialize_swing_df_demo(df_init_one_asset)
+        trades = broker.fill_trades(asset, generate_signals(df_swing, {"order_type": broker.order_type}), df_init_one_asset)
+        df = df_swing.iloc[0:-1] if df_swing.shape[0] > 2 else None
+        return trades_to_positions(trades, asset), df
+
+    def __to_arrays(self, df: pd.DataFrame) -> dict:
+        # bars of one asset in the form of `BarStore.read_arrays()`
+        arrays = {"timestamp": pd.DatetimeIndex(df.index).asi8}
+        arrays.update({column: df[column].to_numpy(dtype=np.float64) for column in df.columns})
+        return arrays
+
+    def __allocate_swing_df(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Copies `df` and adds empty columns for the Swing Index System variables. They are filled in one row at a time
+        by `__write_swing_row()` as the bars are streamed through `SwingIndex.update()`.
+        '''
+        df_swing = df.copy()
+        for column in SWING_COLUMNS:
+            df_swing[column] = False if column.startswith("adxr") else np.nan
+        return df_swing
+
+    def __write_swing_row(self, df_swing: pd.DataFrame, index: int, row: dict) -> None:
+        # write a row returned by `SwingIndex.update()` into position `index`
+        for column, value in row.items():
+            df_swing.iat[index, df_swing.columns.get_loc(column)] = value
+
+    def backtest(self, stocklist: list, total_capital: float, start_dt: str, end_dt: str, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, a1=20, a2=20, fast=False, check=False, workers=1, panel=False, memmap=False, shared=False, seed=None, portfolio=False, charts=None, timeframe=None, broker: Broker = None):
+        '''
+        Backtests the Swing Index System over a sample of assets.
+
+        Parameters:
+            - c1, ..., c7 : constants of the Swing Index System (see `SwingIndex`)
+            - a1, a2  : ADXR sell and buy thresholds, as in `ParameterSweep`
+            - fast    : generate the signals of each asset in a single pass over its whole history instead of bar by bar
+            - check   : also run the other engine and raise a RuntimeError if the trades differ
+            - workers : number of processes the assets are spread over. The results are the same as a serial run.
+            - panel   : calculate the swing index variables of every asset at once over a (dates x symbols) `Panel`,
+                        then generate the signals of each asset in a single pass. Gives the same trades as `fast`.
+            - memmap  : read the bars of each asset straight from the memory-mapped bar store instead of a dataframe.
+                        Workers open the files themselves, so the bars are shared between processes rather than copied.
+            - shared  : with several workers, load the bars once into shared memory (see `SharedBars`) instead of
+                        pickling the dataframe of each asset to the workers
+            - seed    : seed of the sampling of the assets, to backtest the same assets again
+            - portfolio : trade every asset at once, in time order, sharing the capital of the Capital Manager
+                          (see `PortfolioSimulator`) instead of backtesting the assets one after another
+            - charts  : directory to render a chart of every asset to (spread over `workers` processes), instead of
+                        showing the chart of the last asset
+            - timeframe : timeframe of the bars the system trades on (daily by default). With a bar store that has
+                          a base timeframe, e.g. minute bars, the other timeframes are resampled from it. Intraday
+                          histories are long, so they are best run with `fast`, `panel`, `memmap` or `portfolio`,
+                          which do not rebuild a dataframe on every bar.
+            - broker  : where orders are filled, and what type they are (see `Broker`). By default limit orders,
+                        without spread or slippage.
+        '''
 
         # Instantiate VBF
-        broker = Broker()
+        broker = broker if broker is not None else Broker()
 
         # all orders
-        inactive_orders = []
+        ledger = TradeLedger()
         # parameters for the Capital Manager class
         margin_per_commodity = .15
         total_margin = .6
@@ -125,61 +338,105 @@ class Backtest():
         end_date = pd.to_datetime(end_dt).tz_localize('America/New_York')
 
         # this is in a sense a virtualization
-        swing_index = SwingIndex(stocklist)
+        swing_index = SwingIndex(stocklist, c1, c2, c3, c4, c5, c6, c7, a1, a2)
 
         # this method is choreagraphed for a very specific type of dataset! This should be developed with 
         # great thought
-        stocklist_override, df_init_all_assets = self.sample_data(initial_date, end_date)
-        stocklist = stocklist_override
-        for asset in stocklist:
-            df_init_one_asset = df_init_all_assets.loc[asset]
-            position = SwingIndexPosition(0, 0, asset, 0, "INITIAL")
-
-            # add logic so that orders pertaining to the same asset are mutually exclusive
-            for i in range(2,df_init_one_asset.shape[0]):
-                # each 'i' is currently happening
-            
-                # take the dataframe up to these indexes
-                df = df_init_one_asset.iloc[0:i]
-                # initialize df
-                df = swing_index.initialize_swing_df_demo(df)
-                # check if any of the values are null (invalid values)
-                if df.iloc[-1].isnull().any():
-                    continue
-                # create signal
-                signal, ask_price = position.signal(df)
-                # buy signal 
-                if signal == 1 and position.state != LONG:
-                    sell_index = len(df) - 1
-                    # buy was a success
-                    if (broker.submit_order(asset,df,ask_price,"LIMIT") != -1):
-                        position.sell(ask_price, sell_index)
-                        inactive_orders.append(position)
-                        position = SwingIndexPosition(1, ask_price, asset, sell_index, LONG)
-                            
-                # we move LONG -> SHORT (markov property: memoryless) 
-                elif signal == -1 and position.state != SHORT:
-                    # we are able to make an order based on the rules of our capital management system
-                    sell_index = len(df)
-                    # buy was a success
-                    if (broker.submit_order(asset,df, ask_price,"LIMIT") != -1):
-                        position.sell(ask_price, sell_index)
-                        inactive_orders.append(position)
-                        pl = position.profits_losses
-                        position = SwingIndexPosition(1, ask_price, asset, sell_index, "SHORT")
-
-        total_profit = sum(order.profits_losses for order in inactive_orders)
-        self.plot(df, inactive_orders)
-        self.calculate_statistics(inactive_orders)
-        sorted_inactive_orders = sorted(inactive_orders)
-        # create series to put our data into pandas df
-        pl_series = pd.Series([order.profits_losses for order in sorted_inactive_orders])
-        asset_series = pd.Series([order.asset for order in sorted_inactive_orders])
-        buy_series = pd.Series([order.start_index for order in sorted_inactive_orders])
-        time_held_series = pd.Series([order.time_held for order in sorted_inactive_orders])
-        buy_price_series = pd.Series([order.buy_price for order in sorted_inactive_orders])
-        buy_date_series = pd.Series([df_init_all_assets.loc[order.asset].index[order.start_index] for order in sorted_inactive_orders])
-        df = pd.DataFrame({"profits_losses": pl_series, "asset":asset_series, "buy_index":buy_series, "time_held":time_held_series, "buy_price":buy_price_series, "buy_date":buy_date_series})
+        if memmap:
+            stocklist, arrays = self.sample_arrays(initial_date, end_date, timeframe, seed)
+            bar_dates = {asset: pd.to_datetime(np.array(arrays[asset]["timestamp"]), utc=True) for asset in stocklist}
+            broker.load({asset: arrays[asset] for asset in stocklist})
+        else:
+            stocklist, df_init_all_assets = self.sample_data(initial_date, end_date, timeframe, seed)
+            bar_dates = {asset: df_init_all_assets.loc[asset].index for asset in stocklist}
+            # the spreads of every bar of every asset are estimated in one pass
+            broker.load(df_init_all_assets)
+
+        if not stocklist:
+            raise ValueError(f"No assets with bars between {initial_date} and {end_date} to backtest. Build the universe "
+                             "over the range with `build_universe()` first, so the bars of every asset are downloaded.")
+
+        if portfolio:
+            bars = arrays if memmap else {asset: self.__to_arrays(df_init_all_assets.loc[asset]) for asset in stocklist}
+            ledger.append_positions(PortfolioSimulator(capital_manager, swing_index, broker).run(bars))
+            if not memmap:
+                df = swing_index.initialize_swing_df_demo(df_init_all_assets.loc[stocklist[-1]]).iloc[0:-1]
+        elif memmap and workers > 1:
+            # each worker maps the bars of its own asset from the bar store, and sends back compact trade records
+            with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(self.__bar_store.directory,)) as executor:
+                results = executor.map(_backtest_arrays_in_worker,
+                                       stocklist,
+                                       repeat(default_timeframe(timeframe)),
+                                       repeat(initial_date),
+                                       repeat(end_date),
+                                       repeat(swing_index),
+                                       repeat(broker.order_type),
+                                       chunksize=max(1, len(stocklist) // (4 * workers)))
+                for asset, trades in zip(stocklist, results):
+                    ledger.append(asset, broker.fill_trades(asset, trades))
+        elif memmap:
+            for asset in stocklist:
+                ledger.append_positions(self.backtest_asset_arrays(asset, arrays[asset], swing_index, broker))
+        elif panel:
+            trades = Panel(df_init_all_assets, stocklist).trades(**swing_index.parameters, params={"order_type": broker.order_type})
+            for asset in stocklist:
+                ledger.append(asset, broker.fill_trades(asset, trades[asset]))
+            df = swing_index.initialize_swing_df_demo(df_init_all_assets.loc[stocklist[-1]]).iloc[0:-1]
+        elif shared and workers > 1:
+            # workers read zero-copy views of the shared bars, and send back compact trade records
+            with SharedBars.create(df_init_all_assets, stocklist) as shared_bars, ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(self.__bar_store.directory,)) as executor:
+                results = executor.map(_backtest_shared_in_worker,
+                                       stocklist,
+                                       repeat(shared_bars.handle),
+                                       repeat(swing_index),
+                                       repeat(broker.order_type),
+                                       chunksize=max(1, len(stocklist) // (4 * workers)))
+                for asset, trades in zip(stocklist, results):
+                    ledger.append(asset, broker.fill_trades(asset, trades))
+            df = swing_index.initialize_swing_df_demo(df_init_all_assets.loc[stocklist[-1]]).iloc[0:-1]
+        elif workers > 1:
+            # each worker only receives the bars of its own asset, and sends back compact trade records
+            with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(self.__bar_store.directory,)) as executor:
+                results = executor.map(_backtest_asset_in_worker,
+                                       stocklist,
+                                       (df_init_all_assets.loc[asset] for asset in stocklist),
+                                       repeat(swing_index),
+                                       repeat(fast),
+                                       repeat(check),
+                                       (asset == stocklist[-1] for asset in stocklist),
+                                       repeat(broker.order_type),
+                                       chunksize=max(1, len(stocklist) // (4 * workers)))
+                # results come back in the order of `stocklist`, so the orders are the same as in a serial run
+                for asset, (trades, df_asset) in zip(stocklist, results):
+                    ledger.append(asset, broker.fill_trades(asset, trades))
+                    if df_asset is not None:
+                        df = df_asset
+        else:
+            for asset in stocklist:
+                orders, df_asset = self.backtest_asset(asset, df_init_all_assets.loc[asset], swing_index, broker, fast, check)
+                ledger.append_positions(orders)
+                if df_asset is not None:
+                    df = df_asset
+
+        if memmap:
+            # only the last asset is turned into a dataframe, for the plot
+            bars = {column: np.array(values, dtype=np.float64) for column, values in arrays[stocklist[-1]].items() if column != "timestamp"}
+            df = swing_index.initialize_swing_df_demo(pd.DataFrame(bars, index=bar_dates[stocklist[-1]])).iloc[0:-1]
+
+        total_profit = ledger.profits_losses.sum()
+        if charts is not None:
+            if memmap:
+                bars = {asset: pd.DataFrame({column: np.array(arrays[asset][column], dtype=np.float64) for column in ("open", "high", "low", "close")},
+                                            index=bar_dates[asset]) for asset in stocklist}
+            else:
+                bars = {asset: df_init_all_assets.loc[asset] for asset in stocklist}
+            render_charts({asset: (bars[asset], ledger.trades_of(asset)) for asset in stocklist}, charts, workers)
+        else:
+            self.plot(df, ledger)
+        self.calculate_statistics(ledger)
+        # one row per trade, in the same order whichever engine recorded the trades
+        ledger.sort()
+        df = ledger.to_frame(bar_dates)
         return df
     
 
@@ -214,14 +471,18 @@ class Backtest():
         position = SwingIndexPosition(0, 0, asset, 0, "INITIAL")
         
 
+        # the swing index variables are updated one bar at a time rather than recalculated over the whole history
+        df_swing = self.__allocate_swing_df(df_init_one_asset)
+
         # add logic so that orders pertaining to the same asset are mutually exclusive
         for i in range(2,df_init_one_asset.shape[0]):
             # each 'i' is currently happening
-        
+
+            # bring the swing index variables up to date with bar i - 1
+            while swing_index.n_bars < i:
+                self.__write_swing_row(df_swing, swing_index.n_bars, swing_index.update(df_init_one_asset.iloc[swing_index.n_bars]))
             # take the dataframe up to these indexes
-            df = df_init_one_asset.iloc[0:i]
-            # initialize df
-            df = swing_index.initialize_swing_df_demo(df)
+            df = df_swing.iloc[0:i]
             # check if any of the values are null (invalid values)
             if df.iloc[-1].isnull().any():
                 continue
@@ -231,25 +492,31 @@ class Backtest():
             if signal == 1 and position.state != LONG:
                 sell_index = len(df) - 1
                 # we are able to make an order based on the rules of our capital management system
-                if capital_manager.submit_order_check(1,ask_price):
+                if capital_manager.submit_order_check(1, ask_price, asset):
                     # buy was a success
-                    if (broker.submit_order(asset,df,ask_price,"LIMIT") != -1):
-                        position.sell(ask_price, sell_index)
+                    fill_price = broker.submit_order(asset, df, ask_price, broker.order_type, 1)
+                    if fill_price != -1:
+                        position.sell(fill_price, sell_index)
                         inactive_orders.append(position)
-                        position = SwingIndexPosition(1, ask_price, asset, sell_index, LONG)
-                        capital_manager.buy(1, ask_price)
+                        if position.state != INITIAL:
+                            capital_manager.close(position.profits_losses, asset)
+                        position = SwingIndexPosition(1, fill_price, asset, sell_index, LONG)
+                        capital_manager.buy(1, fill_price, asset)
             # we move LONG -> SHORT (markov property: memoryless) 
             elif signal == -1 and position.state != SHORT:
                 # we are able to make an order based on the rules of our capital management system
                 sell_index = len(df)
-                if capital_manager.submit_order_check(1,ask_price):
+                if capital_manager.submit_order_check(1, ask_price, asset):
                     # buy was a success
-                    if (broker.submit_order(asset,df, ask_price,"LIMIT") != -1):
-                        position.sell(ask_price, sell_index)
+                    fill_price = broker.submit_order(asset, df, ask_price, broker.order_type, -1)
+                    if fill_price != -1:
+                        position.sell(fill_price, sell_index)
                         inactive_orders.append(position)
                         pl = position.profits_losses
-                        capital_manager.sell(1, ask_price, pl)
-                        position = SwingIndexPosition(1, ask_price, asset, sell_index, "SHORT")
+                        if position.state != INITIAL:
+                            capital_manager.close(pl, asset)
+                        position = SwingIndexPosition(1, fill_price, asset, sell_index, "SHORT")
+                        capital_manager.sell_short(1, fill_price, asset)
         total_profit = 0                 
         for order in inactive_orders:
             total_profit += order.profits_losses
@@ -259,102 +526,96 @@ class Backtest():
         print(total_profit)
         return total_profit
     
-    def plot(self, df: pd.DataFrame, orders: list):
-        # Initialize the series with NaN values
-        long_positions = pd.Series([np.nan] * len(df))
-        short_positions = pd.Series([np.nan] * len(df))
-        for i in range(len(df)):
-            for order in orders:
-                if order._start_index == i and order.state != INITIAL:
-                    if order.state == LONG:
-                        long_positions.iloc[i] = order.buy_price
-                    elif order.state == SHORT:
-                        short_positions.iloc[i] = order.buy_price
-        long_positions.index = df.index
-        short_positions.index = df.index
-
-        buy_markers = mpf.make_addplot(long_positions, type='scatter', markersize=120, marker='^')
-        sell_markers = mpf.make_addplot(short_positions, type='scatter', markersize=120, marker='v')
-
-        markers = [buy_markers, sell_markers]
+    def plot(self, df: pd.DataFrame, orders, path: str = None):
+        '''
+        Plots the bars of `df` with a marker on the entry of every long and short trade.
 
-        mpf.plot(df[['open', 'high', 'low', 'close']], title='Swing Index System', ylabel='Price', addplot=markers)
+        Parameters:
+            - orders : TradeLedger, or list of closed positions
+            - path   : file to render the chart to (see `charts.render_chart()`) instead of showing it
+        '''
+        trades = orders.trades if isinstance(orders, TradeLedger) else positions_to_trades(orders)
+        if path is not None:
+            return render_chart(df, trades, path)
 
+        # plotting is slow to import, and only needed here
+        import mplfinance as mpf
 
+        long_positions, short_positions = marker_series(len(df), trades)
 
-    def calculate_statistics(self, orders):
-        length = len(orders)
-        assets = pd.Series([np.nan] * length)
-        profits_losses = pd.Series([np.nan] * length)
-        state = pd.Series([np.nan] * length)
-        time_held = pd.Series([np.nan] * length)
-
-        for i in range(length):
-            assets.iloc[i] = orders[i].asset
-            profits_losses.iloc[i] = orders[i].profits_losses
-            state.iloc[i] = orders[i].state
-            time_held.iloc[i] = orders[i].time_held
-        
+        # mplfinance rejects scatter plots without any point
+        markers = [mpf.make_addplot(pd.Series(values, index=df.index), type='scatter', markersize=120, marker=marker)
+                   for values, marker in ((long_positions, '^'), (short_positions, 'v')) if not np.isnan(values).all()]
 
-        df = pd.DataFrame({'assets': assets, 'pl': profits_losses, 'state': state, 'number of days': time_held})
+        mpf.plot(df[['open', 'high', 'low', 'close']], title='Swing Index System', ylabel='Price', addplot=markers)
 
-        # get only Long trades
-        df_long = df.loc[lambda df: df['state'] == LONG, :]
-        
-        # get only short trades
-        df_short = df.loc[lambda df: df['state'] == SHORT, :]
-
-        pl_long_stats = {
-        'Profit/Losses Long Mean': df_long['pl'].mean(),
-        'Profit/Losses Long Standard Deviation': df_long['pl'].std(),
-        'Profit/Losses Long Minimum': df_long['pl'].min(),
-        'Profit/Losses Long Maximum': df_long['pl'].max()
-        }
-
-        pl_short_stats = {
-        'Profit/Losses Short Mean': df_short['pl'].mean(),
-        'Profit/Losses Short Standard Deviation': df_short['pl'].std(),
-        'Profit/Losses Short Minimum': df_short['pl'].min(),
-        'Profit/Losses Short Maximum': df_short['pl'].max()
-        }
-
-
-        pl_overall_stats = {
-        'Profit/Losses Mean': df['pl'].mean(),
-        'Profit/Losses Standard Deviation': df['pl'].std(),
-        'Profit/Losses Minimum': df['pl'].min(),
-        'Profit/Losses Maximum': df['pl'].max()
-        }
-
-        time_long_stats = {
-        'Time per Trade Long Mean': df_long['number of days'].mean(),
-        'Time per Trade Long Standard Deviation': df_long['number of days'].std(),
-        'Time per Trade Long Minimum': df_long['number of days'].min(),
-        'Time per Trade Long Maximum': df_long['number of days'].max()
-        }
-
-        time_short_stats = {
-        'Time per Trade Short Mean': df_short['number of days'].mean(),
-        'Time per Trade Short Standard Deviation': df_short['number of days'].std(),
-        'Time per Trade Short Minimum': df_short['number of days'].min(),
-        'Time per Trade Short Maximum': df_short['number of days'].max()
-        }
-
-
-        time_overall_stats = {
-        'Time per Trade Mean': df['number of days'].mean(),
-        'Time per Trade Standard Deviation': df['number of days'].std(),
-        'Time per Trade Minimum': df['number of days'].min(),
-        'Time per Trade Maximum': df['number of days'].max()
-        }
-
-        all_stats = [pl_long_stats, pl_short_stats, pl_overall_stats, time_long_stats, time_overall_stats, time_overall_stats]
-        
-        for stat in all_stats:
-            for stat, value in stat.items():
-                print(f"{stat}: {value}")
-        
-        # security traded
 
-        pass
 
+    def calculate_statistics(self, orders):
+        '''
+        Prints the profits/losses and holding time statistics of long, short and all trades.
+
+        Parameters:
+            - orders : TradeLedger, or list of closed positions
+        '''
+        ledger = orders
+        if not isinstance(ledger, TradeLedger):
+            ledger = TradeLedger(len(orders))
+            ledger.append_positions(orders)
+
+        all_stats = trade_statistics(ledger.profits_losses, ledger.time_held, ledger.trades["side"])
+        for stat, value in all_stats.items():
+            print(f"{stat}: {value}")
+        return all_stats
+
+
+# engine and bar store of this worker process, built once by `_initialize_worker()` rather than for every asset
+_engine = None
+_bar_store = None
+
+
+def _initialize_worker(directory: str) -> None:
+    '''
+    Builds the engine of a worker process when the pool starts it, so the bar store and the universe index are not
+    set up again for every asset the worker backtests.
+    '''
+    global _engine, _bar_store
+    _bar_store = BarStore(directory, None)
+    _engine = Backtest(_bar_store)
+
+
+def _backtest_asset_in_worker(asset: str, df_init_one_asset: pd.DataFrame, swing_index: SwingIndex, fast: bool, check: bool, return_df: bool, order_type: str) -> tuple:
+    '''
+    Runs `Backtest.backtest_asset()` in a worker process. Position objects are converted to a compact array of trades
+    (see `position.TRADE_DTYPE`) before being sent back, and the dataframe is only sent back when asked for. The
+    trades are at the prices the orders were placed at; the parent's broker fills them (see `Broker.fill_trades()`).
+    '''
+    orders, df = _engine.backtest_asset(asset, df_init_one_asset, swing_index, Broker(order_type=order_type), fast, check)
+    return positions_to_trades(orders), (df if return_df else None)
+
+
+def _backtest_arrays_in_worker(asset: str, timeframe, start_date: pd.Timestamp, end_date: pd.Timestamp, swing_index: SwingIndex, order_type: str) -> np.ndarray:
+    '''
+    Runs `Backtest.backtest_asset_arrays()` in a worker process. The worker memory-maps the bars of its asset from
+    the bar store itself, so nothing but the compact array of trades (see `position.TRADE_DTYPE`) crosses processes.
+    '''
+    bars = _bar_store.read_arrays(asset, timeframe, start_date, end_date)
+    orders = _engine.backtest_asset_arrays(asset, bars, swing_index, Broker(order_type=order_type))
+    return positions_to_trades(orders)
+
+
+# shared bars this worker process is attached to, kept open between assets
+_shared_bars = None
+
+
+def _backtest_shared_in_worker(asset: str, handle: dict, swing_index: SwingIndex, order_type: str) -> np.ndarray:
+    '''
+    Runs `Backtest.backtest_asset_arrays()` in a worker process on zero-copy views of the bars in shared memory.
+    The worker attaches to the blocks the first time it is given them, and only sends back the compact array of
+    trades (see `position.TRADE_DTYPE`).
+    '''
+    global _shared_bars
+    if _shared_bars is None or _shared_bars.handle != handle:
+        _shared_bars = SharedBars.attach(handle)
+    orders = _engine.backtest_asset_arrays(asset, _shared_bars.arrays(asset), swing_index, Broker(order_type=order_type))
+    return positions_to_trades(orders)
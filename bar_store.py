@@ -0,0 +1,363 @@
+import os
+import numpy as np
+import pandas as pd
+from resample import resample_arrays, bar_length
+from broker import corwin_schultz_spread
+from settings import DATA_FEED_DELAY
+
+
+def default_timeframe(timeframe=None):
+    '''
+    Returns:
+        - `timeframe`, or daily bars if it is None. `alpaca.data` is slow to import, so it is only imported when
+          the default is needed.
+    '''
+    if timeframe is None:
+        from alpaca.data.timeframe import TimeFrame
+        timeframe = TimeFrame.Day
+    return timeframe
+
+
+class AlpacaBarSource:
+
+    '''
+    Fetches bars from Alpaca's historical data API.
+
+     - client : a `StockHistoricalDataClient`
+    '''
+    def __init__(self, client):
+        self.__client = client
+
+    def fetch(self, symbols: list, timeframe, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        '''
+        Returns:
+            - dataframe indexed by (symbol, timestamp), as returned by `client.get_stock_bars(...).df`
+        '''
+        from alpaca.data.requests import StockBarsRequest
+
+        request_params = StockBarsRequest(
+                        symbol_or_symbols=symbols,
+                        timeframe=timeframe,
+                        start=start,
+                        end=end
+        )
+        return self.__client.get_stock_bars(request_params).df
+
+
+class FrameBarSource:
+
+    '''
+    Serves bars from a dataframe that is already in memory (indexed by (symbol, timestamp)), e.g. one loaded from a
+    file. Useful for running the backtest without a connection to Alpaca, and as a fake client in tests.
+
+     - bars : dataframe indexed by (symbol, timestamp)
+    '''
+    def __init__(self, bars: pd.DataFrame):
+        self.__bars = bars
+        self.requests = []
+
+    def fetch(self, symbols: list, timeframe, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        # keep track of what was asked for, so we can tell what the bar store fetched
+        self.requests.append((list(symbols), start, end))
+        timestamps = self.__bars.index.get_level_values(1)
+        symbol_mask = self.__bars.index.get_level_values(0).isin(symbols)
+        return self.__bars[symbol_mask & (timestamps >= start) & (timestamps <= end)]
+
+
+class BarStore:
+
+    '''
+    Local on-disk cache of bars, keyed by (symbol, timeframe, date range). Each symbol is stored as one contiguous
+    .npy file per column (float64 by default) plus an int64 index of epoch nanoseconds (UTC) and the list of columns:
+
+        <directory>/<timeframe>/<symbol>/<column>.npy
+        <directory>/<timeframe>/<symbol>/_index.npy
+        <directory>/<timeframe>/<symbol>/_columns.npy
+
+    along with the date ranges that have already been fetched, so ranges without any bars (weekends, holidays, dates
+    before the listing) are not requested again. Only the missing parts of a requested range are fetched from the source.
+
+    The files can be read back as dataframes (`get_bars()`), or memory-mapped without building any dataframe
+    (`get_arrays()`, `read_arrays()`), in which case every process reading the same symbol shares its pages.
+
+    With a `base_timeframe` (e.g. minute bars), only bars of that timeframe are fetched. Bars of any other timeframe
+    (5Min, 15Min, 1Hour, 1Day...) are resampled from them (see `resample.resample_arrays()`) and cached in the same
+    layout under their own timeframe, along with the state of the base bars they were resampled from:
+
+        <directory>/<timeframe>/<symbol>/_source.npy
+
+    so they are only resampled again once more base bars are stored.
+
+    Along with the columns of the source, every bar gets a 'spread' column: its bid-ask spread, estimated when the
+    bars are written (see `broker.corwin_schultz_spread()`), so brokers filling orders on the bars do not estimate
+    it again.
+
+     - directory : where the bars are stored
+     - source    : where missing bars are fetched from. Any object with a
+                   `fetch(symbols, timeframe, start, end) -> dataframe indexed by (symbol, timestamp)` method
+                   (see `AlpacaBarSource`, `FrameBarSource`, `downloader.BarDownloader`). May be None for a store that
+                   is only read from.
+     - dtype     : floating point type the columns are written with. np.float32 halves the size of the files, but
+                   rounds the prices (to about 7 significant digits), which may change the trades of a backtest.
+     - base_timeframe : the only timeframe fetched from the source, the others being resampled from it. By default
+                        every timeframe is fetched as is.
+     - feed_delay : how long after its end a bar is published by the source. Ranges are only recorded as fetched up
+                    to the start of the last bar that is surely published, so later bars are fetched again.
+    '''
+    def __init__(self, directory: str, source, dtype=np.float64, base_timeframe=None, feed_delay: pd.Timedelta = pd.Timedelta(minutes=DATA_FEED_DELAY)):
+        self.__directory = directory
+        self.__source = source
+        self.__dtype = np.dtype(dtype)
+        self.__base_timeframe = base_timeframe
+        self.__feed_delay = feed_delay
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    @property
+    def base_timeframe(self):
+        return self.__base_timeframe
+
+    def get_bars(self, symbols: list, start: pd.Timestamp, end: pd.Timestamp, timeframe) -> pd.DataFrame:
+        '''
+        Returns the bars of `symbols` between `start` and `end` (inclusive), fetching whatever is not on disk yet.
+
+        Returns:
+            - dataframe indexed by (symbol, timestamp), like `client.get_stock_bars(...).df`. Symbols without any
+              bars in the range are left out.
+        '''
+        start, end = self.__to_utc(start), self.__to_utc(end)
+        self.__prepare(symbols, start, end, timeframe)
+
+        frames = {}
+        for symbol in symbols:
+            df = self.__read(symbol, timeframe, start, end)
+            if df is not None and df.shape[0] > 0:
+                frames[symbol] = df
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, names=["symbol", "timestamp"])
+
+    def get_arrays(self, symbols: list, start: pd.Timestamp, end: pd.Timestamp, timeframe) -> dict:
+        '''
+        Same as `get_bars()`, without building a dataframe.
+
+        Returns:
+            - dict mapping each symbol with bars in the range to the dict returned by `read_arrays()`
+        '''
+        start, end = self.__to_utc(start), self.__to_utc(end)
+        self.__prepare(symbols, start, end, timeframe)
+
+        arrays = {}
+        for symbol in symbols:
+            bars = self.read_arrays(symbol, timeframe, start, end)
+            if bars is not None and bars["timestamp"].shape[0] > 0:
+                arrays[symbol] = bars
+        return arrays
+
+    def prefetch(self, symbols: list, start: pd.Timestamp, end: pd.Timestamp, timeframe) -> None:
+        '''
+        Fetches whatever bars of `symbols` between `start` and `end` are not on disk yet, without reading any back.
+        '''
+        self.__prepare(symbols, self.__to_utc(start), self.__to_utc(end), timeframe)
+
+    def read_arrays(self, symbol: str, timeframe, start: pd.Timestamp = None, end: pd.Timestamp = None) -> dict:
+        '''
+        Memory-maps the stored bars of `symbol` between `start` and `end` (inclusive, everything by default). Nothing
+        is fetched from the source, and nothing is copied: the arrays are read-only views of the files.
+
+        Returns:
+            - dict mapping "timestamp" (int64 epoch nanoseconds, UTC) and each stored column to a 1-D array.
+              None if nothing is stored.
+        '''
+        path = self.__path(symbol, timeframe)
+        if not os.path.exists(os.path.join(path, "_index.npy")):
+            return None
+        index = np.load(os.path.join(path, "_index.npy"), mmap_mode="r")
+        first = 0 if start is None else np.searchsorted(index, self.__to_utc(start).value, side="left")
+        last = len(index) if end is None else np.searchsorted(index, self.__to_utc(end).value, side="right")
+        arrays = {"timestamp": index[first:last]}
+        for column in np.load(os.path.join(path, "_columns.npy")).tolist():
+            arrays[column] = np.load(os.path.join(path, column + ".npy"), mmap_mode="r")[first:last]
+        return arrays
+
+    def availability(self, symbol: str, timeframe) -> tuple:
+        '''
+        Returns:
+            - first and last stored timestamps of `symbol` (None if nothing is stored), and the number of stored bars
+        '''
+        path = self.__path(symbol, timeframe, "_index")
+        if not os.path.exists(path):
+            return None, None, 0
+        index = np.load(path, mmap_mode="r")
+        if index.shape[0] == 0:
+            return None, None, 0
+        return pd.Timestamp(int(index[0]), tz="UTC"), pd.Timestamp(int(index[-1]), tz="UTC"), int(index.shape[0])
+
+    def symbols(self, timeframe) -> list:
+        '''
+        Returns:
+            - the symbols with bars stored for `timeframe`, sorted
+        '''
+        path = os.path.join(self.__directory, str(timeframe))
+        if not os.path.isdir(path):
+            return []
+        return sorted(symbol for symbol in os.listdir(path) if os.path.exists(self.__path(symbol, timeframe, "_index")))
+
+    def __prepare(self, symbols: list, start: pd.Timestamp, end: pd.Timestamp, timeframe) -> None:
+        '''
+        Makes sure the bars of `symbols` in [start, end] are on disk in `timeframe`, fetching them or resampling them
+        from the base timeframe.
+        '''
+        if self.__base_timeframe is None or str(timeframe) == str(self.__base_timeframe):
+            self.__fetch_missing(symbols, start, end, timeframe)
+            return
+        self.__fetch_missing(symbols, start, end, self.__base_timeframe)
+        for symbol in symbols:
+            self.__resample(symbol, timeframe)
+
+    def __resample(self, symbol: str, timeframe) -> None:
+        '''
+        Resamples every stored base bar of `symbol` to `timeframe`, unless the cached bars are up to date.
+        '''
+        base_index = self.__path(symbol, self.__base_timeframe, "_index")
+        if not os.path.exists(base_index):
+            return
+        # the base index is rewritten whenever base bars are stored, which tells us the cache is stale
+        stat = os.stat(base_index)
+        source = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        source_path = self.__path(symbol, timeframe, "_source")
+        if os.path.exists(source_path) and np.array_equal(np.load(source_path), source):
+            return
+
+        base = self.read_arrays(symbol, self.__base_timeframe)
+        # the spreads of the longer bars are estimated from their own highs and lows
+        base.pop("spread", None)
+        bars = resample_arrays(base, timeframe)
+        bars["spread"] = self.__spreads(bars)
+        path = self.__path(symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+        self.__save(os.path.join(path, "_index.npy"), bars.pop("timestamp"))
+        self.__save(os.path.join(path, "_columns.npy"), np.array(list(bars), dtype=str))
+        for column, values in bars.items():
+            self.__save(os.path.join(path, column + ".npy"), values.astype(self.__dtype))
+        # written last, so an interrupted run is resampled again
+        self.__save(source_path, source)
+
+    def __fetch_missing(self, symbols: list, start: pd.Timestamp, end: pd.Timestamp, timeframe) -> None:
+        '''
+        Fetches the parts of [start, end] that are not covered yet. Symbols missing the same range are fetched together.
+        '''
+        # we cannot cache what has not happened, or been published, yet: a bar starting after this may still be missing
+        covered_end = min(end, pd.Timestamp.now(tz="UTC") - self.__feed_delay - self.__bar_length(timeframe))
+
+        missing = {}
+        for symbol in symbols:
+            for gap in self.__gaps(self.__coverage(symbol, timeframe), start.value, end.value):
+                missing.setdefault(gap, []).append(symbol)
+
+        for (gap_start, gap_end), gap_symbols in missing.items():
+            bars = self.__source.fetch(gap_symbols, timeframe, pd.Timestamp(gap_start, tz="UTC"), pd.Timestamp(gap_end, tz="UTC"))
+            fetched = set(bars.index.get_level_values(0)) if bars.shape[0] > 0 else set()
+            for symbol in gap_symbols:
+                self.__write(symbol, timeframe, bars.loc[symbol] if symbol in fetched else None,
+                             (gap_start, min(gap_end, covered_end.value)))
+
+    def __gaps(self, coverage: np.ndarray, start: int, end: int) -> list:
+        '''
+        Returns the sub-ranges of [start, end] (epoch nanoseconds, inclusive) that are not in `coverage`.
+        '''
+        gaps = []
+        for covered_start, covered_end in coverage:
+            if covered_end < start or covered_start > end:
+                continue
+            if covered_start > start:
+                gaps.append((start, covered_start - 1))
+            start = max(start, covered_end + 1)
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def __bar_length(self, timeframe) -> pd.Timedelta:
+        try:
+            return bar_length(timeframe)
+        except ValueError:
+            # timeframes that cannot be parsed are taken as the longest there is
+            return bar_length("1Month")
+
+    def __path(self, symbol: str, timeframe, name: str = None) -> str:
+        path = os.path.join(self.__directory, str(timeframe), symbol)
+        return path if name is None else os.path.join(path, name + ".npy")
+
+    def __coverage(self, symbol: str, timeframe) -> np.ndarray:
+        path = self.__path(symbol, timeframe, "_coverage")
+        if not os.path.exists(path):
+            return np.empty((0, 2), dtype=np.int64)
+        return np.load(path)
+
+    def __read(self, symbol: str, timeframe, start: pd.Timestamp = None, end: pd.Timestamp = None) -> pd.DataFrame:
+        '''
+        Reads the stored bars of `symbol` between `start` and `end` (inclusive, everything by default). None if nothing is stored.
+        '''
+        arrays = self.read_arrays(symbol, timeframe, start, end)
+        if arrays is None:
+            return None
+        index = pd.DatetimeIndex(pd.to_datetime(np.array(arrays.pop("timestamp")), utc=True), name="timestamp")
+        # dataframes are always float64, which is what TA-Lib expects
+        return pd.DataFrame({column: np.array(values, dtype=np.float64) for column, values in arrays.items()}, index=index)
+
+    def __write(self, symbol: str, timeframe, bars: pd.DataFrame, covered: tuple) -> None:
+        '''
+        Merges newly fetched `bars` (may be None) with what is on disk and records `covered` as fetched.
+        '''
+        path = self.__path(symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+
+        if bars is not None and bars.shape[0] > 0:
+            bars = bars.copy()
+            bars.index = pd.DatetimeIndex(pd.to_datetime(bars.index, utc=True))
+            stored = self.__read(symbol, timeframe)
+            if stored is not None:
+                bars = pd.concat([stored, bars])
+            # newer data wins over what we had for the same timestamp
+            bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+            bars = bars.drop(columns="spread", errors="ignore")
+            bars["spread"] = self.__spreads(bars)
+            self.__save(os.path.join(path, "_index.npy"), bars.index.asi8.astype(np.int64))
+            self.__save(os.path.join(path, "_columns.npy"), np.array(bars.columns, dtype=str))
+            for column in bars.columns:
+                self.__save(os.path.join(path, column + ".npy"), bars[column].to_numpy(dtype=self.__dtype))
+
+        if covered[1] >= covered[0]:
+            coverage = np.vstack([self.__coverage(symbol, timeframe), np.array([covered], dtype=np.int64)])
+            self.__save(self.__path(symbol, timeframe, "_coverage"), self.__merge_ranges(coverage))
+
+    def __spreads(self, bars) -> np.ndarray:
+        # bid-ask spread of every bar, estimated over the whole history at once (see `Broker.load()`); bars without
+        # an estimate are not charged any spread, so they are stored as 0
+        return np.nan_to_num(corwin_schultz_spread(bars["high"], bars["low"]))
+
+    def __merge_ranges(self, ranges: np.ndarray) -> np.ndarray:
+        # merge overlapping or adjacent ranges so the coverage stays small
+        ranges = ranges[np.argsort(ranges[:, 0])]
+        merged = []
+        for range_start, range_end in ranges:
+            if merged and range_start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        return np.array(merged, dtype=np.int64).reshape(-1, 2)
+
+    def __save(self, path: str, array: np.ndarray) -> None:
+        # write to a temporary file first so an interrupted run never leaves a truncated file behind
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            np.save(file, array)
+        os.replace(temporary_path, path)
+
+    def __to_utc(self, timestamp) -> pd.Timestamp:
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            return timestamp.tz_localize("UTC")
+        return timestamp.tz_convert("UTC")
@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from position import SwingIndexPosition, position_sort_key
+from settings import LONG, SHORT, BAR_STORE_DIRECTORY
+from sw import SwingIndex
+from capital_manager import CapitalManager
+from bar_store import BarStore, default_timeframe
+from replay import Replay
+
+
+def benchmark_positions(n: int = 1_000_000, seed: int = 0) -> dict:
+    '''
+    Allocates `n` closed positions, in random order of their start index, and sorts them both with their ordering
+    (`Position.__lt__`) and with `position_sort_key`.
+
+    Returns:
+        - dict with the seconds taken to allocate and to sort, and the memory held per position (bytes)
+    '''
+    rng = np.random.default_rng(seed)
+    start_indexes = rng.integers(0, n, size=n).tolist()
+    prices = rng.uniform(1, 100, size=n).tolist()
+
+    def allocate():
+        positions = []
+        for k in range(n):
+            position = SwingIndexPosition(1, prices[k], "BENCH", start_indexes[k], LONG if k % 2 else SHORT)
+            position.sell(prices[k - 1], start_indexes[k] + 1)
+            positions.append(position)
+        return positions
+
+    begin = time.perf_counter()
+    positions = allocate()
+    allocate_time = time.perf_counter() - begin
+
+    # tracing slows allocation down, so the memory is measured on a second run
+    del positions
+    tracemalloc.start()
+    positions = allocate()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    shuffled = list(positions)
+    begin = time.perf_counter()
+    positions.sort()
+    sort_time = time.perf_counter() - begin
+    begin = time.perf_counter()
+    shuffled.sort(key=position_sort_key)
+    key_sort_time = time.perf_counter() - begin
+
+    assert all(positions[k].start_index <= positions[k + 1].start_index for k in range(n - 1))
+    assert positions == shuffled
+    return {"allocate_time": allocate_time, "sort_time": sort_time, "key_sort_time": key_sort_time, "bytes_per_position": memory / n}
+
+
+# dependencies that are only imported on first use
+LAZY_MODULES = ["alpaca_trade_api", "alpaca.data", "mplfinance", "matplotlib", "yfinance", "aiohttp"]
+
+
+def benchmark_imports(module: str = "backtest_engine", repeats: int = 5) -> dict:
+    '''
+    Imports `module` in fresh interpreters, as a worker process or a short command line run would.
+
+    Returns:
+        - dict with the shortest import time (seconds) over the repeats, and the lazily imported dependencies
+          (see LAZY_MODULES) that were imported all the same
+    '''
+    code = (f"import sys, time; begin = time.perf_counter(); import {module}; elapsed = time.perf_counter() - begin; "
+            f"print(elapsed); print(','.join(name for name in {LAZY_MODULES!r} if name in sys.modules))")
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split("\n")
+        times.append(float(output[0]))
+        imported = [name for name in output[1].split(",") if name]
+    return {"import_time": min(times), "imported": imported}
+
+
+def benchmark_replay(directory: str = BAR_STORE_DIRECTORY, n_symbols: int = None, baseline: str = None, tolerance: float = 1.5) -> dict:
+    '''
+    Replays the daily bars of the local bar store through the live engine (see `replay.Replay`), with unlimited
+    capital so every decision is filled.
+
+    Parameters:
+        - n_symbols : number of stored symbols replayed (all of them by default)
+        - baseline  : json file holding the summary of an earlier replay. If it exists the replay is compared with it,
+                      otherwise the summary is saved there.
+    Returns:
+        - summary of the replay (see `ReplayResult.summary()`), with the regressions found under "regressions"
+    '''
+    bar_store = BarStore(directory, None)
+    symbols = bar_store.symbols(default_timeframe())[:n_symbols]
+    replay = Replay.from_bar_store(bar_store, symbols)
+    result = replay.run(CapitalManager(1e12, .6, .15), SwingIndex(replay.symbols))
+    summary = result.summary()
+
+    summary["regressions"] = []
+    if baseline is not None and os.path.exists(baseline):
+        with open(baseline) as file:
+            summary["regressions"] = result.regressions(json.load(file), tolerance)
+    elif baseline is not None:
+        with open(baseline, "w") as file:
+            json.dump(result.summary(), file, indent=4)
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        n_symbols = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        summary = benchmark_replay(n_symbols=n_symbols, baseline=sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"symbols            : {summary['symbols']}")
+        print(f"bars               : {summary['bars']}")
+        print(f"throughput         : {summary['bars_per_second']:.0f} bars/s")
+        print(f"latency p50 / p99  : {summary['latency_p50'] * 1e6:.0f} / {summary['latency_p99'] * 1e6:.0f} us")
+        print(f"decisions / fills  : {summary['decisions']} / {summary['filled']}")
+        for regression in summary["regressions"]:
+            print(f"REGRESSION         : {regression}")
+        sys.exit(1 if summary["regressions"] else 0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "imports":
+        module = sys.argv[2] if len(sys.argv) > 2 else "backtest_engine"
+        results = benchmark_imports(module)
+        print(f"module             : {module}")
+        print(f"import             : {results['import_time']:.3f} s")
+        print(f"heavy dependencies : {', '.join(results['imported']) or 'none'}")
+        sys.exit()
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    results = benchmark_positions(n)
+    print(f"positions          : {n}")
+    print(f"allocate           : {results['allocate_time']:.3f} s")
+    print(f"sort               : {results['sort_time']:.3f} s")
+    print(f"sort with key      : {results['key_sort_time']:.3f} s")
+    print(f"memory / position  : {results['bytes_per_position']:.0f} B")
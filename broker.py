@@ -1,48 +1,294 @@
+import collections
 from typing import Union
+import numpy as np
 import pandas as pd
+from settings import SPREAD_WINDOW
+
+ORDER_TYPES = ["MARKET", "LIMIT", "STOP"]
+
+
+def corwin_schultz_spread(high: np.ndarray, low: np.ndarray, window: int = SPREAD_WINDOW, starts: np.ndarray = None) -> np.ndarray:
+    '''
+    Estimates the bid-ask spread of every bar with the method described in "A Simple Way to Estimate Bid-Ask Spreads
+    from Daily High and Low Prices" (Corwin and Schultz, 2012), in one pass over the arrays. Each bar is paired with
+    the one before it; negative estimates are set to 0, and the estimates are averaged over the last `window` bars
+    (only bars up to the current one are used).
+
+    Parameters:
+        - high, low : 1-D arrays of the bars, possibly of several assets laid end to end
+        - starts    : optional indices of the first bar of each asset, so no bar is paired or averaged with the bars
+                      of another asset
+    Returns:
+        - array of the spreads, as a fraction of the price. NaN where no estimate is available yet.
+    '''
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    n = high.shape[0]
+    if n == 0:
+        return np.empty(0)
+
+    estimates = np.full(n, np.nan)
+    estimates[1:] = _pair_estimates(high[:-1], low[:-1], high[1:], low[1:])
+
+    first = np.zeros(n, dtype=np.int64)
+    if starts is not None and len(starts) > 0:
+        estimates[starts] = np.nan
+        # first bar of the asset each bar belongs to
+        first[starts] = starts
+        first = np.maximum.accumulate(first)
+
+    # mean of the valid estimates over the window, from running sums
+    valid = ~np.isnan(estimates)
+    sums = np.concatenate(([0.], np.cumsum(np.where(valid, estimates, 0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    lower = np.maximum(np.arange(n) - window + 1, first)
+    upper = np.arange(1, n + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts[upper] > counts[lower], (sums[upper] - sums[lower]) / (counts[upper] - counts[lower]), np.nan)
+
+
+def _pair_estimates(previous_high, previous_low, high, low):
+    # spread estimated from each bar and the one before it; negative estimates are set to 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        beta = np.log(high / low) ** 2 + np.log(previous_high / previous_low) ** 2
+        gamma = np.log(np.maximum(high, previous_high) / np.minimum(low, previous_low)) ** 2
+
+        # we take the positive root and solve for alpha w.r.t the quadratic equation
+        k = 3 - 2 * np.sqrt(2)
+        alpha = (np.sqrt(2 * beta) - np.sqrt(beta)) / k - np.sqrt(gamma / k)
+        return np.maximum(2 * (np.exp(alpha) - 1) / (1 + np.exp(alpha)), 0)
+
+
+class SpreadEstimator:
+
+    '''
+    Estimates the bid-ask spread of bars as they arrive, one bar at a time, as `corwin_schultz_spread()` does over
+    the whole history: each bar is paired with the one before it, and the estimates are averaged over the last
+    `window` bars. Only the last `window` estimates are kept, so each bar costs the same however long the stream is.
+
+     - window : number of bars the estimates are averaged over
+    '''
+    def __init__(self, window: int = SPREAD_WINDOW):
+        self.__estimates = collections.deque(maxlen=window)
+        self.__previous = None
+
+    def update(self, high: float, low: float) -> float:
+        '''
+        Returns:
+            - the spread of the bar, as a fraction of the price. NaN if no estimate is available yet.
+        '''
+        estimate = np.nan
+        if self.__previous is not None:
+            estimate = float(_pair_estimates(*self.__previous, np.float64(high), np.float64(low)))
+        self.__previous = (np.float64(high), np.float64(low))
+        self.__estimates.append(estimate)
+
+        estimates = np.array(self.__estimates)
+        valid = ~np.isnan(estimates)
+        return float(estimates[valid].mean()) if valid.any() else np.nan
+
+
+def _order_type(type: str) -> str:
+    # "LIMIT", "limit order" and the like all name the same type
+    name = str(type).split()[0].upper() if str(type).strip() else ""
+    if name not in ORDER_TYPES:
+        raise ValueError(f"Unknown order type: {type}")
+    return name
+
 
 class Broker:
 
     '''
-    This is meant to virtualize the brokerage firm. 
+    This is meant to virtualize the brokerage firm. Orders are filled against the bar they are placed on:
+
+     - MARKET orders are always filled
+     - LIMIT orders are filled at their price if it was reached during the bar (the high got to it)
+     - STOP orders turn into market orders once their price is reached during the bar: a buy stop once the high gets
+       to it, a sell stop once the low does. If the bar opens beyond the stop (it gapped through it), the order is
+       filled at the open instead.
+
+    Market orders, and stop orders once triggered, are filled at their price moved against the order by half the
+    bid-ask spread of the bar and by the slippage. The spreads are estimated for every bar of every asset at once by
+    `load()` (see `corwin_schultz_spread()`), and cached along with the prices, so filling an order is a lookup.
+
+     - slippage   : fraction of the price lost on every market order, on top of the spread
+     - spread     : charge the estimated bid-ask spread
+     - order_type : type of the orders the trading system places
+     - window     : number of bars the spread estimates are averaged over
     '''
+    def __init__(self, slippage: float = 0.0, spread: bool = False, order_type: str = "LIMIT", window: int = SPREAD_WINDOW):
+        self.__slippage = slippage
+        self.__spread = spread
+        self.__order_type = _order_type(order_type)
+        self.__window = window
+        self.__opens = {}
+        self.__highs = {}
+        self.__lows = {}
+        self.__spreads = {}
+
+    @property
+    def order_type(self) -> str:
+        return self.__order_type
+
+    @property
+    def window(self) -> int:
+        return self.__window
 
+    def load(self, bars, reload: bool = True) -> None:
+        '''
+        Caches the opens, highs, lows and spreads of every bar of every asset. Bars with a 'spread' column (as
+        `BarStore` stores them) are charged those spreads; otherwise they are estimated in a single pass over the bars
+        of all assets laid end to end. Assets loaded again replace what was cached.
+
+        Parameters:
+            - bars   : dataframe indexed by (symbol, timestamp), with the bars of each symbol contiguous (as
+                       `Backtest.get_data_bars()` returns them), or dict mapping each asset to its bars (a dataframe
+                       or the dict returned by `BarStore.read_arrays()`)
+            - reload : False to keep what is cached for the assets already loaded with as many bars (e.g. by a
+                       `load()` of every asset at once)
+        '''
+        if isinstance(bars, pd.DataFrame) and not reload:
+            bars = {asset: bars.loc[asset] for asset in bars.index.unique(level=0)}
+        if isinstance(bars, pd.DataFrame):
+            if bars.shape[0] == 0:
+                return
+            symbols = bars.index.get_level_values(0)
+            starts = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+            assets = [symbols[0]] + list(symbols[starts])
+            columns = {column: bars[column].to_numpy(dtype=np.float64) for column in ("open", "high", "low", "spread") if column in bars}
+        else:
+            assets = [asset for asset in bars if reload or not self.__loaded(asset, len(bars[asset]["high"]))]
+            if not assets:
+                return
+            lengths = [len(bars[asset]["high"]) for asset in assets]
+            starts = np.cumsum(lengths[:-1], dtype=np.int64)
+            columns = {column: np.concatenate([np.asarray(bars[asset][column], dtype=np.float64) for asset in assets])
+                       for column in ("open", "high", "low", "spread") if all(column in bars[asset] for asset in assets)}
+
+        high, low = columns["high"], columns["low"]
+        open = columns.get("open", np.full(high.shape[0], np.nan))
+        # the stored spreads were estimated over the default window
+        spreads = columns.get("spread") if self.__window == SPREAD_WINDOW else None
+        if spreads is None:
+            spreads = corwin_schultz_spread(high, low, self.__window, starts)
+        for asset, asset_open, asset_high, asset_low, asset_spreads in zip(assets, np.split(open, starts), np.split(high, starts),
+                                                                           np.split(low, starts), np.split(spreads, starts)):
+            self.__opens[asset] = asset_open
+            self.__highs[asset] = asset_high
+            self.__lows[asset] = asset_low
+            self.__spreads[asset] = asset_spreads
+
+    def spreads(self, asset: str) -> np.ndarray:
+        '''
+        Returns:
+            - the estimated spread of every bar of `asset`, None if its bars were not loaded
+        '''
+        return self.__spreads.get(asset)
 
-    def submit_order(self,asset: str, df: pd.DataFrame, ask_price: int, type: str) -> Union[float, int]:
+    def submit_order(self,asset: str, df: pd.DataFrame, ask_price: int, type: str, side: int = 1) -> Union[float, int]:
         '''
         Emulates submitting an order to a brokerage firm.
         Parameters:
             - asset     : The asset we would like to purchase
-            - df        : The dataframe that contains OHLCV data
+            - df        : The dataframe that contains OHLCV data, the order being placed on its last bar
             - ask_price : The price we would like to buy the asset
             - type      : The type of order. Valid options include:
                         "market order"
                         "limit order"
                         "stop order"
+            - side      : 1 to buy, -1 to sell
         Returns:
-            - Price at which the commodity was purchased
-        '''
-        # get df with asset
-        # asset_df: pd.DataFrame = df.loc[asset]
-        asset_df = df
-        # for now, we just buy the asset and return the price it was brought for 
-        if asset_df.iloc[-1]['high'] >= ask_price:
-            return ask_price
-        else: # error: The ask_price is not valid
-            return -1
-    '''
-    The purpose of this method is to calculate the bid-ask spread. We use the method described in "A Simple Way to Estimate
-    Bid-Ask Spreads from Daily High and Low Prices."
-    '''
-    '''
-    def calculate_bid_ask_spread(self,df,index):
-        observed_high = max(df[index - 1]['high'], df[index]['high'])
-        observed_low = min(df[index - 1]['low'], df[index]['low'])
-        gamma = (math.log(observed_high/observed_low)) ** 2
+            - Price at which the commodity was purchased, -1 if the order was not filled
+        '''
+        # once the bars of the asset are loaded, only the number of the bar is needed
+        if asset in self.__highs:
+            return self.submit_order_at(asset, len(df) - 1, ask_price, type, side)
+        return self.submit_order_bar(asset, df.iloc[-1], ask_price, type, side)
 
-        # we take the positive root and solve for alpha w.r.t the quadratic equation
-        alpha = (math.sqrt(2 * beta) - math.sqrt(beta))/(3 - (2 * math.sqrt(2))) - math.sqrt(gamma/(3 - (2 * math.sqrt(2))))
-        spread = 2 * (math.exp(alpha) - 1)/(1 + math.exp(alpha))
-        pass
-    '''
+    def submit_order_at(self, asset: str, index: int, ask_price: float, type: str, side: int = 1) -> Union[float, int]:
+        '''
+        Same as `submit_order()`, given the number of the bar the order is placed on, among the loaded bars of `asset`.
+        '''
+        return self.__fill(self.__opens[asset][index], self.__highs[asset][index], self.__lows[asset][index],
+                           self.__spreads[asset][index], ask_price, type, side)
+
+    def submit_order_bar(self, asset: str, bar, ask_price: float, type: str, side: int = 1, index: int = None) -> Union[float, int]:
+        '''
+        Same as `submit_order()`, given only the bar the order is placed on (anything indexable by 'high' and 'low,'
+        e.g. a dataframe row or a dict), so callers streaming bars do not need to build a dataframe.
+
+        Parameters:
+            - index : number of the bar. If the bars of `asset` were loaded up to it, its estimated spread is charged;
+                      otherwise the bar's own 'spread' is, if it has one.
+        '''
+        if index is not None and asset in self.__highs and index < self.__highs[asset].shape[0]:
+            return self.submit_order_at(asset, index, ask_price, type, side)
+        spread = bar["spread"] if "spread" in bar else np.nan
+        open = bar["open"] if "open" in bar else np.nan
+        return self.__fill(open, bar['high'], bar['low'], spread, ask_price, type, side)
+
+    def fill_trades(self, asset: str, trades: np.ndarray, bars=None) -> np.ndarray:
+        '''
+        Fills the orders behind closed trades at once, for backtests that generate the trades of an asset in a single
+        pass (see `position.generate_signals()`, which is given the order type). Every reversal is one order, placed
+        on the bar before the entry of a short and on the bar of the entry of a long (as in the backtest), so each
+        entry and exit price is moved as `submit_order()` would have moved it. The trades are taken to have been
+        filled, so stop orders must only be recorded once triggered (as `position.generate_signals()` does).
+
+        Parameters:
+            - trades : structured array of TRADE_DTYPE, filled at the prices the orders were placed at
+            - bars   : bars of `asset`, loaded first if given and not loaded yet (see `load()`)
+        Returns:
+            - copy of `trades` at the prices they were filled at (`trades` itself for limit orders)
+        '''
+        if self.__order_type == "LIMIT" or len(trades) == 0:
+            return trades
+        if bars is not None:
+            self.load({asset: bars}, reload=False)
+
+        trades = trades.copy()
+        side = trades["side"].astype(np.float64)
+        # the order of a reversal to short is placed on the bar before the one it is recorded on
+        entry_bars = trades["entry_index"] - (trades["side"] == -1)
+        exit_bars = trades["exit_index"] - (trades["side"] == 1)
+        entry_prices, exit_prices = trades["entry_price"], trades["exit_price"]
+        if self.__order_type == "STOP":
+            entry_prices = self.__gap_prices(asset, entry_bars, entry_prices, side)
+            exit_prices = self.__gap_prices(asset, exit_bars, exit_prices, -side)
+        trades["entry_price"] = entry_prices * (1 + side * self.__costs(asset, entry_bars))
+        trades["exit_price"] = exit_prices * (1 - side * self.__costs(asset, exit_bars))
+        return trades
+
+    def __gap_prices(self, asset: str, indexes: np.ndarray, prices: np.ndarray, side: np.ndarray) -> np.ndarray:
+        # a stop order is filled at the open of the bar if it opened beyond the stop; side 0 (the initial position)
+        # is left as is
+        opens = self.__opens[asset][indexes]
+        gapped = (side * opens > side * prices) & (side != 0)
+        return np.where(gapped, opens, prices)
+
+    def __loaded(self, asset: str, n_bars: int) -> bool:
+        return asset in self.__highs and self.__highs[asset].shape[0] == n_bars
+
+    def __costs(self, asset: str, indexes: np.ndarray) -> np.ndarray:
+        # fraction of the price a market order loses on each of the bars
+        costs = np.full(indexes.shape[0], float(self.__slippage))
+        if self.__spread:
+            costs += np.nan_to_num(self.__spreads[asset][indexes]) / 2
+        return costs
 
+    def __fill(self, open: float, high: float, low: float, spread: float, ask_price: float, type: str, side: int) -> Union[float, int]:
+        type = _order_type(type)
+        # -1 when the ask_price is not valid (the order is not filled)
+        if type == "LIMIT":
+            return ask_price if high >= ask_price else -1
+        if type == "STOP":
+            # a buy stop is triggered once the high gets to it, a sell stop once the low does
+            if not (high >= ask_price if side == 1 else low <= ask_price):
+                return -1
+            # the bar gapped through the stop
+            if side * open > side * ask_price:
+                ask_price = open
+        cost = self.__slippage
+        if self.__spread and not np.isnan(spread):
+            cost += spread / 2
+        return ask_price * (1 + side * cost)
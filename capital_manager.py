@@ -19,29 +19,71 @@ class CapitalManager():
         # maximum amount of capital allowed to be allocated in total
         self.__total_margin = total_capital * margin
         self.__buying_power = total_capital
+        # capital currently allocated to each commodity
+        self.__allocated = {}
     
     
-    def submit_order_check(self, number_of_shares: Union[float, int], cost: float) -> bool:
+    def submit_order_check(self, number_of_shares: Union[float, int], cost: float, asset: str = None) -> bool:
         '''
         Checks to make sure we are able to buy an underlying asset based on our capital management system
         Parameters:
             - number_of_shares : Number of shares we are able to purchase. For now, we will only take ints as input (i.e., no fractional shares)
             - cost             : Cost of the asset
+            - asset            : The commodity. The order reverses the position held in it, which frees what that
+                                 position had allocated; the new position must keep what is allocated to the commodity
+                                 within the margin per commodity, and in total within the total margin. Long and
+                                 short positions alike allocate their cost.
         return:
             bool indicating whether the order is able to be made
         '''
 
         total_cost = number_of_shares * cost
-        if total_cost > self.__buying_power:
+        released = self.__allocated.get(asset, 0)
+        if total_cost > self.__buying_power + released:
+            return False
+        if self.__total_capital_allocated - released + total_cost > self.__total_margin:
+            return False
+        if total_cost > self.__margin_per_commodity:
             return False
         return True
 
-    def buy(self, number_of_shares: Union[float, int], cost: float) -> None:
-        total_cost = number_of_shares * cost
-        self.__buying_power -= total_cost
+    def buy(self, number_of_shares: Union[float, int], cost: float, asset: str = None) -> None:
+        # opens a long position, allocating its cost
+        self.__allocate(number_of_shares * cost, asset)
 
-    def sell(self, number_of_shares: Union[float, int], cost: float, profits_losses: float) -> None:
-        self.set_total_capital(profits_losses, cost)
+    def sell_short(self, number_of_shares: Union[float, int], cost: float, asset: str = None) -> None:
+        # opens a short position, allocating its cost as margin
+        self.__allocate(number_of_shares * cost, asset)
+
+    def close(self, profits_losses: float, asset: str = None) -> None:
+        '''
+        Closes the position (long or short) held in `asset`: what it allocated is released, and it and the profits
+        or losses of the position can be used again.
+        '''
+        released = self.__allocated.pop(asset, 0)
+        self.set_total_capital(profits_losses, released)
+        self.__buying_power += released + profits_losses
+
+    @property
+    def total_capital(self) -> float:
+        return self.__total_capital
+
+    @property
+    def buying_power(self) -> float:
+        return self.__buying_power
+
+    @property
+    def total_capital_allocated(self) -> float:
+        return self.__total_capital_allocated
+
+    def allocated(self, asset: str) -> float:
+        # capital currently allocated to `asset`
+        return self.__allocated.get(asset, 0)
+
+    def __allocate(self, total_cost: float, asset: str) -> None:
+        self.__buying_power -= total_cost
+        self.__total_capital_allocated += total_cost
+        self.__allocated[asset] = self.__allocated.get(asset, 0) + total_cost
 
     def set_total_capital(self, profits_losses: float, buy_price: float):
         self.__total_capital += profits_losses
@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from settings import CHART_WIDTH, CHART_HEIGHT, CHART_DPI, CHART_PIXELS_PER_BAR
+
+OHLC_COLUMNS = ["open", "high", "low", "close"]
+
+
+def marker_series(n_bars: int, trades: np.ndarray) -> tuple:
+    '''
+    Places the entry of every trade on its bar, in one scatter over the trades instead of a loop over the bars.
+
+    Parameters:
+        - n_bars : number of bars of the chart. Trades entered on later bars are left out.
+        - trades : structured array of TRADE_DTYPE or LEDGER_DTYPE. When several trades of a side are entered on the
+                   same bar, the last one is shown.
+    Returns:
+        - long and short markers: arrays of `n_bars` entry prices, NaN where no trade of that side was entered
+    '''
+    markers = []
+    for side in (1, -1):
+        values = np.full(n_bars, np.nan)
+        entered = trades[(trades["side"] == side) & (trades["entry_index"] >= 0) & (trades["entry_index"] < n_bars)]
+        values[entered["entry_index"]] = entered["entry_price"]
+        markers.append(values)
+    return markers[0], markers[1]
+
+
+def downsample(df: pd.DataFrame, max_bars: int) -> tuple:
+    '''
+    Merges consecutive bars so no more than `max_bars` are left: each merged bar opens at the first open, closes at
+    the last close, and spans the highest high and lowest low of the bars it is made of.
+
+    Returns:
+        - the downsampled bars, and the number of bars merged into each (1 if `df` is short enough already)
+    '''
+    n_bars = df.shape[0]
+    if n_bars <= max_bars:
+        return df, 1
+    step = -(-n_bars // max_bars)
+    starts = np.arange(0, n_bars, step)
+    bars = {
+        "open": df["open"].to_numpy()[starts],
+        "high": np.fmax.reduceat(df["high"].to_numpy(dtype=np.float64), starts),
+        "low": np.fmin.reduceat(df["low"].to_numpy(dtype=np.float64), starts),
+        "close": df["close"].to_numpy()[np.minimum(starts + step, n_bars) - 1],
+    }
+    if "volume" in df.columns:
+        bars["volume"] = np.add.reduceat(np.nan_to_num(df["volume"].to_numpy(dtype=np.float64)), starts)
+    return pd.DataFrame(bars, index=df.index[starts]), step
+
+
+def render_chart(df: pd.DataFrame, trades: np.ndarray, path: str, title: str = 'Swing Index System',
+                 width: int = CHART_WIDTH, height: int = CHART_HEIGHT, dpi: int = CHART_DPI) -> str:
+    '''
+    Renders the bars and the entries of the trades to an image file. The figure is saved and closed without being
+    shown, so the backtest is not blocked.
+
+    Parameters:
+        - df     : bars with at least 'open,' 'high,' 'low,' and 'close,' the row number being the trades' index
+        - trades : structured array of TRADE_DTYPE or LEDGER_DTYPE
+        - path   : file the chart is saved to; the format follows its extension
+        - width, height, dpi : size of the image. Histories longer than `width / CHART_PIXELS_PER_BAR` bars are
+                               downsampled (see `downsample()`), with each entry shown on the bar it was merged into.
+    Returns:
+        - path
+    '''
+    long_markers, short_markers = marker_series(df.shape[0], trades)
+    max_bars = max(1, width // CHART_PIXELS_PER_BAR)
+    bars, step = downsample(df, max_bars)
+    if step > 1:
+        # the last entry merged into each bar is shown on it
+        long_markers = pd.Series(long_markers).groupby(np.arange(df.shape[0]) // step).last().to_numpy()
+        short_markers = pd.Series(short_markers).groupby(np.arange(df.shape[0]) // step).last().to_numpy()
+
+    # matplotlib and mplfinance are slow to import, so they are only imported to render
+    import mplfinance as mpf
+
+    # mplfinance rejects scatter plots without any point
+    markers = [mpf.make_addplot(values, type='scatter', markersize=120, marker=marker)
+               for values, marker in ((long_markers, '^'), (short_markers, 'v')) if not np.isnan(values).all()]
+    mpf.plot(bars[OHLC_COLUMNS], title=title, ylabel='Price', addplot=markers, figsize=(width / dpi, height / dpi),
+             savefig=dict(fname=path, dpi=dpi), warn_too_much_data=max_bars + 1)
+    return path
+
+
+def render_charts(charts: dict, directory: str, workers: int = 1, extension: str = "png", **kwargs) -> list:
+    '''
+    Renders one chart per asset to `directory`, spread over `workers` processes.
+
+    Parameters:
+        - charts : dict mapping each asset to its bars and trades (see `render_chart()`)
+        - kwargs : passed on to `render_chart()`
+    Returns:
+        - paths of the charts, in the order of `charts`
+    '''
+    os.makedirs(directory, exist_ok=True)
+    assets = list(charts)
+    paths = [os.path.join(directory, f"{asset}.{extension}") for asset in assets]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_headless) as executor:
+            futures = [executor.submit(render_chart, charts[asset][0], charts[asset][1], path, asset, **kwargs)
+                       for asset, path in zip(assets, paths)]
+            return [future.result() for future in futures]
+    return [render_chart(charts[asset][0], charts[asset][1], path, asset, **kwargs) for asset, path in zip(assets, paths)]
+
+
+def _headless() -> None:
+    # workers draw off screen, so they need no display
+    import matplotlib
+    matplotlib.use("Agg")
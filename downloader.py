@@ -0,0 +1,229 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+from settings import ALPACA_DATA_LINK, DOWNLOAD_REQUESTS_PER_MINUTE
+
+
+class TransportError(Exception):
+
+    '''
+    Raised by a transport when a request fails.
+
+     - status : HTTP status code of the response (None if no response was received, e.g. a timeout)
+    '''
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        # rate limited, server errors and network failures are worth another try; bad requests are not
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+class AiohttpTransport:
+
+    '''
+    Sends requests to Alpaca's market data API over one pooled aiohttp session, which is opened on the first
+    request and kept until `close()`.
+
+     - key_id, secret_key : Alpaca API keys
+     - base_url           : root of the market data API. Point it at a local server to test without a connection.
+     - max_connections    : size of the connection pool
+     - timeout            : seconds before a request is given up on
+    '''
+    def __init__(self, key_id: str, secret_key: str, base_url: str = ALPACA_DATA_LINK, max_connections: int = 8, timeout: float = 30):
+        self.__headers = {"APCA-API-KEY-ID": key_id, "APCA-API-SECRET-KEY": secret_key}
+        self.__base_url = base_url.rstrip("/")
+        self.__max_connections = max_connections
+        self.__timeout = timeout
+        self.__session = None
+
+    async def get(self, path: str, params: dict) -> dict:
+        '''
+        Returns:
+            - decoded JSON body of the response to GET `base_url + path`
+        '''
+        # aiohttp is only imported once requests are sent
+        import aiohttp
+
+        if self.__session is None:
+            self.__session = aiohttp.ClientSession(headers=self.__headers,
+                                                   connector=aiohttp.TCPConnector(limit=self.__max_connections),
+                                                   timeout=aiohttp.ClientTimeout(total=self.__timeout))
+        try:
+            async with self.__session.get(self.__base_url + path, params=params) as response:
+                if response.status != 200:
+                    raise TransportError(response.status, await response.text())
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            raise TransportError(None, repr(error))
+
+    async def close(self) -> None:
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+
+class RateLimiter:
+
+    '''
+    Spaces the start of requests evenly so no more than `requests_per_minute` are sent in any minute.
+    '''
+    def __init__(self, requests_per_minute: float):
+        self.__interval = 60.0 / requests_per_minute
+        self.__next = 0.0
+        self.__lock = None
+
+    async def acquire(self) -> None:
+        # the lock is created lazily so it belongs to the loop that uses it
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+        async with self.__lock:
+            now = time.monotonic()
+            wait = self.__next - now
+            self.__next = max(now, self.__next) + self.__interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BarDownloader:
+
+    '''
+    Downloads bars for large universes. The symbols and the date range are split into chunks, which are requested
+    concurrently (following the pages of each response) under a rate limit, with failed requests retried with
+    exponential backoff. All requests go through a single transport, so the HTTP connections are pooled.
+
+    It has the same `fetch()` method as the other bar sources, so it is usually handed to a `BarStore`, which then
+    writes the downloaded bars straight into the local bar cache:
+
+        BarStore(BAR_STORE_DIRECTORY, BarDownloader(AiohttpTransport(key_id, secret_key)))
+
+     - transport           : sends the requests. Any object with `async get(path, params) -> dict` and
+                             `async close()` methods, raising `TransportError` on failure (see `AiohttpTransport`)
+     - symbols_per_request : number of symbols in each chunk
+     - period_per_request  : length of the date range of each chunk
+     - max_concurrency     : number of chunks downloaded at the same time
+     - requests_per_minute : rate limit of the API
+     - retries             : number of times a failed request is retried
+     - backoff             : seconds to wait before the first retry, doubled on each retry after that
+    '''
+    def __init__(self, transport, symbols_per_request: int = 100, period_per_request: pd.Timedelta = pd.Timedelta(days=365),
+                 max_concurrency: int = 4, requests_per_minute: float = DOWNLOAD_REQUESTS_PER_MINUTE, retries: int = 3, backoff: float = 1.0):
+        self.__transport = transport
+        self.__symbols_per_request = symbols_per_request
+        self.__period_per_request = pd.Timedelta(period_per_request)
+        self.__max_concurrency = max_concurrency
+        self.__rate_limiter = RateLimiter(requests_per_minute)
+        self.__retries = retries
+        self.__backoff = backoff
+        # the transport's connections live in this loop, so they are reused from one `fetch()` to the next
+        self.__loop = None
+
+    def fetch(self, symbols: list, timeframe, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        '''
+        Blocking version of `fetch_async()`, for callers that are not running an event loop themselves. The requests
+        run in a loop of the downloader's own, kept from one call to the next along with the transport's connections;
+        code already running in an event loop must await `fetch_async()` instead.
+        '''
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("BarDownloader.fetch() cannot be called from a running event loop, await fetch_async() instead")
+        if self.__loop is None:
+            self.__loop = asyncio.new_event_loop()
+        return self.__loop.run_until_complete(self.fetch_async(symbols, timeframe, start, end))
+
+    async def fetch_async(self, symbols: list, timeframe, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        '''
+        Downloads the chunks concurrently. If a chunk fails (once its retries are used up), the chunks still being
+        downloaded are cancelled and its error is raised.
+
+        Returns:
+            - dataframe indexed by (symbol, timestamp), like `client.get_stock_bars(...).df`
+        '''
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+        end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+
+        symbol_chunks = [symbols[i:i + self.__symbols_per_request] for i in range(0, len(symbols), self.__symbols_per_request)]
+        period_chunks = []
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + self.__period_per_request, end)
+            period_chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + pd.Timedelta(microseconds=1)
+
+        semaphore = asyncio.Semaphore(self.__max_concurrency)
+
+        async def download(chunk_symbols, chunk_start, chunk_end):
+            async with semaphore:
+                return await self.__download_chunk(chunk_symbols, timeframe, chunk_start, chunk_end)
+
+        tasks = [asyncio.ensure_future(download(chunk_symbols, chunk_start, chunk_end))
+                 for chunk_symbols in symbol_chunks for chunk_start, chunk_end in period_chunks]
+        try:
+            chunks = await asyncio.gather(*tasks)
+        except BaseException:
+            # the other chunks are of no use anymore, so they are not left running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return self.__to_frame([bar for chunk in chunks for bar in chunk])
+
+    def close(self) -> None:
+        '''
+        Closes the pooled connections of the transport.
+        '''
+        if self.__loop is not None:
+            self.__loop.run_until_complete(self.__transport.close())
+            self.__loop.close()
+            self.__loop = None
+
+    async def __download_chunk(self, symbols: list, timeframe, start: pd.Timestamp, end: pd.Timestamp) -> list:
+        '''
+        Returns:
+            - list of (symbol, raw bar) over every page of the response
+        '''
+        params = {
+            "symbols": ",".join(symbols),
+            "timeframe": str(timeframe),
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "limit": 10000,
+        }
+        bars = []
+        while True:
+            page = await self.__get("/stocks/bars", params)
+            for symbol, symbol_bars in (page.get("bars") or {}).items():
+                bars.extend((symbol, bar) for bar in symbol_bars)
+            if not page.get("next_page_token"):
+                return bars
+            params = dict(params, page_token=page["next_page_token"])
+
+    async def __get(self, path: str, params: dict) -> dict:
+        for attempt in range(self.__retries + 1):
+            await self.__rate_limiter.acquire()
+            try:
+                return await self.__transport.get(path, params)
+            except TransportError as error:
+                if not error.retryable or attempt == self.__retries:
+                    raise
+            await asyncio.sleep(self.__backoff * 2 ** attempt)
+
+    def __to_frame(self, bars: list) -> pd.DataFrame:
+        # same columns as the dataframes of alpaca's `BarSet`
+        columns = {"open": "o", "high": "h", "low": "l", "close": "c", "volume": "v", "trade_count": "n", "vwap": "vw"}
+        if not bars:
+            return pd.DataFrame(columns=list(columns))
+        index = pd.MultiIndex.from_arrays([[symbol for symbol, _ in bars],
+                                           pd.to_datetime([bar["t"] for _, bar in bars], utc=True)],
+                                          names=["symbol", "timestamp"])
+        data = {column: np.array([bar.get(key, np.nan) for _, bar in bars], dtype=np.float64) for column, key in columns.items()}
+        df = pd.DataFrame(data, index=index)
+        # chunks finish in any order; sort them back, dropping any bar that was returned twice
+        return df[~df.index.duplicated()].sort_index()
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from position import TRADE_DTYPE, positions_to_trades, trades_to_positions
+
+# a closed trade of the ledger: TRADE_DTYPE plus the asset it belongs to (see `TradeLedger.assets`)
+LEDGER_DTYPE = np.dtype([("asset_id", np.int32)] + [(name, TRADE_DTYPE[name]) for name in TRADE_DTYPE.names])
+
+
+class TradeLedger:
+
+    '''
+    Append-only record of closed trades, held in one structured array of LEDGER_DTYPE. The array grows
+    geometrically, so appending is amortized O(1) per trade, and the P&L and holding time of every trade are
+    calculated at once. Asset names are stored once, and each trade refers to its asset by number.
+
+     - capacity : number of trades room is made for initially
+    '''
+    def __init__(self, capacity: int = 1024):
+        self.__trades = np.zeros(max(1, capacity), dtype=LEDGER_DTYPE)
+        self.__n_trades = 0
+        self.__assets = []
+        self.__asset_ids = {}
+
+    def __len__(self) -> int:
+        return self.__n_trades
+
+    @property
+    def assets(self) -> list:
+        # asset names, indexed by asset id
+        return self.__assets
+
+    @property
+    def trades(self) -> np.ndarray:
+        # view of the trades recorded so far, in the order they were appended (or sorted in, see `sort()`)
+        return self.__trades[:self.__n_trades]
+
+    def asset_id(self, asset: str) -> int:
+        '''
+        Returns:
+            - the number `asset` is recorded under, registering it if it is new
+        '''
+        if asset not in self.__asset_ids:
+            self.__asset_ids[asset] = len(self.__assets)
+            self.__assets.append(asset)
+        return self.__asset_ids[asset]
+
+    def trades_of(self, asset: str) -> np.ndarray:
+        '''
+        Returns:
+            - the trades recorded for `asset`, in the order they were appended
+        '''
+        trades = self.trades
+        if asset not in self.__asset_ids:
+            return trades[:0]
+        return trades[trades["asset_id"] == self.__asset_ids[asset]]
+
+    def append(self, asset: str, trades: np.ndarray) -> None:
+        '''
+        Records the closed trades of `asset`, a structured array of TRADE_DTYPE (see `position.generate_signals()`).
+        '''
+        self.__extend(np.full(len(trades), self.asset_id(asset), dtype=np.int32), trades)
+
+    def append_positions(self, positions: list) -> None:
+        '''
+        Records closed positions, which may belong to different assets.
+        '''
+        asset_ids = np.array([self.asset_id(position.asset) for position in positions], dtype=np.int32)
+        self.__extend(asset_ids, positions_to_trades(positions))
+
+    @property
+    def profits_losses(self) -> np.ndarray:
+        # same definition as `Position.profits_losses`
+        trades = self.trades
+        return trades["num_shares"] * (trades["entry_price"] - trades["exit_price"])
+
+    @property
+    def time_held(self) -> np.ndarray:
+        trades = self.trades
+        return trades["exit_index"] - trades["entry_index"]
+
+    @property
+    def asset_names(self) -> np.ndarray:
+        # asset name of every trade
+        return np.array(self.__assets, dtype=object)[self.trades["asset_id"]] if self.__assets else np.empty(0, dtype=object)
+
+    def sort(self) -> None:
+        '''
+        Orders the recorded trades in place as sorting their positions with `position_sort_key` does (by the index
+        they were entered at), ties being broken by asset name and then by exit index, so the order does not depend
+        on the order the engine appended the trades in.
+        '''
+        trades = self.trades
+        # rank of every asset id by asset name
+        names = np.empty(len(self.__assets), dtype=np.int64)
+        names[np.argsort(np.array(self.__assets, dtype=object))] = np.arange(len(self.__assets))
+        order = np.lexsort((trades["exit_index"], names[trades["asset_id"]], trades["entry_index"]))
+        trades[:] = trades[order]
+
+    def to_positions(self) -> list:
+        '''
+        Converts the ledger back into closed positions, e.g. for code that still works on lists of positions.
+        '''
+        positions = []
+        trades = self.trades
+        for k in range(len(trades)):
+            positions.extend(trades_to_positions(trades[k:k + 1], self.__assets[trades["asset_id"][k]]))
+        return positions
+
+    def to_frame(self, dates: dict = None) -> pd.DataFrame:
+        '''
+        Returns:
+            - dataframe with one row per trade. 'buy_index' and 'buy_price' are views of the trades of the ledger,
+              not copies: the columns are not consolidated into blocks, which would copy them.
+
+        Parameters:
+            - dates : optional dict mapping each asset to the timestamps of its bars, to add the date each trade was
+                      entered on ('buy_date')
+        '''
+        trades = self.trades
+        df = pd.DataFrame({
+            "profits_losses": self.profits_losses,
+            "asset": self.asset_names,
+            "buy_index": trades["entry_index"],
+            "time_held": self.time_held,
+            "buy_price": trades["entry_price"],
+        }, copy=False)
+        # each column stays in its own block, so the ones taken from the ledger still share its memory
+        if dates is not None:
+            df["buy_date"] = self.__entry_dates(dates)
+        return df
+
+    def __entry_dates(self, dates: dict) -> pd.DatetimeIndex:
+        # look every entry index up in the timestamps of all assets laid end to end
+        indexes = [pd.DatetimeIndex(dates[asset]) for asset in self.__assets]
+        if not indexes:
+            return pd.DatetimeIndex([])
+        offsets = np.cumsum([0] + [len(index) for index in indexes[:-1]])
+        timestamps = np.concatenate([index.asi8 for index in indexes])
+        trades = self.trades
+        entry_dates = pd.to_datetime(timestamps[offsets[trades["asset_id"]] + trades["entry_index"]], utc=True)
+        tz = indexes[0].tz
+        return entry_dates.tz_convert(tz) if tz is not None else entry_dates.tz_localize(None)
+
+    def __extend(self, asset_ids: np.ndarray, trades: np.ndarray) -> None:
+        n = len(trades)
+        if self.__n_trades + n > len(self.__trades):
+            # grow geometrically, so appending stays cheap on average
+            grown = np.zeros(max(2 * len(self.__trades), self.__n_trades + n), dtype=LEDGER_DTYPE)
+            grown[:self.__n_trades] = self.__trades[:self.__n_trades]
+            self.__trades = grown
+        chunk = self.__trades[self.__n_trades:self.__n_trades + n]
+        chunk["asset_id"] = asset_ids
+        for name in TRADE_DTYPE.names:
+            chunk[name] = trades[name]
+        self.__n_trades += n
@@ -0,0 +1,242 @@
+import heapq
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sw import SwingIndex
+from broker import Broker, SpreadEstimator
+from capital_manager import CapitalManager
+from portfolio import AssetStream, PortfolioSimulator
+from trade_stats import RunningStatistics
+
+# columns of the bars streamed to the live engine
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+class ReplayBarSource:
+
+    '''
+    Replays stored bars as a stream: the bars of every asset are merged by timestamp and yielded one by one, as a
+    live feed would. Useful to run the live engine over past sessions or recorded files.
+
+     - bars  : dict mapping each asset to its bars (see `AssetStream`), e.g. from `BarStore.read_arrays()`
+     - speed : how many times faster than real time the bars are paced (by default they are not paced at all)
+    '''
+    def __init__(self, bars: dict, speed: float = None):
+        self.__bars = bars
+        self.__speed = speed
+
+    @classmethod
+    def from_frame(cls, bars: pd.DataFrame, speed: float = None) -> "ReplayBarSource":
+        '''
+        Parameters:
+            - bars : dataframe indexed by (symbol, timestamp), as returned by `Backtest.get_data_bars()`, or read
+                     back from a file
+        '''
+        arrays = {}
+        for symbol in bars.index.get_level_values(0).unique():
+            df = bars.loc[symbol]
+            arrays[symbol] = {"timestamp": pd.DatetimeIndex(df.index).asi8}
+            arrays[symbol].update({column: df[column].to_numpy(dtype=np.float64) for column in df.columns})
+        return cls(arrays, speed)
+
+    def __iter__(self):
+        '''
+        Yields:
+            - (asset, timestamp in epoch nanoseconds, bar as a dict of its columns)
+        '''
+        assets = list(self.__bars)
+        timestamps = [np.asarray(self.__bars[asset]["timestamp"]) for asset in assets]
+        events = [(timestamps[k][0], k, 0) for k in range(len(assets)) if timestamps[k].shape[0] > 0]
+        heapq.heapify(events)
+
+        previous = None
+        while events:
+            timestamp, k, i = events[0]
+            if self.__speed is not None and previous is not None and timestamp > previous:
+                time.sleep((timestamp - previous) / 1e9 / self.__speed)
+            previous = timestamp
+            bars = self.__bars[assets[k]]
+            yield assets[k], int(timestamp), {column: float(values[i]) for column, values in bars.items() if column != "timestamp"}
+            if i + 1 < timestamps[k].shape[0]:
+                heapq.heapreplace(events, (timestamps[k][i + 1], k, i + 1))
+            else:
+                heapq.heappop(events)
+
+
+class QueueBarSource:
+
+    '''
+    Local feed: bars are pushed with `put()`, from any thread, and the engine consumes them in the order they were
+    pushed. The stream ends once `close()` is called and the bars already pushed are consumed. Websocket handlers
+    push their bars here, and tests can use it as a fake feed.
+
+     - maxsize : number of bars waiting to be consumed before `put()` blocks (unbounded by default)
+    '''
+    def __init__(self, maxsize: int = 0):
+        self.__queue = queue.Queue(maxsize)
+
+    def put(self, asset: str, timestamp, bar: dict) -> None:
+        self.__queue.put((asset, pd.Timestamp(timestamp).value, bar))
+
+    def close(self) -> None:
+        self.__queue.put(None)
+
+    def __iter__(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            yield item
+
+
+class AlpacaBarStream(QueueBarSource):
+
+    '''
+    Minute bars of `symbols` from Alpaca's market data websocket. The websocket runs in a background thread, which
+    pushes each bar into the queue as it is received.
+
+     - key_id, secret_key : Alpaca API keys
+     - symbols            : assets to subscribe to
+    '''
+    def __init__(self, key_id: str, secret_key: str, symbols: list):
+        super().__init__()
+        self.__key_id = key_id
+        self.__secret_key = secret_key
+        self.__symbols = symbols
+        self.__stream = None
+
+    def start(self) -> "AlpacaBarStream":
+        # alpaca.data is slow to import, so it is only imported once the stream is started
+        from alpaca.data.live import StockDataStream
+
+        self.__stream = StockDataStream(self.__key_id, self.__secret_key)
+        self.__stream.subscribe_bars(self.__on_bar, *self.__symbols)
+        threading.Thread(target=self.__stream.run, daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        if self.__stream is not None:
+            self.__stream.stop()
+            self.__stream = None
+        super().close()
+
+    async def __on_bar(self, bar) -> None:
+        self.put(bar.symbol, bar.timestamp, {column: float(getattr(bar, column)) for column in BAR_COLUMNS})
+
+
+class LiveEngine:
+
+    '''
+    Trades the Swing Index System on bars as they arrive. Each bar is appended to its asset's `AssetStream`, whose
+    incremental SwingIndex (and ADXR) takes it in, and the position of the asset acts on its signal right away,
+    through the same rules as `PortfolioSimulator`. The work done per bar does not depend on how long the history
+    is, and the time spent on every bar is recorded in `latency`.
+
+    With unlimited capital, replaying bars through the engine gives every asset the trades of `PortfolioSimulator`
+    on the same bars. The engine acts on a bar as soon as it is complete rather than when the asset's next bar opens,
+    so it also acts on the last bar, and orders of different assets may reach the capital manager in another order.
+
+    The broker is never given the whole history, so the spread of each bar is estimated as it arrives, over the same
+    trailing window the broker would use (see `SpreadEstimator`), and kept in the 'spread' column of the asset's bars.
+    A broker charging the spread thus fills live orders at the prices `PortfolioSimulator` fills them at.
+
+     - capital_manager : the shared pool of capital
+     - swing_index     : SwingIndex holding the parameters of the system
+     - broker          : where orders are filled
+     - num_shares      : number of shares bought on each reversal
+     - capacity        : number of bars room is made for in each asset, so the arrays are not reallocated mid-session
+     - journal         : optional record of every decision (see `PortfolioSimulator`)
+    '''
+    def __init__(self, capital_manager: CapitalManager, swing_index: SwingIndex, broker: Broker = None, num_shares: int = 1, capacity: int = 4096, journal=None):
+        self.__broker = broker if broker is not None else Broker()
+        self.__simulator = PortfolioSimulator(capital_manager, swing_index, self.__broker, num_shares, journal)
+        self.__swing_index = swing_index
+        self.__capacity = capacity
+        self.__streams = {}
+        self.__spread_estimators = {}
+        self.__inactive_orders = []
+        self.__latency = RunningStatistics()
+        self.__last_latency = np.nan
+
+    @property
+    def inactive_orders(self) -> list:
+        # closed positions, in the order they were closed
+        return self.__inactive_orders
+
+    @property
+    def latency(self) -> RunningStatistics:
+        # seconds spent processing each bar
+        return self.__latency
+
+    @property
+    def last_latency(self) -> float:
+        return self.__last_latency
+
+    @property
+    def rejected_orders(self) -> int:
+        return self.__simulator.rejected_orders
+
+    def stream(self, asset: str) -> AssetStream:
+        '''
+        Returns:
+            - the state of `asset` (its bars, signal columns, and current position), created on its first bar
+        '''
+        if asset not in self.__streams:
+            bars = {"timestamp": np.zeros(0, dtype=np.int64)}
+            bars.update({column: np.zeros(0) for column in BAR_COLUMNS + ["spread"]})
+            self.__streams[asset] = AssetStream(asset, bars, self.__swing_index, self.__capacity)
+            self.__spread_estimators[asset] = SpreadEstimator(self.__broker.window)
+        return self.__streams[asset]
+
+    def warm_up(self, bars: pd.DataFrame) -> None:
+        '''
+        Runs the engine over past bars (e.g. the session so far) before going live, so the indicators and positions
+        are up to date. Orders are placed as they would have been, but the latency is not recorded.
+
+        Parameters:
+            - bars : dataframe indexed by (symbol, timestamp)
+        '''
+        for asset, timestamp, bar in ReplayBarSource.from_frame(bars):
+            self.__process(asset, timestamp, bar)
+
+    def on_bar(self, asset: str, timestamp: int, bar: dict):
+        '''
+        Processes a complete bar of `asset`.
+
+        Returns:
+            - the position that was closed on this bar, if any
+        '''
+        begin = time.perf_counter()
+        closed = self.__process(asset, timestamp, bar)
+        self.__last_latency = time.perf_counter() - begin
+        self.__latency.update(self.__last_latency)
+        return closed
+
+    def run(self, source, max_bars: int = None) -> list:
+        '''
+        Processes the bars of `source` until it ends (or `max_bars` have been processed).
+
+        Parameters:
+            - source : iterable of (asset, timestamp in epoch nanoseconds, bar as a dict), e.g. `ReplayBarSource`,
+                       `QueueBarSource` or `AlpacaBarStream`
+        Returns:
+            - the positions closed so far
+        '''
+        for n, (asset, timestamp, bar) in enumerate(source, 1):
+            self.on_bar(asset, timestamp, bar)
+            if max_bars is not None and n >= max_bars:
+                break
+        return self.__inactive_orders
+
+    def __process(self, asset: str, timestamp: int, bar: dict):
+        stream = self.stream(asset)
+        # bars without an estimate are not charged any spread, so they are stored as 0 (as `BarStore` does)
+        spread = self.__spread_estimators[asset].update(bar["high"], bar["low"])
+        i = stream.append(timestamp, {**bar, "spread": np.nan_to_num(spread)})
+        # the bar is complete, so it is the current day of the next one
+        closed = self.__simulator.on_bar(stream, i + 1)
+        if closed is not None:
+            self.__inactive_orders.append(closed)
+        return closed
@@ -2,7 +2,6 @@ from backtest_engine import Backtest
 import pandas as pd
 from datetime import date, timedelta
 from bayes_opt import BayesianOptimization
-from settings import api
 
 # Read the CSV file
 stock_df = pd.read_csv('/Users/johncabrahams/Desktop/Projects/Operation Algo/operation_dart_monkey/list_of_securities.csv')
@@ -52,6 +51,9 @@ for parameter in parameters:
 
 pbounds = dict(zip(keys, bounds))
 
+# The bars, HIP/LOP and ADXR do not depend on the parameters, so they are calculated once for the whole optimization
+sweep = None
+
 def backtest_wrapper_to_optimize(c1, c2, c3, c4, c5, c6, c7, a1, a2):
     '''
     The purpose of this is to wrap our objective function so it only takes as inputs the 
@@ -74,8 +76,11 @@ def backtest_wrapper_to_optimize(c1, c2, c3, c4, c5, c6, c7, a1, a2):
     # difference between current and previous date
     delta = timedelta(days=1)
 
-    total_capital = 100000
-    return backtest_engine.backtest(s, total_capital, start_dt, end_dt, c1, c2, c3, c4, c5, c6, c7, a1, a2)
+    global sweep
+    if sweep is None:
+        sweep = backtest_engine.parameter_sweep(s, start_dt, end_dt)
+    # total profits/losses for these parameters
+    return sweep.evaluate(c1, c2, c3, c4, c5, c6, c7, a1, a2)
 
 '''
 optimizer = BayesianOptimization(
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+from sw import calculate_asi, calculate_adxr, find_swing_points
+from position import SIGNAL_COLUMNS, generate_signals_from_arrays
+
+
+class Panel:
+
+    '''
+    Cross-sectional view of the bars of many symbols: every column is pivoted into an aligned (dates x symbols) array,
+    along with a mask of the bars that exist. The Swing Index System variables of every symbol are then calculated
+    in one vectorized pass, instead of one `.loc[asset]` dataframe at a time.
+
+    The indicators of a symbol only ever see that symbol's own bars: before calculating, each column is packed so
+    that its bars are contiguous from the top (the dates on which the symbol did not trade are moved to the end),
+    and the results are scattered back onto the dates afterwards. The values are therefore the same as those of
+    `SwingIndex.initialize_swing_df_demo()` on `bars.loc[symbol]`.
+
+     - bars    : dataframe indexed by (symbol, timestamp), as returned by `Backtest.get_data_bars()`
+     - symbols : symbols to include, in this order (by default, every symbol in `bars`)
+    '''
+    def __init__(self, bars: pd.DataFrame, symbols: list = None):
+        if symbols is None:
+            symbols = list(bars.index.get_level_values(0).unique())
+        self.__symbols = list(symbols)
+        self.__columns = list(bars.columns)
+
+        symbol_codes = pd.Index(self.__symbols).get_indexer(bars.index.get_level_values(0))
+        bars = bars[symbol_codes >= 0]
+        symbol_codes = symbol_codes[symbol_codes >= 0]
+        self.__dates, date_codes = np.unique(bars.index.get_level_values(1), return_inverse=True)
+        self.__dates = pd.DatetimeIndex(self.__dates, name="timestamp")
+
+        shape = (len(self.__dates), len(self.__symbols))
+        self.__present = np.zeros(shape, dtype=bool)
+        self.__present[date_codes, symbol_codes] = True
+        self.__values = {}
+        for column in self.__columns:
+            values = np.full(shape, np.nan)
+            values[date_codes, symbol_codes] = bars[column].to_numpy(dtype=np.float64)
+            self.__values[column] = values
+
+        # packing order: for each symbol, the dates of its bars first (in order), then the dates it has no bar on
+        self.__order = np.argsort(~self.__present, axis=0, kind="stable")
+        self.__n_bars = self.__present.sum(axis=0)
+        self.__packed = {column: np.take_along_axis(values, self.__order, axis=0) for column, values in self.__values.items()}
+
+    @property
+    def symbols(self) -> list:
+        return self.__symbols
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return self.__dates
+
+    @property
+    def present(self) -> np.ndarray:
+        # (dates x symbols) mask of the bars that exist
+        return self.__present
+
+    def values(self, column: str) -> np.ndarray:
+        '''
+        Returns:
+            - (dates x symbols) array of `column`, NaN where a symbol has no bar
+        '''
+        return self.__values[column]
+
+    def swing_arrays(self, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, adxr_sell_threshold=20, adxr_buy_threshold=20) -> dict:
+        '''
+        Calculates the Swing Index System variables of every symbol at once (same arguments as `SwingIndex`).
+
+        Returns:
+            - dict mapping each of 'asi,' 'hsp,' 'hip,' 'lsp,' 'lop,' 'adxr_buy_threshold,' 'adxr_sell_threshold' to
+              a (dates x symbols) array. Dates without a bar are NaN (False for the thresholds).
+        '''
+        packed = self.__calculate_packed(c1, c2, c3, c4, c5, c6, c7, adxr_sell_threshold, adxr_buy_threshold)
+        arrays = {}
+        for column in ("asi", "hsp", "hip", "lsp", "lop", "adxr_buy_threshold", "adxr_sell_threshold"):
+            arrays[column] = self.__unpack(packed[column], False if column.startswith("adxr") else np.nan)
+        return arrays
+
+    def trades(self, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, adxr_sell_threshold=20, adxr_buy_threshold=20, params: dict = None) -> dict:
+        '''
+        Runs the signals of every symbol over the panel (same arguments as `SwingIndex`, plus the trading `params` of
+        `generate_signals()`).
+
+        Returns:
+            - dict mapping each symbol to its closed trades (see `position.TRADE_DTYPE`). As in the per asset backtest,
+              the entry and exit indices count the bars of that symbol, not the dates of the panel.
+        '''
+        packed = self.__calculate_packed(c1, c2, c3, c4, c5, c6, c7, adxr_sell_threshold, adxr_buy_threshold)
+
+        # bars with any invalid values are skipped, as in the backtest
+        invalid = np.zeros(self.__present.shape, dtype=bool)
+        for column in self.__columns:
+            invalid |= np.isnan(self.__packed[column])
+        for column in ("asi", "hsp", "hip", "lsp", "lop"):
+            invalid |= np.isnan(packed[column])
+
+        trades = {}
+        for j, symbol in enumerate(self.__symbols):
+            n = self.__n_bars[j]
+            columns = {column: packed[column][:n, j] for column in SIGNAL_COLUMNS}
+            trades[symbol] = generate_signals_from_arrays(columns, ~invalid[:n, j], params)
+        return trades
+
+    def __calculate_packed(self, c1, c2, c3, c4, c5, c6, c7, adxr_sell_threshold, adxr_buy_threshold) -> dict:
+        '''
+        Swing Index System variables over the packed arrays, where each symbol's bars are contiguous from the top.
+        '''
+        packed = {column: self.__packed[column] for column in ("high", "low", "close")}
+        asi = calculate_asi(self.__packed["high"], self.__packed["low"], self.__packed["close"], self.__packed["open"],
+                            c1, c2, c3, c4, c5, c6, c7)
+        adxr = calculate_adxr(self.__packed["high"], self.__packed["low"], self.__packed["close"])
+        packed["asi"] = asi
+        packed["hsp"], _ = find_swing_points(asi)
+        packed["lsp"], _ = find_swing_points(asi, False)
+        packed["hip"], _ = find_swing_points(self.__packed["high"])
+        packed["lop"], _ = find_swing_points(self.__packed["low"], False)
+        packed["adxr_buy_threshold"] = adxr > adxr_buy_threshold
+        packed["adxr_sell_threshold"] = adxr < adxr_sell_threshold
+        return packed
+
+    def __unpack(self, packed: np.ndarray, fill) -> np.ndarray:
+        # scatter packed values back onto the dates; the padding at the end of each column holds no real values
+        values = np.empty_like(packed)
+        np.put_along_axis(values, self.__order, packed, axis=0)
+        return np.where(self.__present, values, fill)
@@ -0,0 +1,195 @@
+import copy
+import heapq
+import numpy as np
+from sw import SwingIndex, SWING_COLUMNS
+from broker import Broker
+from capital_manager import CapitalManager
+from position import SwingIndexPosition, SIGNAL_COLUMNS
+from settings import LONG, SHORT, INITIAL
+
+
+class AssetStream:
+
+    '''
+    State of one asset in the `PortfolioSimulator`: its bars, its own copy of the incremental SwingIndex, the Swing
+    Index System columns filled in so far, and its current position.
+
+     - asset       : The asset
+     - bars        : dict of 1-D arrays holding "timestamp" and at least 'open,' 'high,' 'low,' and 'close'
+                     (see `BarStore.read_arrays()`). More bars can be added with `append()`.
+     - swing_index : SwingIndex holding the parameters of the system; it is copied, not modified
+     - capacity    : number of bars room is made for initially, so appending bars does not reallocate the arrays
+    '''
+    def __init__(self, asset: str, bars: dict, swing_index: SwingIndex, capacity: int = 0):
+        self.asset = asset
+        self.n_bars = np.asarray(bars["timestamp"]).shape[0]
+        self.swing_index = copy.copy(swing_index)
+        self.swing_index.reset()
+        self.position = SwingIndexPosition(0, 0, asset, 0, INITIAL)
+
+        # the arrays may be longer than `n_bars`; the rows after it are not filled in yet
+        size = max(self.n_bars, capacity)
+        self.timestamps = np.zeros(size, dtype=np.int64)
+        self.timestamps[:self.n_bars] = bars["timestamp"]
+        self.__bars = {column: np.full(size, np.nan) for column in bars if column != "timestamp"}
+        for column, values in self.__bars.items():
+            values[:self.n_bars] = bars[column]
+        self.columns = {column: np.full(size, np.nan) for column in SIGNAL_COLUMNS}
+        self.valid = np.zeros(size, dtype=bool)
+
+    def bar(self, i: int) -> dict:
+        return {column: values[i] for column, values in self.__bars.items()}
+
+    def append(self, timestamp: int, bar: dict) -> int:
+        '''
+        Adds a bar after the last one, e.g. as it arrives from a live feed. The arrays double in size when they are
+        full, so appending is amortized O(1).
+
+        Parameters:
+            - timestamp : epoch nanoseconds of the bar
+            - bar       : dict with the same columns as `bars` (missing ones are NaN)
+        Returns:
+            - the number of the new bar
+        '''
+        i = self.n_bars
+        if i == self.timestamps.shape[0]:
+            self.__grow(max(1, 2 * i))
+        self.timestamps[i] = timestamp
+        for column, values in self.__bars.items():
+            values[i] = bar.get(column, np.nan)
+        self.n_bars += 1
+        return i
+
+    def __grow(self, size: int) -> None:
+        def grown(values, fill):
+            array = np.full(size, fill, dtype=values.dtype)
+            array[:self.n_bars] = values[:self.n_bars]
+            return array
+        self.timestamps = grown(self.timestamps, 0)
+        self.__bars = {column: grown(values, np.nan) for column, values in self.__bars.items()}
+        self.columns = {column: grown(values, np.nan) for column, values in self.columns.items()}
+        self.valid = grown(self.valid, False)
+
+    def ingest(self, i: int) -> None:
+        '''
+        Streams bar `i` through the SwingIndex and writes the row into the signal columns.
+        '''
+        bar = self.bar(i)
+        row = self.swing_index.update(bar)
+        for column in SIGNAL_COLUMNS:
+            self.columns[column][i] = row[column] if column in row else bar[column]
+        # bars with any invalid values are skipped, as in the backtest
+        self.valid[i] = not (any(np.isnan(value) for value in bar.values())
+                             or any(np.isnan(row[column]) for column in SWING_COLUMNS if not column.startswith("adxr")))
+
+
+class PortfolioSimulator:
+
+    '''
+    Event driven backtest of many assets sharing one pool of capital. The bars of every asset are merged by timestamp
+    with a heap, and each bar is one event: the asset's incremental SwingIndex takes in the previous bar, its position
+    gives a signal, and orders go through `CapitalManager.submit_order_check()`, the broker, `CapitalManager.close()`
+    (for the position reversed) and `CapitalManager.buy()`/`sell_short()` (for the new one). Orders are thus checked against the capital left, and the margins allocated, by every asset traded
+    before them, in time order.
+
+    Each event costs O(log(number of assets)) for the heap plus O(1) for the indicators, whatever the length of the
+    history. With unlimited capital, every asset trades exactly as in `Backtest.backtest_asset()`.
+
+     - capital_manager : the shared pool of capital
+     - swing_index     : SwingIndex holding the parameters of the system
+     - broker          : where orders are filled, and what type they are (see `Broker`)
+     - num_shares      : number of shares bought on each reversal
+     - journal         : optional record of every decision, with a `record(asset, timestamp, index, signal, price,
+                         outcome)` method (see `replay.ReplayJournal`). `outcome` is "filled," "rejected" (by the
+                         capital manager) or "unfilled" (by the broker).
+    '''
+    def __init__(self, capital_manager: CapitalManager, swing_index: SwingIndex, broker: Broker = None, num_shares: int = 1, journal=None):
+        self.__capital_manager = capital_manager
+        self.__swing_index = swing_index
+        self.__broker = broker if broker is not None else Broker()
+        self.__num_shares = num_shares
+        self.__journal = journal
+        self.__rejected_orders = 0
+
+    @property
+    def rejected_orders(self) -> int:
+        # number of orders the capital manager turned down
+        return self.__rejected_orders
+
+    def run(self, bars: dict) -> list:
+        '''
+        Parameters:
+            - bars : dict mapping each asset to its bars (see `AssetStream`)
+        Returns:
+            - list of the closed positions of every asset, in the order they were closed
+        '''
+        streams = [AssetStream(asset, asset_bars, self.__swing_index) for asset, asset_bars in bars.items()]
+        # the spreads of every bar are estimated once, so filling an order is a lookup
+        self.__broker.load(bars)
+
+        # one entry per asset: (timestamp of its next bar, asset number, bar number)
+        events = [(stream.timestamps[0], k, 0) for k, stream in enumerate(streams) if stream.n_bars > 0]
+        heapq.heapify(events)
+
+        inactive_orders = []
+        while events:
+            _, k, i = events[0]
+            stream = streams[k]
+            closed = self.on_bar(stream, i)
+            if closed is not None:
+                inactive_orders.append(closed)
+            if i + 1 < stream.n_bars:
+                heapq.heapreplace(events, (stream.timestamps[i + 1], k, i + 1))
+            else:
+                heapq.heappop(events)
+        return inactive_orders
+
+    def on_bar(self, stream: AssetStream, i: int):
+        '''
+        Bar `i` of the asset is happening: row i - 1 is the current day, as in the backtest. Row i - 1 is ingested,
+        and the position of the asset acts on its signal.
+
+        Returns:
+            - the position that was closed, if the position was reversed, else None
+        '''
+        if i == 0:
+            return None
+        stream.ingest(i - 1)
+        if i < 2 or not stream.valid[i - 1]:
+            return None
+
+        position = stream.position
+        signal, ask_price = position.signal_at(stream.columns, i)
+        if signal == 1 and position.state != LONG:
+            sell_index = i - 1
+        elif signal == -1 and position.state != SHORT:
+            sell_index = i
+        else:
+            return None
+
+        # we are able to make an order based on the rules of our capital management system
+        if not self.__capital_manager.submit_order_check(self.__num_shares, ask_price, stream.asset):
+            self.__rejected_orders += 1
+            self.__record(stream, i, signal, ask_price, "rejected")
+            return None
+        fill_price = self.__broker.submit_order_bar(stream.asset, stream.bar(i - 1), ask_price, self.__broker.order_type, signal, i - 1)
+        if fill_price == -1:
+            self.__record(stream, i, signal, ask_price, "unfilled")
+            return None
+        self.__record(stream, i, signal, ask_price, "filled")
+
+        position.sell(fill_price, sell_index)
+        if position.state != INITIAL:
+            self.__capital_manager.close(position.profits_losses, stream.asset)
+        if signal == 1:
+            stream.position = SwingIndexPosition(self.__num_shares, fill_price, stream.asset, sell_index, LONG)
+            self.__capital_manager.buy(self.__num_shares, fill_price, stream.asset)
+        else:
+            stream.position = SwingIndexPosition(self.__num_shares, fill_price, stream.asset, sell_index, SHORT)
+            self.__capital_manager.sell_short(self.__num_shares, fill_price, stream.asset)
+        return position
+
+    def __record(self, stream: AssetStream, i: int, signal: int, price: float, outcome: str) -> None:
+        # the decision is taken on the current day, row i - 1
+        if self.__journal is not None:
+            self.__journal.record(stream.asset, int(stream.timestamps[i - 1]), i - 1, signal, price, outcome)
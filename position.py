@@ -1,19 +1,40 @@
 from typing import Union
+from functools import total_ordering
+from operator import attrgetter
+from bisect import bisect_left, bisect_right
+import numpy as np
 import pandas as pd
 from settings import LONG, SHORT, INITIAL
 
+# columns of the swing dataframe used to generate signals
+SIGNAL_COLUMNS = ["high", "low", "close", "asi", "hsp", "lsp", "hip", "lop", "adxr_buy_threshold", "adxr_sell_threshold"]
+
+# compact representation of a closed trade. side is 1 for LONG, -1 for SHORT and 0 for INITIAL
+TRADE_DTYPE = np.dtype([("entry_index", np.int64), ("exit_index", np.int64), ("side", np.int8),
+                        ("entry_price", np.float64), ("exit_price", np.float64), ("num_shares", np.int64)])
+SIDES = {INITIAL: 0, LONG: 1, SHORT: -1}
+
+# key for sorting many positions, which reads the precomputed key without calling `Position.__lt__` on every comparison
+position_sort_key = attrgetter("_sort_key")
+
+@total_ordering
 class Position:
 
     '''
     This class allows us to keep track of our positions. We can think of it as a trader; it creates the
     buy and sell signals for the algorithm we decide to implement.
 
+    Positions are ordered by the index they were brought at. The attributes are held in slots rather than a
+    per-instance dict, since a backtest allocates one position per reversal.
+
      - num_shares : number of shares purchased
      - buy_price  : The price the asset was purchased at
      - asset      : The asset that was purchased
      - index      : The index in the dataframe at which the asset was brought 
      - state : LONG, SHORT, or INITIAL. Represents the state of our purchase
     '''
+    __slots__ = ("_buy_price", "_asset", "_start_index", "_sell_price", "_sell_index", "_num_shares", "_active", "_state", "_sort_key")
+
     def __init__(self, num_shares: int, buy_price: float, asset: str, index: int, state: str):
         self._buy_price  = buy_price
         self._asset  = asset
@@ -23,6 +44,8 @@ class Position:
         self._num_shares = num_shares
         self._active = True
         self._state = state
+        # comparisons only look at this, so sorting does not go through any property
+        self._sort_key = index
 
     @property
     def profits_losses(self):
@@ -56,14 +79,104 @@ class Position:
     @property
     def start_index(self):
         return self._start_index
+
+    @property
+    def sell_price(self):
+        return self._sell_price
+
+    @property
+    def sell_index(self):
+        return self._sell_index
+
+    @property
+    def num_shares(self):
+        return self._num_shares
     
+    @property
+    def sort_key(self):
+        return self._sort_key
+
     # define equality
     def __eq__(self, other):
-        return self._start_index == other._start_index 
-    
-    # define method of comparison for sorting
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self._sort_key == other._sort_key
+
+    # define method of comparison for sorting (the other comparisons follow from these two)
     def __lt__(self, other):
-        self._start_index  < other._start_index 
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self._sort_key < other._sort_key
+
+    # positions are mutable, so they are not hashable (as before __eq__ was defined)
+    __hash__ = None
+
+
+class SwingEvents:
+
+    '''
+    Index of the swing events of a single trade, maintained as bars arrive. Rather than scanning the dataframe on every
+    bar, each new row is looked at exactly once and we record:
+
+     - the bars on which the HSP and the LSP changed value since the start of the trade (sorted, so they can be bisected)
+     - the first bar holding the highest HSP and the highest LSP since the start of the trade, or over the whole
+       history for the INITIAL state, whose entry points look back that far
+
+    The rows passed to `update()` are expected to be successive prefixes of the same dataframe, as they are in the backtest.
+    '''
+    __slots__ = ("_start_index", "_whole_history", "_n_bars", "_hsp_changes", "_lsp_changes", "_hsp_max_index", "_lsp_max_index")
+
+    def __init__(self, start_index: int, whole_history: bool):
+        self.reset(start_index, whole_history)
+
+    def reset(self, start_index: int, whole_history: bool) -> None:
+        '''
+        Starts over for a trade entered on bar `start_index`, so one index can follow every trade of an asset.
+        '''
+        self._start_index = start_index
+        self._whole_history = whole_history
+        self._n_bars = 0
+        self._hsp_changes = []
+        self._lsp_changes = []
+        self._hsp_max_index = None
+        self._lsp_max_index = None
+
+    def update(self, hsp: np.ndarray, lsp: np.ndarray, n: int) -> None:
+        '''
+        Ingests the rows that have not been seen yet.
+            - hsp, lsp: the HSP and LSP columns of the dataframe
+            - n       : number of rows to consider, i.e. the newest row is `n - 1`
+        '''
+        # only the rows since the start of the trade matter, unless we are looking at the whole history
+        first = 0 if self._whole_history else max(self._start_index, 0)
+        for i in range(max(self._n_bars, first), n):
+            if i > self._start_index:
+                if hsp[i] != hsp[i - 1]:
+                    self._hsp_changes.append(i)
+                if lsp[i] != lsp[i - 1]:
+                    self._lsp_changes.append(i)
+            # first occurrence of the maximum, skipping NaN values (as `idxmax` does)
+            if not np.isnan(hsp[i]) and (self._hsp_max_index is None or hsp[i] > hsp[self._hsp_max_index]):
+                self._hsp_max_index = i
+            if not np.isnan(lsp[i]) and (self._lsp_max_index is None or lsp[i] > lsp[self._lsp_max_index]):
+                self._lsp_max_index = i
+        self._n_bars = max(self._n_bars, n)
+
+    @property
+    def hsp_changes(self) -> list:
+        return self._hsp_changes
+
+    @property
+    def lsp_changes(self) -> list:
+        return self._lsp_changes
+
+    @property
+    def hsp_max_index(self) -> Union[int, None]:
+        return self._hsp_max_index
+
+    @property
+    def lsp_max_index(self) -> Union[int, None]:
+        return self._lsp_max_index
 
 
 class SwingIndexPosition(Position):
@@ -78,9 +191,23 @@ class SwingIndexPosition(Position):
 
     This class is ephemeral. Once we are done using it (we change states), we instantiate a new instance
     '''
+    __slots__ = ("_events", "_trailing_sar_origin", "_trailing_sar_next", "_trailing_sar_done", "_trailing_sar")
 
     def __init__(self, num_shares: int, buy_price: float, asset: str, index: int, state: str):
         super().__init__(num_shares, buy_price, asset, index, state)
+        # swing events since the start of the trade; the initial state looks at the whole history
+        self._events = SwingEvents(index, state == INITIAL)
+        # progress of the trailing SAR search: the bar holding the extreme swing point it started from,
+        # the next bar to examine, and whether (and with what result) the search has finished
+        self._trailing_sar_origin = None
+        self._trailing_sar_next = 0
+        self._trailing_sar_done = False
+        self._trailing_sar = None
+
+    def sell(self, sell_price, sell_index):
+        super().sell(sell_price, sell_index)
+        # a closed position gives no more signals, so there is no need to keep its swing events around
+        self._events = None
 
 
     def signal(self, df: pd.DataFrame):
@@ -89,21 +216,34 @@ class SwingIndexPosition(Position):
         We consider the last index as the current day (no variables are calculated for it because it is
         "happening"). Therefore we calculate our SAR variables for indices 0,...,N-1.
         '''
-        
+        return self.signal_at({column: df[column].to_numpy() for column in SIGNAL_COLUMNS}, len(df))
+
+    def signal_at(self, columns: dict, n: int):
+
+        '''
+        Same as `signal()`, as if the dataframe were the first `n` rows of `columns`. This lets us walk
+        through the history of an asset without slicing a dataframe on every bar.
+
+            - columns : dict of numpy arrays, one for each of SIGNAL_COLUMNS
+            - n       : number of rows; row `n - 1` is the current day
+        '''
+
         # we need at least one day of data
-        if df.iloc[self._start_index:].shape[0] <= 2:
+        if n - self._start_index <= 2:
             return 0, 0
-        trailing_sar = self.__get_trailing_sar(df.iloc[0:-1])
-        sar = self.__get_sar(df.iloc[0:-1])
+        # the SAR variables use the rows before the current day
+        self._events.update(columns["hsp"], columns["lsp"], n - 1)
+        trailing_sar = self.__get_trailing_sar(columns, n - 1)
+        sar = self.__get_sar(columns, n - 1)
 
         # these are are bounds for buying and selling on the next day
         # after we are given the signal
-        current_high = df.iloc[-1]['high']
-        current_low = df.iloc[-1]['low']
+        current_high = columns['high'][n - 1]
+        current_low = columns['low'][n - 1]
 
         if self._state == INITIAL:
-            entry_point_long = self.__initial_to_long(df.iloc[0:-1])
-            entry_point_short = self.__initial_to_short(df.iloc[0:-1])
+            entry_point_long = self.__initial_to_long(columns, n - 1)
+            entry_point_short = self.__initial_to_short(columns, n - 1)
             # check if initial sar is triggered for long
             if entry_point_long != None and current_high >= entry_point_long:
                 return 1, entry_point_long
@@ -114,10 +254,10 @@ class SwingIndexPosition(Position):
                 return 0, 0
         elif self._state == SHORT:
             # Sell threshold indicates we must sell
-            if df['adxr_sell_threshold'].iloc[-1]:
-                return -1, df['close'].iloc[-1]
+            if columns['adxr_sell_threshold'][n - 1]:
+                return -1, columns['close'][n - 1]
             # Buy threshold indicates we can reverse
-            if not df['adxr_buy_threshold'].iloc[-1]:
+            if not columns['adxr_buy_threshold'][n - 1]:
                 return 0, 0
             # check if there exists a valid trailing sar
             if trailing_sar != None:
@@ -130,10 +270,10 @@ class SwingIndexPosition(Position):
             return 0, 0
         elif self._state == LONG:
             # Sell threshold indicates we must sell
-            if df['adxr_sell_threshold'].iloc[-1]:
-                return -1, df['close'].iloc[-1]
+            if columns['adxr_sell_threshold'][n - 1]:
+                return -1, columns['close'][n - 1]
             # Buy threshold indicates we can reverse
-            if not df['adxr_buy_threshold'].iloc[-1]:
+            if not columns['adxr_buy_threshold'][n - 1]:
                 return 0, 0
             # check if there exists a valid trailing sar
             if trailing_sar != None:
@@ -147,7 +287,7 @@ class SwingIndexPosition(Position):
 
         
 
-    def __get_trailing_sar(self, df: pd.DataFrame) -> Union[float, None]:
+    def __get_trailing_sar(self, columns: dict, n: int) -> Union[float, None]:
         '''
         This method calculates the trailing sar in terms of ASI. 
         
@@ -157,130 +297,302 @@ class SwingIndexPosition(Position):
         If long, it finds the lowest daily low made between the highest hsp and the close of the day
         on which the ASI decreased by 60 points or more
 
-            - df: Dataframe to perform our calculations on.
+            - columns: Columns to perform our calculations on (see `signal_at()`).
+            - n      : Number of rows to consider
 
         Returns:
             - trailing_sar for the current trade
         '''
-        
+
         # For long order
         if self._state == SHORT:
-            sig_lsp_idx = df["lsp"][self._start_index:].idxmax(skipna=True) # get minimum LSP value for this trade
-            integer_index = df.index.get_loc(sig_lsp_idx)
-            # Iterate between this time interval
-            for i in range(integer_index, len(df)):
-
+            sig_lsp_idx = self._events.lsp_max_index # get maximum LSP value for this trade
+            if sig_lsp_idx is None:
+                return None
+            hsp, asi, high = columns["hsp"], columns["asi"], columns["high"]
+            self.__restart_trailing_sar(sig_lsp_idx)
+            sig_lsp = columns["lsp"][sig_lsp_idx]
+            # Iterate between this time interval, picking up where we left off on the previous bar
+            while not self._trailing_sar_done and self._trailing_sar_next < n:
+                i = self._trailing_sar_next
+                self._trailing_sar_next += 1
                 # Cannot be an LSP prior to the decrease
-                if df["hsp"].iloc[i] != df["hsp"].iloc[i-1]:
-                    break
+                if hsp[i] != hsp[i-1]:
+                    self._trailing_sar_done = True
                 # ASI decreased by 60 points or more
-                if df["asi"].iloc[i] - df["lsp"].loc[sig_lsp_idx] > 60:
-                    return df['high'].iloc[i]
-        
+                elif asi[i] - sig_lsp > 60:
+                    self._trailing_sar = high[i]
+                    self._trailing_sar_done = True
+            return self._trailing_sar
+
         # For short order
         elif self._state == LONG:
-            sig_hsp_idx = df["hsp"][self._start_index:].idxmax(skipna=True) # get maximum HSP value for this trade
-
-            # Convert the timestamp index to an integer index
-            integer_index = df.index.get_loc(sig_hsp_idx)
-            # Iterate between this time interval
-            for i in range(integer_index, len(df)):
-
+            sig_hsp_idx = self._events.hsp_max_index # get maximum HSP value for this trade
+            if sig_hsp_idx is None:
+                return None
+            lsp, asi, low = columns["lsp"], columns["asi"], columns["low"]
+            self.__restart_trailing_sar(sig_hsp_idx)
+            sig_hsp = columns["hsp"][sig_hsp_idx]
+            # Iterate between this time interval, picking up where we left off on the previous bar
+            while not self._trailing_sar_done and self._trailing_sar_next < n:
+                i = self._trailing_sar_next
+                self._trailing_sar_next += 1
                 # Cannot be an LSP prior to the decrease
-                if df["lsp"].iloc[i] != df["lsp"].iloc[i-1]:
-                    break
+                if lsp[i] != lsp[i-1]:
+                    self._trailing_sar_done = True
                 # ASI decreased by 60 points or more
-                if df["hsp"].loc[sig_hsp_idx] - df["asi"].iloc[i] > 60:
-                    return df['low'].iloc[i]
-                
+                elif sig_hsp - asi[i] > 60:
+                    self._trailing_sar = low[i]
+                    self._trailing_sar_done = True
+            return self._trailing_sar
+
         return None
 
-    def __initial_to_long(self, df: pd.DataFrame):
+    def __restart_trailing_sar(self, origin: int) -> None:
+        '''
+        The trailing SAR search only depends on the bars after the extreme swing point of the trade, so it is resumed
+        from bar to bar and only started over when a new extreme swing point is made.
+        '''
+        if origin != self._trailing_sar_origin:
+            self._trailing_sar_origin = origin
+            self._trailing_sar_next = origin
+            self._trailing_sar_done = False
+            self._trailing_sar = None
+
+    def __initial_to_long(self, columns: dict, n: int):
 
         '''
         This function gives us and entry point and SAR value for entering long. It is meant to be calculated on each new 
         trading day. Also, it is the exact inverse of `initial_to_short()` below.
 
         Parameters:
-         - df - DataFrame to analyze
+         - columns - Columns to analyze (see `signal_at()`)
+         - n       - Number of rows to consider
         returns:
          - entry_point - If the price exceeds this value, then we go long on the corresponding security
          - entry_sar   - Immediately after being reversed to long the SAR is the previous LSP
         '''
         # ADXR buy threshold indicates when we can buy
-        if not df['adxr_buy_threshold'].iloc[-1]:
+        if not columns['adxr_buy_threshold'][n - 1]:
             return None
         # Long when the ASI crosses above the previous significant HSP
-        sig_hsp_idx = df["hsp"].idxmax(skipna=True)
-        if pd.isna(sig_hsp_idx):
+        sig_hsp_idx = self._events.hsp_max_index
+        if sig_hsp_idx is None:
             return None
-        if df["asi"].iloc[-1] > df["hsp"].loc[sig_hsp_idx] or df["asi"].iloc[-1] > df["hsp"].iloc[-1]:
-            entry_point = df["hip"].loc[sig_hsp_idx] # trigger
+        if columns["asi"][n - 1] > columns["hsp"][sig_hsp_idx] or columns["asi"][n - 1] > columns["hsp"][n - 1]:
+            entry_point = columns["hip"][sig_hsp_idx] # trigger
             return entry_point
         return None
     
-    def __initial_to_short(self, df):
+    def __initial_to_short(self, columns: dict, n: int):
 
         '''
         This function gives us and entry point and SAR value for entering short for the current trading day. 
 
         parameters:
-            df - Pandas dataframe including the new price information. Fetched before the market opens.
+            columns - Columns including the new price information. Fetched before the market opens.
+            n       - Number of rows to consider
         returns:
             entry_point - If the price exceeds this value, then we short the corresponding security
             entry_sar   - Immediately after being reversed to short the SAR is the previous HSP
         '''
         # ADXR buy threshold indicates when we can buy
-        if not df['adxr_buy_threshold'].iloc[-1]:
+        if not columns['adxr_buy_threshold'][n - 1]:
             return None
         # Short when the ASI crosses below the previous significant LSP
-        sig_lsp_idx = df["lsp"].idxmax(skipna=True)
-        if pd.isna(sig_lsp_idx):
+        sig_lsp_idx = self._events.lsp_max_index
+        if sig_lsp_idx is None:
             return None
-        if df["asi"].iloc[-1] < df["lsp"].loc[sig_lsp_idx] or df["asi"].iloc[-1] < df["lsp"].iloc[-1]:
-            entry_point = df["lop"].loc[sig_lsp_idx] # trigger
+        if columns["asi"][n - 1] < columns["lsp"][sig_lsp_idx] or columns["asi"][n - 1] < columns["lsp"][n - 1]:
+            entry_point = columns["lop"][sig_lsp_idx] # trigger
             return entry_point
         return None
     
 
-    def __get_sar(self, df: pd.DataFrame) -> float:
-        if self._state == LONG:
-            # Loop through all indices since our start
-            for i in range(len(df) - 1,self._start_index, -1):
-                # if the HSP changed, look for a new LSP in between the two intervals
-                if df["hsp"].iloc[i] != df["hsp"].iloc[i-1]:
-                    # Loop between the two intervals, looking at LSP values now
-                    for j in range(i, len(df)):
-                        if df["lsp"].iloc[j] != df["lsp"].iloc[j-1]: # LSP changed
-                            if df["lop"].iloc[j] != df["lop"].iloc[j - 1]: # LOP changes as well
-                                return df["lop"].iloc[j]
-                            # Check if the LSP preceded the LOP by one day
-                            try:
-                                if df["lop"].iloc[j + 1] != df["lop"].iloc[j]:
-                                    return df["lop"].iloc[j + 1]
-                            # we access an element outside of the number of rows
-                            except IndexError:
-                                pass
-                            # return the corresponding price
-                            return df["low"].iloc[j]
-            # If there exists no valid posterior SAR, then return the previous LSP (anterior SAR)
-            return df["lop"].iloc[-1] 
+    def __get_sar(self, columns: dict, n: int) -> float:
+        '''
+        This method calculates the SAR for the current trade.
 
+        If long, we look for the most recent HSP change that was followed by an LSP change, and take the price of the first
+        LSP made after it (Posterior SAR). If there is no such LSP, the SAR is the previous LSP (Anterior SAR). Short is the
+        exact inverse.
+
+        Rather than looping over the trade, the change points are looked up in the swing events index with a binary search.
+        '''
+        if self._state == LONG:
+            return _posterior_sar(columns, n, self._events.hsp_changes, self._events.lsp_changes, "lop", "low")
         elif self._state == SHORT:
-            # Loop through all indices since our start
-            for i in range(len(df) - 1,self._start_index, -1):
-                # if the LSP changed, look for a new HSP in between the two intervals
-                if df["lsp"].iloc[i] != df["lsp"].iloc[i-1]:
-                    # Loop between the two intervals, looking at HSP values now
-                    for j in range(i, len(df)):
-                        if df["hsp"].iloc[j] != df["hsp"].iloc[j-1]: # HSP changed
-                            if df["hip"].iloc[j] != df["hip"].iloc[j - 1]:
-                                return df["hip"].iloc[j]
-                            # deal with precedence issue
-                            try:
-                                if df["hip"].iloc[j + 1] != df["hip"].iloc[j]:
-                                    return df["hip"].iloc[j + 1]
-                            except IndexError:
-                                pass
-                            return df["high"].iloc[j]
-            return df["hip"].iloc[-1] 
\ No newline at end of file
+            return _posterior_sar(columns, n, self._events.lsp_changes, self._events.hsp_changes, "hip", "high")
+
+
+def _posterior_sar(columns: dict, n: int, new_swing_changes: list, sar_swing_changes: list, sar_price: str, price: str) -> float:
+    '''
+    SAR of a trade, from the swing events since its start (see `SwingIndexPosition.__get_sar()`).
+
+        - columns           : Columns to perform our calculations on (see `SwingIndexPosition.signal_at()`)
+        - n                 : Number of rows to consider
+        - new_swing_changes : bars on which the swing point in the direction of the trade changed (HSP if long)
+        - sar_swing_changes : bars on which the opposite swing point changed (LSP if long)
+        - sar_price         : the price swing point corresponding to the opposite swing point ("lop" if long)
+        - price             : the price corresponding to the opposite swing point ("low" if long)
+    '''
+    # only the changes up to the last row count
+    n_new = bisect_left(new_swing_changes, n)
+    n_sar = bisect_left(sar_swing_changes, n)
+    if n_sar > 0:
+        # the most recent change in the direction of the trade that has an opposite change at or after it
+        i = bisect_right(new_swing_changes, sar_swing_changes[n_sar - 1], 0, n_new) - 1
+        if i >= 0:
+            # the first opposite change after it
+            j = sar_swing_changes[bisect_left(sar_swing_changes, new_swing_changes[i], 0, n_sar)]
+            sar_prices = columns[sar_price]
+            if sar_prices[j] != sar_prices[j - 1]: # the price swing point changes as well
+                return sar_prices[j]
+            # Check if the swing point preceded the price swing point by one day
+            if j + 1 < n and sar_prices[j + 1] != sar_prices[j]:
+                return sar_prices[j + 1]
+            # return the corresponding price
+            return columns[price][j]
+    # If there exists no valid posterior SAR, then return the previous swing point (anterior SAR)
+    return columns[sar_price][n - 1]
+
+
+def generate_signals(df: pd.DataFrame, params: dict = None) -> np.ndarray:
+    '''
+    Runs the INITIAL/LONG/SHORT state machine of the Swing Index System over the whole history of one asset in a
+    single forward pass. This gives the same trades as calling `SwingIndexPosition.signal()` on every prefix of the
+    dataframe (as the bar by bar backtest does), without slicing a dataframe on every bar.
+
+    Parameters:
+        - df     : swing dataframe of one asset, with every column calculated (see `SwingIndex.initialize_swing_df_demo()`)
+        - params : optional dict of trading parameters:
+                    "num_shares" : number of shares bought on each reversal (default 1)
+                    "order_type" : type of the orders (see `Broker`); market orders are always filled, the others
+                                   once their price is reached (default "LIMIT"). Trades are recorded at the prices
+                                   the orders were placed at; `Broker.fill_trades()` moves them to the prices they
+                                   were filled at.
+    Returns:
+        - structured array of TRADE_DTYPE with one record per closed trade, in the order they were closed.
+          The position that is still open at the end of the history is not included.
+    '''
+    columns = {column: df[column].to_numpy() for column in SIGNAL_COLUMNS}
+    # bars with any invalid values are skipped, as in the backtest
+    valid = ~df.isnull().any(axis=1).to_numpy()
+    return generate_signals_from_arrays(columns, valid, params)
+
+
+def generate_signals_from_arrays(columns: dict, valid: np.ndarray, params: dict = None) -> np.ndarray:
+    '''
+    Same as `generate_signals()`, on arrays rather than a dataframe.
+
+    The rules of `SwingIndexPosition.signal_at()` are applied in place rather than through a position: the open trade
+    is a handful of variables, its swing events are one `SwingEvents` index reset on every reversal, and its trailing
+    SAR search is resumed from bar to bar. Nothing is allocated per bar or per reversal besides the record of the trade.
+
+    Parameters:
+        - columns : dict of numpy arrays, one for each of SIGNAL_COLUMNS
+        - valid   : boolean array, False for the bars that have any invalid (null) values; those bars are skipped
+        - params  : see `generate_signals()`
+    '''
+    params = params or {}
+    num_shares = params.get("num_shares", 1)
+    order_type = params.get("order_type", "LIMIT")
+    high, low, close, asi = columns["high"], columns["low"], columns["close"], columns["asi"]
+    hsp, lsp, hip, lop = columns["hsp"], columns["lsp"], columns["hip"], columns["lop"]
+    buy_threshold, sell_threshold = columns["adxr_buy_threshold"], columns["adxr_sell_threshold"]
+
+    trades = []
+    # the open trade; the initial state looks at the whole history
+    state, start_index, entry_price, shares = INITIAL, 0, 0, 0
+    events = SwingEvents(0, True)
+    # the trailing SAR search: the bar holding the extreme swing point it started from, the next bar to examine,
+    # and whether (and with what result) the search has finished
+    trailing_sar_origin, trailing_sar_next, trailing_sar_done, trailing_sar = None, 0, False, None
+    for i in range(2, len(valid)):
+        # each 'i' is currently happening; row i - 1 is the current day, and we need at least one day of data
+        if not valid[i - 1] or i - start_index <= 2:
+            continue
+        # the SAR variables use the rows before the current day
+        events.update(hsp, lsp, i - 1)
+
+        signal, ask_price = 0, 0
+        if state == INITIAL:
+            # long when the ASI crosses above the significant HSP, short when it crosses below the significant LSP.
+            # The crossing is looked for on the day before the current one, the entry point on the current one.
+            sig_hsp_idx, sig_lsp_idx = events.hsp_max_index, events.lsp_max_index
+            if buy_threshold[i - 2]:
+                if sig_hsp_idx is not None and (asi[i - 2] > hsp[sig_hsp_idx] or asi[i - 2] > hsp[i - 2]) and high[i - 1] >= hip[sig_hsp_idx]:
+                    signal, ask_price = 1, hip[sig_hsp_idx]
+                elif sig_lsp_idx is not None and (asi[i - 2] < lsp[sig_lsp_idx] or asi[i - 2] < lsp[i - 2]) and low[i - 1] <= lop[sig_lsp_idx]:
+                    signal, ask_price = -1, lop[sig_lsp_idx]
+        else:
+            # a short is reversed on a rise of the ASI from the highest LSP, a long on a fall from the highest HSP
+            if state == SHORT:
+                origin, swing, opposite_swing, prices, direction = events.lsp_max_index, lsp, hsp, high, 1
+                sar = _posterior_sar(columns, i - 1, events.lsp_changes, events.hsp_changes, "hip", "high")
+            else:
+                origin, swing, opposite_swing, prices, direction = events.hsp_max_index, hsp, lsp, low, -1
+                sar = _posterior_sar(columns, i - 1, events.hsp_changes, events.lsp_changes, "lop", "low")
+            if origin is not None:
+                # the search is only started over when a new extreme swing point is made
+                if origin != trailing_sar_origin:
+                    trailing_sar_origin, trailing_sar_next, trailing_sar_done, trailing_sar = origin, origin, False, None
+                while not trailing_sar_done and trailing_sar_next < i - 1:
+                    j = trailing_sar_next
+                    trailing_sar_next += 1
+                    if opposite_swing[j] != opposite_swing[j - 1]:
+                        trailing_sar_done = True
+                    # the ASI moved by 60 points or more
+                    elif direction * (asi[j] - swing[origin]) > 60:
+                        trailing_sar, trailing_sar_done = prices[j], True
+
+            # the sell threshold forces a sell, and the buy threshold allows a reversal once a SAR is reached: by the
+            # high of the day for a short, by its low for a long
+            if sell_threshold[i - 1]:
+                signal, ask_price = -1, close[i - 1]
+            elif buy_threshold[i - 1]:
+                if trailing_sar is not None and (high[i - 1] >= trailing_sar if state == SHORT else low[i - 1] <= trailing_sar):
+                    signal, ask_price = direction, trailing_sar
+                elif high[i - 1] >= sar if state == SHORT else low[i - 1] <= sar:
+                    signal, ask_price = direction, sar
+
+        if signal == 1 and state != LONG:
+            sell_index = i - 1
+        elif signal == -1 and state != SHORT:
+            sell_index = i
+        else:
+            continue
+        # a limit order is filled if the price was reached during the day, and a stop order is triggered once the
+        # day's high (for a buy) or low (for a sell) gets to it (see `Broker.submit_order()`)
+        if order_type == "LIMIT" and not high[i - 1] >= ask_price:
+            continue
+        if order_type == "STOP" and not (high[i - 1] >= ask_price if signal == 1 else low[i - 1] <= ask_price):
+            continue
+        # the initial position is closed at the price it was opened at (see `Position.sell()`)
+        trades.append((start_index, sell_index, SIDES[state], entry_price, entry_price if state == INITIAL else ask_price, shares))
+        state, start_index, entry_price, shares = LONG if signal == 1 else SHORT, sell_index, ask_price, num_shares
+        events.reset(sell_index, False)
+        trailing_sar_origin, trailing_sar_next, trailing_sar_done, trailing_sar = None, 0, False, None
+
+    return np.array(trades, dtype=TRADE_DTYPE)
+
+
+def positions_to_trades(positions: list) -> np.ndarray:
+    '''
+    Converts a list of closed positions into a structured array of TRADE_DTYPE.
+    '''
+    return np.array([(position.start_index, position.sell_index, SIDES[position.state], position.buy_price, position.sell_price, position.num_shares)
+                     for position in positions], dtype=TRADE_DTYPE)
+
+
+def trades_to_positions(trades: np.ndarray, asset: str) -> list:
+    '''
+    Converts a structured array of TRADE_DTYPE for `asset` back into a list of closed positions.
+    '''
+    states = {side: state for state, side in SIDES.items()}
+    positions = []
+    for trade in trades:
+        position = SwingIndexPosition(int(trade["num_shares"]), trade["entry_price"], asset, int(trade["entry_index"]), states[int(trade["side"])])
+        position.sell(trade["exit_price"], int(trade["exit_index"]))
+        positions.append(position)
+    return positions
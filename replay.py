@@ -0,0 +1,235 @@
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from sw import SwingIndex
+from broker import Broker
+from capital_manager import CapitalManager
+from bar_store import BarStore, default_timeframe
+from ledger import TradeLedger
+from live import LiveEngine, ReplayBarSource
+
+# a decision of the engine: the bar it was taken on, the signal (1 to go long, -1 to go short), the price, and what
+# became of the order (see OUTCOMES)
+DECISION_DTYPE = np.dtype([("asset_id", np.int32), ("timestamp", np.int64), ("index", np.int64), ("signal", np.int8),
+                           ("price", np.float64), ("outcome", np.int8)])
+OUTCOMES = ["filled", "rejected", "unfilled"]
+
+
+class ReplayJournal:
+
+    '''
+    Record of every decision the engine takes, in the order it takes them, held in a structured array of
+    DECISION_DTYPE that grows geometrically (as `TradeLedger` does).
+
+     - capacity : number of decisions room is made for initially
+    '''
+    def __init__(self, capacity: int = 1024):
+        self.__decisions = np.zeros(max(1, capacity), dtype=DECISION_DTYPE)
+        self.__n_decisions = 0
+        self.__assets = []
+        self.__asset_ids = {}
+
+    def __len__(self) -> int:
+        return self.__n_decisions
+
+    @property
+    def decisions(self) -> np.ndarray:
+        return self.__decisions[:self.__n_decisions]
+
+    def record(self, asset: str, timestamp: int, index: int, signal: int, price: float, outcome: str) -> None:
+        if asset not in self.__asset_ids:
+            self.__asset_ids[asset] = len(self.__assets)
+            self.__assets.append(asset)
+        if self.__n_decisions == len(self.__decisions):
+            grown = np.zeros(2 * len(self.__decisions), dtype=DECISION_DTYPE)
+            grown[:self.__n_decisions] = self.__decisions
+            self.__decisions = grown
+        self.__decisions[self.__n_decisions] = (self.__asset_ids[asset], timestamp, index, signal, price, OUTCOMES.index(outcome))
+        self.__n_decisions += 1
+
+    def digest(self) -> str:
+        '''
+        Returns:
+            - fingerprint of the decisions, which changes whenever the engine decides anything differently
+        '''
+        digest = hashlib.sha1(self.decisions.tobytes())
+        digest.update(",".join(self.__assets).encode())
+        return digest.hexdigest()
+
+    def to_frame(self) -> pd.DataFrame:
+        decisions = self.decisions
+        return pd.DataFrame({
+            "asset": np.array(self.__assets, dtype=object)[decisions["asset_id"]] if self.__assets else np.empty(0, dtype=object),
+            "timestamp": pd.to_datetime(decisions["timestamp"], utc=True),
+            "index": decisions["index"],
+            "signal": decisions["signal"],
+            "price": decisions["price"],
+            "outcome": np.array(OUTCOMES, dtype=object)[decisions["outcome"]],
+        })
+
+
+class LatencyHistogram:
+
+    '''
+    Histogram of per-bar latencies over fixed, logarithmically spaced bins, so it takes O(1) memory however many bars
+    are replayed. Latencies outside [lowest, highest] are counted in the first or last bin.
+
+     - lowest, highest : range of the bins, in seconds
+     - bins_per_decade : resolution of the bins
+    '''
+    def __init__(self, lowest: float = 1e-6, highest: float = 1.0, bins_per_decade: int = 20):
+        n_bins = int(round(np.log10(highest / lowest) * bins_per_decade))
+        self.__edges = np.logspace(np.log10(lowest), np.log10(highest), n_bins + 1)
+        self.__counts = np.zeros(n_bins, dtype=np.int64)
+
+    def add(self, seconds: float) -> None:
+        k = np.searchsorted(self.__edges, seconds, side="right") - 1
+        self.__counts[min(max(k, 0), self.__counts.shape[0] - 1)] += 1
+
+    @property
+    def edges(self) -> np.ndarray:
+        return self.__edges
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self.__counts
+
+    @property
+    def count(self) -> int:
+        return int(self.__counts.sum())
+
+    def percentile(self, q: float) -> float:
+        '''
+        Returns:
+            - upper edge of the bin holding the `q`th percentile (0 to 100) of the latencies, NaN if there are none
+        '''
+        if self.count == 0:
+            return np.nan
+        k = np.searchsorted(np.cumsum(self.__counts), q / 100 * self.count)
+        return float(self.__edges[min(k, self.__counts.shape[0] - 1) + 1])
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"lower": self.__edges[:-1], "upper": self.__edges[1:], "count": self.__counts})
+
+
+class ReplayResult:
+
+    '''
+    What a replay recorded: the decisions of the engine (and which of them were filled), the closed trades, the
+    latency of every bar, and the throughput.
+    '''
+    def __init__(self, journal: ReplayJournal, ledger: TradeLedger, histogram: LatencyHistogram, engine: LiveEngine,
+                 n_bars: int, n_symbols: int, elapsed: float):
+        self.journal = journal
+        self.ledger = ledger
+        self.histogram = histogram
+        self.engine = engine
+        self.n_bars = n_bars
+        self.n_symbols = n_symbols
+        self.elapsed = elapsed
+
+    @property
+    def decisions(self) -> pd.DataFrame:
+        return self.journal.to_frame()
+
+    @property
+    def fills(self) -> pd.DataFrame:
+        decisions = self.decisions
+        return decisions[decisions["outcome"] == "filled"].reset_index(drop=True)
+
+    @property
+    def throughput(self) -> float:
+        # bars processed per second, over every symbol
+        return self.n_bars / self.elapsed if self.elapsed > 0 else np.nan
+
+    def summary(self) -> dict:
+        outcomes = np.bincount(self.journal.decisions["outcome"], minlength=len(OUTCOMES))
+        summary = {
+            "symbols": self.n_symbols,
+            "bars": self.n_bars,
+            "seconds": self.elapsed,
+            "bars_per_second": self.throughput,
+            "decisions": len(self.journal),
+            "trades": len(self.ledger),
+            "profits_losses": float(self.ledger.profits_losses.sum()),
+            "latency_mean": self.engine.latency.mean,
+            "latency_max": self.engine.latency.maximum,
+            "latency_p50": self.histogram.percentile(50),
+            "latency_p99": self.histogram.percentile(99),
+            "digest": self.journal.digest(),
+        }
+        summary.update({outcome: int(count) for outcome, count in zip(OUTCOMES, outcomes)})
+        return summary
+
+    def regressions(self, baseline: dict, tolerance: float = 1.5) -> list:
+        '''
+        Compares the replay with the `summary()` of an earlier replay of the same bars.
+
+        Parameters:
+            - tolerance : how many times slower (in throughput or 99th percentile latency) the replay may be
+        Returns:
+            - description of every regression found; empty if there is none
+        '''
+        summary = self.summary()
+        regressions = []
+        if summary["digest"] != baseline["digest"]:
+            regressions.append(f"decisions changed ({baseline['decisions']} before, {summary['decisions']} now)")
+        if summary["bars_per_second"] * tolerance < baseline["bars_per_second"]:
+            regressions.append(f"throughput fell from {baseline['bars_per_second']:.0f} to {summary['bars_per_second']:.0f} bars/s")
+        if summary["latency_p99"] > baseline["latency_p99"] * tolerance:
+            regressions.append(f"99th percentile latency rose from {baseline['latency_p99']:.2e} to {summary['latency_p99']:.2e} s")
+        return regressions
+
+
+class Replay:
+
+    '''
+    Feeds stored bars to a `LiveEngine`, bar by bar through `LiveEngine.on_bar()` as `trading_engine.trade()` does
+    with the live feed, so the trading loop can be benchmarked and regression tested without a market connection.
+    The same bars always give the same decisions.
+
+     - bars  : dict mapping each asset to its bars (see `AssetStream`)
+     - speed : how many times faster than real time the bars are paced (as fast as possible by default)
+    '''
+    def __init__(self, bars: dict, speed: float = None):
+        self.__bars = bars
+        self.__speed = speed
+
+    @classmethod
+    def from_bar_store(cls, bar_store: BarStore, symbols: list = None, timeframe=None, start: pd.Timestamp = None,
+                       end: pd.Timestamp = None, speed: float = None) -> "Replay":
+        '''
+        Replays the bars of `symbols` (by default every symbol stored) in the local bar store, minute or daily bars
+        alike. Nothing is downloaded.
+        '''
+        timeframe = default_timeframe(timeframe)
+        if symbols is None:
+            symbols = bar_store.symbols(timeframe)
+        bars = {}
+        for symbol in symbols:
+            arrays = bar_store.read_arrays(symbol, timeframe, start, end)
+            if arrays is not None and arrays["timestamp"].shape[0] > 0:
+                bars[symbol] = arrays
+        return cls(bars, speed)
+
+    @property
+    def symbols(self) -> list:
+        return list(self.__bars)
+
+    def run(self, capital_manager: CapitalManager, swing_index: SwingIndex, broker: Broker = None, num_shares: int = 1) -> ReplayResult:
+        journal = ReplayJournal()
+        engine = LiveEngine(capital_manager, swing_index, broker if broker is not None else Broker(), num_shares, journal=journal)
+        histogram = LatencyHistogram()
+
+        n_bars = 0
+        begin = time.perf_counter()
+        for asset, timestamp, bar in ReplayBarSource(self.__bars, self.__speed):
+            engine.on_bar(asset, timestamp, bar)
+            histogram.add(engine.last_latency)
+            n_bars += 1
+        elapsed = time.perf_counter() - begin
+
+        ledger = TradeLedger()
+        ledger.append_positions(engine.inactive_orders)
+        return ReplayResult(journal, ledger, histogram, engine, n_bars, len(self.__bars), elapsed)
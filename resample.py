@@ -0,0 +1,121 @@
+import re
+import numpy as np
+import pandas as pd
+from settings import MARKET_TIMEZONE
+
+# how each column of the bars is aggregated when they are merged into longer bars; columns not listed take the
+# value of the last bar
+AGGREGATIONS = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+    "trade_count": "sum",
+    "vwap": "vwap",
+}
+
+# length in nanoseconds of the timeframes whose bars are cut at fixed intervals of UTC time
+INTRADAY_UNITS = {"Min": 60 * 10**9, "Hour": 3600 * 10**9}
+# timeframes whose bars are cut at midnight in MARKET_TIMEZONE
+CALENDAR_UNITS = ["Day", "Week", "Month"]
+
+
+def parse_timeframe(timeframe) -> tuple:
+    '''
+    Parameters:
+        - timeframe : alpaca `TimeFrame`, or its string (e.g. '5Min', '1Hour', '1Day')
+    Returns:
+        - the amount and the unit of the timeframe, e.g. (5, 'Min')
+    '''
+    match = re.fullmatch(r"(\d+)(Min|Hour|Day|Week|Month)", str(timeframe))
+    if match is None:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    amount, unit = int(match.group(1)), match.group(2)
+    if amount < 1 or (unit in CALENDAR_UNITS and amount != 1):
+        raise ValueError(f"Bars cannot be resampled to {timeframe}")
+    return amount, unit
+
+
+def bar_length(timeframe) -> pd.Timedelta:
+    '''
+    Returns:
+        - the longest time a bar of `timeframe` can span (a month is taken as 31 days)
+    '''
+    amount, unit = parse_timeframe(timeframe)
+    if unit in INTRADAY_UNITS:
+        return pd.Timedelta(amount * INTRADAY_UNITS[unit], unit="ns")
+    return pd.Timedelta(days={"Day": 1, "Week": 7, "Month": 31}[unit])
+
+
+def bucket_starts(timestamps: np.ndarray, timeframe) -> np.ndarray:
+    '''
+    Parameters:
+        - timestamps : int64 epoch nanoseconds (UTC) of the bars
+    Returns:
+        - the timestamp (epoch nanoseconds, UTC) of the bar of `timeframe` each bar falls in. Intraday bars start at
+          multiples of their length; daily, weekly and monthly bars at midnight in MARKET_TIMEZONE.
+    '''
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    amount, unit = parse_timeframe(timeframe)
+    if unit in INTRADAY_UNITS:
+        length = amount * INTRADAY_UNITS[unit]
+        return timestamps - timestamps % length
+
+    local = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).tz_convert(MARKET_TIMEZONE)
+    days = local.normalize()
+    if unit == "Week":
+        days = days - pd.to_timedelta(local.dayofweek, unit="D")
+    elif unit == "Month":
+        days = days - pd.to_timedelta(local.day - 1, unit="D")
+    # normalizing across a daylight saving change keeps the wall time, so the week or month start is normalized again
+    return days.normalize().tz_convert("UTC").asi8
+
+
+def resample_arrays(arrays: dict, timeframe) -> dict:
+    '''
+    Merges bars into bars of a longer `timeframe`, in one pass over the arrays: the bars are cut into runs that fall
+    in the same bucket (see `bucket_starts()`) and every column is aggregated over its runs at once (see
+    AGGREGATIONS). Invalid (NaN) values are ignored by the highs, lows and sums.
+
+    Parameters:
+        - arrays : dict of 1-D arrays sorted by time, as returned by `BarStore.read_arrays()`
+    Returns:
+        - dict of the same columns (float64) for the longer bars, "timestamp" being the start of each bar.
+          Buckets without any bar are left out.
+    '''
+    timestamps = np.asarray(arrays["timestamp"], dtype=np.int64)
+    if timestamps.shape[0] == 0:
+        resampled = {"timestamp": np.empty(0, dtype=np.int64)}
+        resampled.update({column: np.empty(0) for column in arrays if column != "timestamp"})
+        return resampled
+
+    buckets = bucket_starts(timestamps, timeframe)
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    lasts = np.concatenate((starts[1:], [timestamps.shape[0]])) - 1
+
+    resampled = {"timestamp": buckets[starts]}
+    volume = None
+    if "volume" in arrays:
+        volume = np.add.reduceat(np.nan_to_num(np.asarray(arrays["volume"], dtype=np.float64)), starts)
+    for column, values in arrays.items():
+        if column == "timestamp":
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        aggregation = AGGREGATIONS.get(column, "last")
+        if aggregation == "first":
+            resampled[column] = values[starts]
+        elif aggregation == "max":
+            resampled[column] = np.fmax.reduceat(values, starts)
+        elif aggregation == "min":
+            resampled[column] = np.fmin.reduceat(values, starts)
+        elif aggregation == "sum":
+            resampled[column] = np.add.reduceat(np.nan_to_num(values), starts)
+        elif aggregation == "vwap" and volume is not None:
+            # weighted by the volume of each bar; NaN for bars without any volume
+            traded = np.add.reduceat(np.nan_to_num(values * np.asarray(arrays["volume"], dtype=np.float64)), starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                resampled[column] = np.where(volume > 0, traded / volume, np.nan)
+        else:
+            resampled[column] = values[lasts]
+    return resampled
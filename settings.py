@@ -1,7 +1,7 @@
+import os
 import datetime
 from pytz import timezone
 import logging
-import alpaca_trade_api as tradeapi
 
 # Here we define macro-variables
 global INITIAL 
@@ -15,26 +15,83 @@ SHORT = "SHORT"
 
 TIMEZONE = 'EST'
 
+# Daily (and longer) bars resampled from minute bars start at midnight here (see `resample.py`)
+MARKET_TIMEZONE = 'America/New_York'
+
 LOGGING_INFO_FILE = './apca_algo.log'
 
+# Historical bars are cached here (see `bar_store.py`)
+BAR_STORE_DIRECTORY = './bar_store'
+
+# Securities the backtest samples from, and the index built from them (see `universe.py`)
+LIST_OF_SECURITIES_FILE = './list_of_securities.csv'
+UNIVERSE_FILE = './universe.csv'
 
-SECRET_KEY = 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXX'
-KEY_ID = 'XXXXXXXXXXXXXXXXXX'
+
+# Alpaca credentials, taken from the environment variables the Alpaca SDKs read
+SECRET_KEY = os.environ.get('APCA_API_SECRET_KEY', 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
+KEY_ID = os.environ.get('APCA_API_KEY_ID', 'XXXXXXXXXXXXXXXXXX')
 
 ALPACA_LINK = 'https://api.alpaca.markets'
 
+ALPACA_DATA_LINK = 'https://data.alpaca.markets/v2'
+
+# Rate limit of the market data API (see `downloader.py`)
+DOWNLOAD_REQUESTS_PER_MINUTE = 200
+
+# Bars are published by the market data feed this many minutes after they end (see `bar_store.py`)
+DATA_FEED_DELAY = 15
+
+# Size in pixels of the charts rendered to files (see `charts.py`); longer histories are downsampled so each
+# candle gets at least CHART_PIXELS_PER_BAR pixels
+CHART_WIDTH = 1600
+CHART_HEIGHT = 900
+CHART_DPI = 100
+CHART_PIXELS_PER_BAR = 2
+
+# Number of bars the Corwin-Schultz bid-ask spread estimates are averaged over (see `broker.py`)
+SPREAD_WINDOW = 20
+
 # Define global timezone
 global tz
 tz = timezone(TIMEZONE)
 
-# Inputs logging info into './apca_algo.log'. 
-logging.basicConfig(filename=LOGGING_INFO_FILE, format='%(name)s - %(levelname)s - %(message)s')
-logging.warning('{} logging started'.format(datetime.datetime.now().strftime("%x %X")))
+# trading-api, created on first use by `get_api()`
+_api = None
+_logging_configured = False
+
+
+def configure_logging():
+    '''
+    Inputs logging info into './apca_algo.log'. Only the first call configures it.
+    '''
+    global _logging_configured
+    if not _logging_configured:
+        logging.basicConfig(filename=LOGGING_INFO_FILE, format='%(name)s - %(levelname)s - %(message)s')
+        logging.warning('{} logging started'.format(datetime.datetime.now().strftime("%x %X")))
+        _logging_configured = True
+
+
+def get_api():
+    '''
+    Returns:
+        - the global trading-api. `alpaca_trade_api` is slow to import, so it is only imported, and the client
+          created, the first time it is needed; every later call returns the same client.
+    '''
+    global _api
+    if _api is None:
+        import alpaca_trade_api as tradeapi
+        configure_logging()
+        _api = tradeapi.REST(KEY_ID,
+                             SECRET_KEY,
+                             ALPACA_LINK)
+    return _api
+
 
-# Instantiate global trading-api 
-global api
-api = tradeapi.REST(KEY_ID,
-                    SECRET_KEY,
-                    ALPACA_LINK)
+def __getattr__(name):
+    # `settings.api` (and `from settings import api`) still give the trading-api, creating it then
+    if name == "api":
+        return get_api()
+    raise AttributeError(f"module 'settings' has no attribute '{name}'")
 
 
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+
+class SharedBars:
+
+    '''
+    Bars of many symbols held in `multiprocessing.shared_memory`, so parallel workers can read them without any
+    pickling. Every column (and the int64 epoch nanosecond index, under "timestamp") is one block holding the
+    symbols back to back, and a small offset table gives the (start, stop) rows of each symbol.
+
+    The parent creates the blocks with `SharedBars.create()` and passes `handle` to the workers, which open them
+    with `SharedBars.attach()` and get zero-copy views from `arrays()`. Only the creator unlinks the blocks, when
+    it is closed (or leaves a `with` block).
+    '''
+    def __init__(self, handle: dict, blocks: dict, owner: bool):
+        self.__handle = handle
+        self.__blocks = blocks
+        self.__owner = owner
+
+    @classmethod
+    def create(cls, bars: pd.DataFrame, symbols: list) -> "SharedBars":
+        '''
+        Copies the bars of `symbols` into new shared memory blocks.
+
+        Parameters:
+            - bars    : dataframe indexed by (symbol, timestamp), as returned by `Backtest.get_data_bars()`
+            - symbols : symbols to share, all of which must be in `bars`
+        '''
+        frames = [bars.loc[symbol] for symbol in symbols]
+        stops = np.cumsum([frame.shape[0] for frame in frames])
+        offsets = {symbol: (int(stop - frame.shape[0]), int(stop)) for symbol, frame, stop in zip(symbols, frames, stops)}
+        n_rows = int(stops[-1]) if len(stops) else 0
+
+        columns = {"timestamp": np.int64}
+        columns.update({column: np.float64 for column in bars.columns})
+
+        blocks = {}
+        for column, dtype in columns.items():
+            # shared memory blocks cannot be empty
+            block = shared_memory.SharedMemory(create=True, size=max(1, n_rows * np.dtype(dtype).itemsize))
+            blocks[column] = block
+            values = np.ndarray((n_rows,), dtype=dtype, buffer=block.buf)
+            for symbol, frame in zip(symbols, frames):
+                start, stop = offsets[symbol]
+                if column == "timestamp":
+                    values[start:stop] = pd.DatetimeIndex(frame.index).asi8
+                else:
+                    values[start:stop] = frame[column].to_numpy(dtype=dtype)
+
+        handle = {
+            "n_rows": n_rows,
+            "offsets": offsets,
+            "blocks": {column: (block.name, np.dtype(columns[column]).str) for column, block in blocks.items()},
+        }
+        return cls(handle, blocks, True)
+
+    @classmethod
+    def attach(cls, handle: dict) -> "SharedBars":
+        '''
+        Opens the blocks described by `handle` (from the process that created them).
+        '''
+        blocks = {}
+        for column, (name, _) in handle["blocks"].items():
+            # workers share the resource tracker of the parent, so the blocks are still only unlinked once
+            blocks[column] = shared_memory.SharedMemory(name=name)
+        return cls(handle, blocks, False)
+
+    @property
+    def handle(self) -> dict:
+        # small picklable description of the blocks, to send to the workers
+        return self.__handle
+
+    @property
+    def symbols(self) -> list:
+        return list(self.__handle["offsets"])
+
+    def arrays(self, symbol: str) -> dict:
+        '''
+        Returns:
+            - dict mapping "timestamp" and each column to a zero-copy view of the bars of `symbol`, in the same form
+              as `BarStore.read_arrays()`
+        '''
+        start, stop = self.__handle["offsets"][symbol]
+        arrays = {}
+        for column, (_, dtype) in self.__handle["blocks"].items():
+            values = np.ndarray((self.__handle["n_rows"],), dtype=np.dtype(dtype), buffer=self.__blocks[column].buf)
+            arrays[column] = values[start:stop]
+        return arrays
+
+    def close(self) -> None:
+        '''
+        Detaches from the blocks, and frees them if this is the process that created them. Views returned by
+        `arrays()` must not be used afterwards.
+        '''
+        for block in self.__blocks.values():
+            block.close()
+            if self.__owner:
+                block.unlink()
+        self.__blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
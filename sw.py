@@ -1,7 +1,252 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 import talib
+from collections import deque
+
+# columns added to the dataframe by the Swing Index System
+SWING_COLUMNS = ["asi", "hsp", "hip", "lsp", "lop", "adxr_buy_threshold", "adxr_sell_threshold"]
+
+
+def calculate_asi(high: np.ndarray, low: np.ndarray, close: np.ndarray, open: np.ndarray,
+                  c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50) -> np.ndarray:
+    '''
+    Vectorized accumulative swing index (ASI). Time runs along the first axis, so the prices may be 1-D (bars) or
+    2-D (bars x symbols), in which case the ASI of every symbol is calculated in one call.
+    Parameters:
+    - high, low, close, open: price points, all of the same shape
+    - c1, ..., c7: constants of the swing index (c6 is the limit move). Either scalars, or 1-D arrays holding one
+      value per parameter set, in which case the ASI of every parameter set is calculated in one broadcast call
+    Returns:
+    - accumulative swing index, as described in New Concepts in Technical Trading Systems. The first bar has
+      no previous close, so it is NaN. With arrays of constants, there is an extra last axis for the parameter sets.
+    '''
+    high, low, close, open = (np.asarray(x, dtype=np.float64) for x in (high, low, close, open))
+
+    # one parameter set per element of the last axis
+    c1, c2, c3, c4, c5, c6, c7 = (np.asarray(c, dtype=np.float64) for c in (c1, c2, c3, c4, c5, c6, c7))
+    if any(c.ndim > 0 for c in (c1, c2, c3, c4, c5, c6, c7)):
+        high, low, close, open = (x[..., np.newaxis] for x in (high, low, close, open))
+
+    # shift by one bar along the time axis; the first bar has no previous values
+    previous_close = np.empty_like(close)
+    previous_close[0] = np.nan
+    previous_close[1:] = close[:-1]
+
+    previous_open = np.empty_like(open)
+    previous_open[0] = np.nan
+    previous_open[1:] = open[:-1]
+
+    # conditions for determining "R" (i.e., R is the largest of the following)
+    l_one = np.abs(high - previous_close)
+    l_two = np.abs(low - previous_close)
+    l_three = np.abs(high - low)
+    largest = np.maximum(np.maximum(l_one, l_two), l_three)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # R can take on three conditional values; ties go to l_one, then l_two, then l_three
+        R = np.select(
+            [l_one == largest, l_two == largest, l_three == largest],
+            [l_one - (c3 * np.abs(low - previous_close)) + (c4 * np.abs(previous_close - previous_open)),
+             l_two - (c3 * np.abs(high - previous_close)) + (c4 * np.abs(previous_close - previous_open)),
+             l_three + (c5 * np.abs(previous_close - previous_open))],
+            default=0.0,
+        )
+
+        # requires previous day's value
+        R[0] = np.nan
+
+        # Equation for SI
+        K = np.maximum(np.abs(high - previous_close), np.abs(low - previous_close)) / c6
+        si = (c7 / R) * ((close - previous_close) + (c1 * (close - open)) + (c2 * (previous_close - previous_open))) * K
+
+    # Accumulative Swing Index; undefined swing indices are skipped by the sum but remain undefined
+    asi = np.nancumsum(si, axis=0)
+    asi[np.isnan(si)] = np.nan
+    return asi
+
+
+def calculate_asi_batch(high: np.ndarray, low: np.ndarray, close: np.ndarray, open: np.ndarray, parameters: np.ndarray) -> np.ndarray:
+    '''
+    Calculates the ASI of one price history for many parameter sets at once.
+    Parameters:
+    - high, low, close, open: price points (bars, or bars x symbols)
+    - parameters: matrix with one row (c1, ..., c7) per parameter set
+    Returns:
+    - accumulative swing index of shape (bars, parameter sets), or (bars, symbols, parameter sets). Column p is
+      the same as `calculate_asi()` with the constants of row p.
+    '''
+    parameters = np.asarray(parameters, dtype=np.float64).reshape(-1, 7)
+    return calculate_asi(high, low, close, open, *parameters.T)
+
+
+def find_swing_points(x: np.ndarray, hi=True) -> tuple:
+    '''
+    Vectorized swing point detection, abstracted in terms of both price and asi (HIP, LOP, HSP and LSP). We cannot
+    look ahead until the day finishes, so x[i - 1] becomes a critical point on day i once it is known to be a local
+    maxima (or minima). Time runs along the first axis, so `x` may be 1-D (bars) or have more axes (bars x symbols,
+    bars x parameter sets, ...).
+    Parameters:
+    - x: These are the values with which we will find our significant points
+    - hi: Indicates whether we are looking for max or min
+    Returns:
+    - swing points, filled in **forward** so each one remains until a new one is found
+    - indices of the bars on which the swing point changed value. For 1-D input this is an array of bar indices,
+      otherwise it is the tuple of index arrays returned by `np.nonzero()`
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    swing_points = np.full(x.shape, np.nan)
+
+    before, previous, current = x[:-2], x[1:-1], x[2:]
+    if hi: # def of local maxima
+        critical = (previous >= current) & (previous >= before)
+    else: # def of local minima
+        critical = (previous <= current) & (previous <= before)
+    swing_points[2:][critical] = previous[critical]
+
+    # forward fill: carry the index of the last critical point down the time axis
+    found = ~np.isnan(swing_points)
+    last = np.where(found, np.arange(x.shape[0]).reshape((-1,) + (1,) * (x.ndim - 1)), 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    swing_points = np.take_along_axis(swing_points, last, axis=0)
+
+    # a swing event is a bar where the forward filled value differs from the bar before it
+    changed = np.zeros(x.shape, dtype=bool)
+    changed[1:] = (swing_points[1:] != swing_points[:-1]) & ~np.isnan(swing_points[1:])
+    events = np.flatnonzero(changed) if x.ndim == 1 else np.nonzero(changed)
+    return swing_points, events
+
+
+def calculate_adxr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period=14) -> np.ndarray:
+    '''
+    ADXR of one or many symbols. Time runs along the first axis; with 2-D prices (bars x symbols) every column is
+    passed to `talib.ADXR` in turn, as the Wilder smoothing is sequential in time anyway.
+    Parameters:
+    - high, low, close: price points, all of the same shape
+    - period: time period of the ADX and ADXR
+    Returns:
+    - ADXR, NaN during the warm-up period of each symbol
+    '''
+    high, low, close = (np.asarray(x, dtype=np.float64) for x in (high, low, close))
+    if high.ndim == 1:
+        return talib.ADXR(high, low, close, timeperiod=period)
+
+    adxr = np.full(high.shape, np.nan)
+    for column in range(high.shape[1]):
+        # TA-Lib raises on columns that are all NaN (symbols without any bars)
+        if not np.isnan(close[:, column]).all():
+            adxr[:, column] = talib.ADXR(high[:, column], low[:, column], close[:, column], timeperiod=period)
+    return adxr
+
+
+class StreamingADXR:
+
+    '''
+    Streaming ADX/ADXR. Keeps the Wilder smoothed true range and directional movement, and the last `period` ADX
+    values, so each new bar is processed in O(1) instead of calling `talib.ADXR` over the whole history again.
+    The output follows TA-Lib's ADX/ADXR step for step, warm-up NaNs included: feeding a series bar by bar gives
+    the same values as `talib.ADXR(high, low, close, timeperiod=period)` on the whole series.
+
+     - period : time period of the ADX and ADXR (14 in the Swing Index System)
+    '''
+    def __init__(self, period: int = 14):
+        self.__period = period
+        self.reset()
+
+    def reset(self) -> None:
+        '''
+        Clears the state. Call this before streaming the bars of a new asset.
+        '''
+        # number of bars seen since the first one without NaN
+        self.__n_bars = 0
+        self.__previous_high = np.nan
+        self.__previous_low = np.nan
+        self.__previous_close = np.nan
+        self.__plus_dm = 0.0
+        self.__minus_dm = 0.0
+        self.__tr = 0.0
+        self.__sum_dx = 0.0
+        self.__adx = np.nan
+        self.__adx_history = deque(maxlen=self.__period)
+
+    @property
+    def adx(self) -> float:
+        # latest ADX (NaN during its warm-up period)
+        return self.__adx
+
+    def update(self, high: float, low: float, close: float) -> float:
+        '''
+        Consumes the newest bar. The directional movement and true range are summed over the first `period - 1` bars
+        and Wilder smoothed thereafter, and the first ADX is the mean of the first `period` DX values. ADXR averages
+        the current ADX with the ADX `period - 1` bars ago.
+
+        Returns:
+            - ADXR of the newest bar, NaN during the warm-up period
+        '''
+        # like TA-Lib, leading bars with NaN are skipped rather than poisoning the state
+        if self.__n_bars == 0 and (np.isnan(high) or np.isnan(low) or np.isnan(close)):
+            return np.nan
+
+        period = self.__period
+        n = self.__n_bars
+        self.__n_bars += 1
+        previous_high, previous_low, previous_close = self.__previous_high, self.__previous_low, self.__previous_close
+        self.__previous_high, self.__previous_low, self.__previous_close = high, low, close
+
+        # first bar only seeds the previous values
+        if n == 0:
+            return np.nan
+
+        diff_plus = high - previous_high
+        diff_minus = previous_low - low
+
+        # true range
+        tr = high - low
+        if abs(high - previous_close) > tr:
+            tr = abs(high - previous_close)
+        if abs(low - previous_close) > tr:
+            tr = abs(low - previous_close)
+
+        # initial sums
+        if n < period:
+            if diff_minus > 0 and diff_plus < diff_minus:
+                self.__minus_dm += diff_minus
+            elif diff_plus > 0 and diff_plus > diff_minus:
+                self.__plus_dm += diff_plus
+            self.__tr += tr
+            return np.nan
+
+        # Wilder smoothing
+        self.__minus_dm -= self.__minus_dm / period
+        self.__plus_dm -= self.__plus_dm / period
+        if diff_minus > 0 and diff_plus < diff_minus:
+            self.__minus_dm += diff_minus
+        elif diff_plus > 0 and diff_plus > diff_minus:
+            self.__plus_dm += diff_plus
+        self.__tr = self.__tr - (self.__tr / period) + tr
+
+        dx = np.nan
+        if not -1e-8 < self.__tr < 1e-8:
+            minus_di = 100.0 * (self.__minus_dm / self.__tr)
+            plus_di = 100.0 * (self.__plus_dm / self.__tr)
+            total_di = minus_di + plus_di
+            if not -1e-8 < total_di < 1e-8:
+                dx = 100.0 * (abs(minus_di - plus_di) / total_di)
+
+        # the first ADX is the mean of the first `period` DX values
+        if n < 2 * period:
+            if not np.isnan(dx):
+                self.__sum_dx += dx
+            if n < 2 * period - 1:
+                return np.nan
+            self.__adx = self.__sum_dx / period
+        elif not np.isnan(dx):
+            self.__adx = ((self.__adx * (period - 1)) + dx) / period
+
+        self.__adx_history.append(self.__adx)
+        if len(self.__adx_history) < period:
+            return np.nan
+        return (self.__adx_history[-1] + self.__adx_history[0]) / 2.0
+
 
 class SwingIndex:
 
@@ -19,6 +264,8 @@ class SwingIndex:
         self.__c7 = c7
         self.__adxr_buy_threshold = adxr_buy_threshold
         self.__adxr_sell_threshold = adxr_sell_threshold
+        self.__adxr_period = 14
+        self.reset()
 
     def __calculate_asi(self, high:pd.Series, low:pd.Series, close:pd.Series, open:pd.Series) -> pd.Series:
         '''
@@ -31,71 +278,8 @@ class SwingIndex:
         Returns:
         - accumulative swing index, as described in New Concepts in Technical Trading Systems
         '''
-        # length of series
-        N = len(high)
-
-
-        # constants (These will be optimized in a future project!)
-        c_1 = self.__c1
-        c_2 = self.__c2
-        c_3 = self.__c3
-        c_4 = self.__c4
-        c_5 = self.__c5
-        limit = self.__c6
-        
-        '''
-        `np.roll()` can be quite counter-intuitive, so I included an example of it below:
-        Example of np.roll():
-            x = np.arange(10)
-            np.roll(x, 2)
-            array([8, 9, 0, 1, 2, 3, 4, 5, 6, 7])
-            np.roll(x, -2)
-            array([2, 3, 4, 5, 6, 7, 8, 9, 0, 1])
-        '''
- 
-        previous_high = np.roll(high, 1, 0)
-        previous_high[0] = np.NaN
-
-        previous_close = np.roll(close, 1, 0)
-        previous_close[0] = np.NaN
-
-        previous_low = np.roll(low, 1, 0)
-        previous_low[0] = np.NaN
-
-        previous_open = np.roll(open, 1, 0)
-        previous_open[0] = np.NaN
-
-        # conditions for determining "R" (i.e., R is the largest of the following)
-        l_one = abs(high - previous_close)
-        l_two = abs(low - previous_close)
-        l_three = abs(high - low)
-
-        # R can take on three conditional values:
-        R = np.zeros_like(l_one)  # Initialize 'r_1' array with zeros with the same shape as the given array
-
-        for i in range(N):
-            if l_one.iloc[i] == max(l_one.iloc[i], l_two.iloc[i], l_three.iloc[i]):
-                R[i] = (l_one.iloc[i]) - (c_3 * abs(low.iloc[i] - previous_close[i])) + (c_4 * abs(previous_close[i] - previous_open[i]))
-                continue
-            
-            elif l_two.iloc[i] == max(l_one.iloc[i], l_two.iloc[i], l_three.iloc[i]):
-                R[i] =  (l_two.iloc[i]) - (c_3 * abs(high.iloc[i] - previous_close[i])) + (c_4 * abs(previous_close[i] - previous_open[i]))
-                continue
-
-            elif l_three.iloc[i] == max(l_one.iloc[i], l_two.iloc[i], l_three.iloc[i]):
-                R[i] = (l_three.iloc[i]) + (c_5 * abs(previous_close[i] - previous_open[i]))
-                continue
-
-        # requires previous day's value
-        R[0] = np.nan
-
-
-        # Equation for SI
-        K = (np.maximum(abs(high - previous_close), abs(low - previous_close))/limit)
-        si = (self.__c7/R) * ((close - previous_close) + (c_1 * (close - open)) + (c_2 * (previous_close - previous_open)))  * K
-
-        # Accumulative Swing Index 
-        asi = np.cumsum(si)
+        asi = calculate_asi(high.to_numpy(), low.to_numpy(), close.to_numpy(), open.to_numpy(),
+                            self.__c1, self.__c2, self.__c3, self.__c4, self.__c5, self.__c6, self.__c7)
 
         asi = pd.Series(asi)
         asi.index = high.index
@@ -112,27 +296,11 @@ class SwingIndex:
         Returns:
         - hsp or lsp, filled in **forward** so there are no nan values
         """
-        swing_points = np.full(len(x), np.nan)
-        if hi: # maxima
-            for i in range(2, len(x)):
-                # we cannot look ahead until the day finishes; take x[i - 1] as critical point
-                if x.iloc[i - 1] >= x.iloc[i] and x.iloc[i - 1] >= x.iloc[i - 2]: # def of local maxima
-                    swing_points[i] = x.iloc[i - 1]
-                else:
-                    continue
-        else: # minima
-            for i in range(2, len(x)):
-                if x.iloc[i - 1] <= x.iloc[i] and x.iloc[i - 1] <= x.iloc[i - 2]: # def of local minima
-                    swing_points[i] = x.iloc[i - 1]
-                else:
-                    continue
+        swing_points, _ = find_swing_points(x.to_numpy(), hi)
 
         # pandas manipulations; we convert to a pandas series, and make the indices the same
         swing_points = pd.Series(swing_points)
         swing_points.index = x.index
-
-        # forward fills missing values, creating a sort of sar 
-        swing_points.ffill(inplace=True)
         return swing_points
 
 
@@ -202,9 +370,155 @@ class SwingIndex:
         data.loc[:,"lop"] = lop
         data.loc[:,"adxr_buy_threshold"] = adxr > self.__adxr_buy_threshold
         data.loc[:,"adxr_sell_threshold"] = adxr < self.__adxr_sell_threshold
-            
+
         return data
-    
+
+    def calculate_arrays(self, bars: dict) -> dict:
+        '''
+        Same as `initialize_swing_df_demo()`, on arrays rather than a dataframe, e.g. the memory-mapped bars returned
+        by `BarStore.read_arrays()`. The prices may be float32; they are calculated on in float64.
+
+        Parameters:
+            - bars : dict of 1-D arrays holding at least 'open,' 'high,' 'low,' and 'close'
+        Returns:
+            - dict of the seven Swing Index System columns: 'asi,' 'hsp,' 'hip,' 'lsp,' 'lop,' 'adxr_buy_threshold,' 'adxr_sell_threshold.'
+        '''
+        open, high, low, close = (np.asarray(bars[column], dtype=np.float64) for column in ("open", "high", "low", "close"))
+
+        adxr = calculate_adxr(high, low, close, self.__adxr_period)
+        asi = calculate_asi(high, low, close, open, self.__c1, self.__c2, self.__c3, self.__c4, self.__c5, self.__c6, self.__c7)
+        return {
+            "asi": asi,
+            "hsp": find_swing_points(asi)[0],
+            "hip": find_swing_points(high)[0],
+            "lsp": find_swing_points(asi, False)[0],
+            "lop": find_swing_points(low, False)[0],
+            "adxr_buy_threshold": adxr > self.__adxr_buy_threshold,
+            "adxr_sell_threshold": adxr < self.__adxr_sell_threshold,
+        }
+
+
+    def reset(self) -> None:
+        '''
+        Clears the incremental state used by `update()`. Call this before streaming the bars of a new asset.
+        '''
+        # number of bars seen so far
+        self.__n_bars = 0
+
+        # previous bar and the running sum of the swing index
+        self.__previous_open = np.nan
+        self.__previous_close = np.nan
+        self.__asi_sum = 0.0
+
+        # for each swing point: [x two bars ago, x one bar ago, current (forward filled) swing point]
+        self.__swing_state = {name: [np.nan, np.nan, np.nan] for name in ("hsp", "hip", "lsp", "lop")}
+
+        # Wilder smoothed ADX state (mirrors TA-Lib's ADX/ADXR)
+        self.__adxr = StreamingADXR(self.__adxr_period)
+
+    @property
+    def n_bars(self) -> int:
+        # number of bars consumed by `update()` since the last `reset()`
+        return self.__n_bars
+
+    @property
+    def parameters(self) -> dict:
+        # parameters of the system, as keyword arguments of `SwingIndex` (and of `Panel.trades()`)
+        return {"c1": self.__c1, "c2": self.__c2, "c3": self.__c3, "c4": self.__c4, "c5": self.__c5, "c6": self.__c6,
+                "c7": self.__c7, "adxr_sell_threshold": self.__adxr_sell_threshold,
+                "adxr_buy_threshold": self.__adxr_buy_threshold}
+
+    def update(self, bar) -> dict:
+        '''
+        Incremental counterpart of `initialize_swing_df_demo()`. Each call consumes the newest bar and returns
+        the Swing Index System variables for it in O(1), carrying the running ASI sum, the last two values of each
+        series for swing point detection, and the Wilder smoothed ADXR state between calls. Streaming a dataframe
+        through `update()` row by row produces the same columns as `initialize_swing_df_demo()` on that dataframe.
+
+        Parameters:
+            - bar : The newest bar. Anything indexable by 'open,' 'high,' 'low,' and 'close' (a dataframe row, a dict)
+        Returns:
+            - dict of the seven new columns for this bar: 'asi,' 'hsp,' 'hip,' 'lsp,' 'lop,' 'adxr_buy_threshold,' 'adxr_sell_threshold.'
+        '''
+        # numpy scalars keep the arithmetic (and the division by zero behaviour) identical to the vectorized version
+        open, high, low, close = (np.float64(bar[column]) for column in ("open", "high", "low", "close"))
+
+        adxr = self.__adxr.update(high, low, close)
+        asi = self.__update_asi(open, high, low, close)
+
+        row = {
+            "asi": asi,
+            "hsp": self.__update_swing_point("hsp", asi, True),
+            "hip": self.__update_swing_point("hip", high, True),
+            "lsp": self.__update_swing_point("lsp", asi, False),
+            "lop": self.__update_swing_point("lop", low, False),
+            "adxr_buy_threshold": adxr > self.__adxr_buy_threshold,
+            "adxr_sell_threshold": adxr < self.__adxr_sell_threshold,
+        }
+        self.__n_bars += 1
+        return row
+
+
+    def __update_asi(self, open: float, high: float, low: float, close: float) -> float:
+        '''
+        Adds the swing index of the newest bar to the running ASI. This is the same calculation as `__calculate_asi()`
+        for a single row; the first bar has no previous close, so its ASI is NaN.
+        '''
+        previous_close = self.__previous_close
+        previous_open = self.__previous_open
+        self.__previous_close = close
+        self.__previous_open = open
+
+        # requires previous day's value
+        if self.__n_bars == 0:
+            return np.nan
+
+        l_one = abs(high - previous_close)
+        l_two = abs(low - previous_close)
+        l_three = abs(high - low)
+        largest = max(l_one, l_two, l_three)
+
+        # same order of precedence as `__calculate_asi()`
+        if l_one == largest:
+            R = l_one - (self.__c3 * abs(low - previous_close)) + (self.__c4 * abs(previous_close - previous_open))
+        elif l_two == largest:
+            R = l_two - (self.__c3 * abs(high - previous_close)) + (self.__c4 * abs(previous_close - previous_open))
+        elif l_three == largest:
+            R = l_three + (self.__c5 * abs(previous_close - previous_open))
+        else:
+            R = np.float64(0)
+
+        K = max(abs(high - previous_close), abs(low - previous_close)) / self.__c6
+        move = ((close - previous_close) + (self.__c1 * (close - open)) + (self.__c2 * (previous_close - previous_open))) * K
+        if R == 0:
+            # a flat bar: as in `calculate_asi()`, the swing index is infinite, or undefined if nothing moved
+            with np.errstate(divide='ignore', invalid='ignore'):
+                si = (np.float64(self.__c7) / np.float64(R)) * move
+        else:
+            si = (self.__c7 / R) * move
+
+        # the cumulative sum skips undefined swing indices, but they remain undefined in the ASI itself
+        if np.isnan(si):
+            return np.nan
+        self.__asi_sum += si
+        return self.__asi_sum
+
+
+    def __update_swing_point(self, name: str, x: float, hi: bool) -> float:
+        '''
+        Streaming version of `__init_swing_points()`. The critical point is the previous value of `x`, once we know
+        it is a local maxima (or minima) with respect to its neighbours; otherwise the last swing point is carried forward.
+        '''
+        state = self.__swing_state[name]
+        before, previous, swing_point = state
+        if self.__n_bars >= 2:
+            if hi and previous >= x and previous >= before: # def of local maxima
+                swing_point = previous
+            elif not hi and previous <= x and previous <= before: # def of local minima
+                swing_point = previous
+        state[0], state[1], state[2] = previous, x, swing_point
+        return swing_point
+
 
 class DemoStrategy:
     '''
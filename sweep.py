@@ -0,0 +1,155 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import talib
+from sw import calculate_asi, calculate_asi_batch, find_swing_points
+from position import generate_signals_from_arrays
+from trade_stats import TradeStatistics
+
+
+class ParameterSweep:
+
+    '''
+    Evaluates the Swing Index System for many parameter sets over the same bars (e.g. for Bayesian optimization).
+    The pipeline is split into layers, and each layer is cached by the parameters it actually depends on:
+
+     1. raw bars                       : no parameters, loaded once
+     2. HIP, LOP and ADXR              : no parameters, calculated once
+     3. ASI, HSP and LSP               : c1, ..., c7
+     4. ADXR thresholds and signals    : c1, ..., c7, a1, a2
+
+    so an evaluation only recalculates the layers whose parameters changed. As in `backtest_testcase()`, a1 is the
+    ADXR sell threshold and a2 the ADXR buy threshold.
+
+     - bars       : dataframe indexed by (symbol, timestamp), as returned by `Backtest.get_data_bars()`
+     - symbols    : assets to evaluate (by default, every symbol in `bars`)
+     - cache_size : number of parameter sets kept by each cached layer
+    '''
+    def __init__(self, bars: pd.DataFrame, symbols: list = None, cache_size: int = 256):
+        if symbols is None:
+            symbols = list(bars.index.get_level_values(0).unique())
+        self.__symbols = symbols
+        self.__cache_size = cache_size
+        self.__asi_cache = OrderedDict()
+        self.__trades_cache = OrderedDict()
+
+        # parameter independent layers
+        self.__assets = []
+        for symbol in symbols:
+            df = bars.loc[symbol]
+            asset = {column: df[column].to_numpy(dtype=np.float64) for column in ("open", "high", "low", "close")}
+            # bars with null values are skipped by the backtest
+            asset["valid"] = ~df.isnull().any(axis=1).to_numpy()
+            asset["adxr"] = talib.ADXR(asset["high"], asset["low"], asset["close"], timeperiod=14)
+            asset["hip"], _ = find_swing_points(asset["high"])
+            asset["lop"], _ = find_swing_points(asset["low"], False)
+            self.__assets.append(asset)
+
+    @property
+    def symbols(self) -> list:
+        return self.__symbols
+
+    def evaluate(self, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, a1=20, a2=20) -> float:
+        '''
+        Returns:
+            - total profits/losses over every asset for this parameter set. Suitable as the objective of the optimizer.
+        '''
+        total = 0.0
+        for trades in self.trades(c1, c2, c3, c4, c5, c6, c7, a1, a2).values():
+            total += np.sum(trades["num_shares"] * (trades["entry_price"] - trades["exit_price"]))
+        return float(total)
+
+    def evaluate_batch(self, parameters: np.ndarray) -> np.ndarray:
+        '''
+        Evaluates many parameter sets at once. The ASI, HSP and LSP of every parameter set that is not cached yet are
+        calculated together, in one broadcast call per asset (bars x parameter sets); only the state machine of the
+        signals runs once per parameter set.
+
+        Parameters:
+            - parameters : matrix with one row (c1, ..., c7, a1, a2) per parameter set
+        Returns:
+            - total profits/losses of each parameter set, as given by `evaluate()`
+        '''
+        parameters = np.asarray(parameters, dtype=np.float64).reshape(-1, 9)
+        keys = [tuple(row) for row in parameters.tolist()]
+
+        # calculate the ASI layer of the new constants together
+        new_constants = [key[:7] for key in keys if key not in self.__trades_cache and key[:7] not in self.__asi_cache]
+        new_constants = list(dict.fromkeys(new_constants))
+        if new_constants:
+            asi_layers = [[] for _ in new_constants]
+            for asset in self.__assets:
+                asi = calculate_asi_batch(asset["high"], asset["low"], asset["close"], asset["open"], np.array(new_constants))
+                hsp, _ = find_swing_points(asi)
+                lsp, _ = find_swing_points(asi, False)
+                for p in range(len(new_constants)):
+                    asi_layers[p].append((asi[:, p], hsp[:, p], lsp[:, p]))
+            for constants, layer in zip(new_constants, asi_layers):
+                self.__cached(self.__asi_cache, constants, lambda: layer)
+
+        return np.array([self.evaluate(*key) for key in keys])
+
+    def trades(self, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, a1=20, a2=20) -> dict:
+        '''
+        Returns:
+            - dict mapping each asset to its closed trades (see `position.TRADE_DTYPE`), the same trades as the backtest
+              gives with `SwingIndex(symbols, c1, c2, c3, c4, c5, c6, c7, a1, a2)`
+        '''
+        key = (c1, c2, c3, c4, c5, c6, c7, a1, a2)
+        return self.__cached(self.__trades_cache, key, lambda: self.__calculate_trades(key))
+
+    def statistics(self, c1=.5, c2=.25, c3=.5, c4=.25, c5=.25, c6=3, c7=50, a1=20, a2=20) -> TradeStatistics:
+        '''
+        Returns:
+            - running statistics of the trades of this parameter set (see `trade_stats.TradeStatistics`). Unless they
+              are cached already, the trades are generated asset by asset and dropped once added, so only the
+              aggregates of the evaluation are kept.
+        '''
+        key = (c1, c2, c3, c4, c5, c6, c7, a1, a2)
+        statistics = TradeStatistics()
+        trades = self.__trades_cache[key].items() if key in self.__trades_cache else self.__generate_trades(key)
+        for _, asset_trades in trades:
+            statistics.update(asset_trades)
+        return statistics
+
+    def __calculate_trades(self, key: tuple) -> dict:
+        return dict(self.__generate_trades(key))
+
+    def __generate_trades(self, key: tuple):
+        '''
+        Yields the symbol and closed trades of each asset in turn.
+        '''
+        asi_layer = self.__cached(self.__asi_cache, key[:7], lambda: self.__calculate_asi_layer(key[:7]))
+        adxr_sell_threshold, adxr_buy_threshold = key[7], key[8]
+
+        for symbol, asset, (asi, hsp, lsp) in zip(self.__symbols, self.__assets, asi_layer):
+            columns = {
+                "high": asset["high"], "low": asset["low"], "close": asset["close"],
+                "asi": asi, "hsp": hsp, "lsp": lsp, "hip": asset["hip"], "lop": asset["lop"],
+                "adxr_buy_threshold": asset["adxr"] > adxr_buy_threshold,
+                "adxr_sell_threshold": asset["adxr"] < adxr_sell_threshold,
+            }
+            valid = asset["valid"] & ~np.isnan(asi) & ~np.isnan(hsp) & ~np.isnan(lsp) & ~np.isnan(asset["hip"]) & ~np.isnan(asset["lop"])
+            yield symbol, generate_signals_from_arrays(columns, valid)
+
+    def __calculate_asi_layer(self, constants: tuple) -> list:
+        layer = []
+        for asset in self.__assets:
+            asi = calculate_asi(asset["high"], asset["low"], asset["close"], asset["open"], *constants)
+            hsp, _ = find_swing_points(asi)
+            lsp, _ = find_swing_points(asi, False)
+            layer.append((asi, hsp, lsp))
+        return layer
+
+    def __cached(self, cache: OrderedDict, key: tuple, calculate):
+        '''
+        Least recently used cache lookup: returns `cache[key]`, calling `calculate()` to fill it in if needed.
+        '''
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = calculate()
+        cache[key] = value
+        if len(cache) > self.__cache_size:
+            cache.popitem(last=False)
+        return value
@@ -0,0 +1,25 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# the modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def backtest(tmp_path, monkeypatch):
+    # backtest over a bar store and a universe of the synthetic bars of SYMBOLS, built over START to END
+    from bar_store import BarStore, FrameBarSource
+    from universe import Universe
+    from backtest_engine import Backtest
+    from synthetic import make_bars, SYMBOLS, START, END
+
+    securities_file = tmp_path / "securities.csv"
+    pd.DataFrame({"Ticker": SYMBOLS, "Name": SYMBOLS, "Exchange": "NYSE"}).to_csv(securities_file, index=False)
+    bar_store = BarStore(str(tmp_path / "bars"), FrameBarSource(make_bars(SYMBOLS, 300)), np.float64)
+    universe = Universe.build(str(securities_file), bar_store=bar_store, timeframe="1Day", start_date=START, end_date=END)
+    # nothing is shown
+    monkeypatch.setattr(Backtest, "plot", lambda *args, **kwargs: None)
+    return Backtest(bar_store, universe)
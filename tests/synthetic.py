@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+# symbols and date range of the synthetic backtests (see the `backtest` fixture)
+SYMBOLS = ["AAA", "BBB", "CCC"]
+START, END = "2020-01-01", "2020-12-31"
+
+
+def make_bars(symbols: list, n: int, seed: int = 0, listed_every: int = 0) -> pd.DataFrame:
+    '''
+    Random walk daily bars of `symbols`, rounded to cents so prices tie now and then.
+
+    Parameters:
+        - listed_every : each symbol is listed this many bars after the previous one, so their dates differ
+    Returns:
+        - dataframe indexed by (symbol, timestamp), as `BarStore.get_bars()` returns it
+    '''
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for k, symbol in enumerate(symbols):
+        index = pd.date_range("2020-01-01", periods=n, freq="B", tz="UTC", name="timestamp")[k * listed_every:]
+        m = len(index)
+        close = np.abs(20 + np.cumsum(rng.normal(0, .6, m)) + k) + 5
+        open = close + rng.normal(0, .3, m)
+        high = np.maximum(open, close) + np.abs(rng.normal(0, .4, m))
+        low = np.minimum(open, close) - np.abs(rng.normal(0, .4, m))
+        frames[symbol] = pd.DataFrame({"open": open, "high": high, "low": low, "close": close}, index=index).round(2)
+        frames[symbol]["volume"] = rng.integers(1000, 5000, m).astype(np.float64)
+    return pd.concat(frames, names=["symbol", "timestamp"])
+
+
+def to_arrays(bars: pd.DataFrame) -> dict:
+    '''
+    Returns:
+        - dict mapping each symbol of `bars` to its arrays, as `BarStore.read_arrays()` returns them
+    '''
+    return {symbol: {"timestamp": frame.index.get_level_values("timestamp").asi8,
+                     **{column: frame[column].to_numpy() for column in frame.columns}}
+            for symbol, frame in bars.groupby(level="symbol", sort=False)}
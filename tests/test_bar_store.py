@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bar_store import BarStore, FrameBarSource
+from broker import corwin_schultz_spread
+
+
+def make_bars(symbols, timestamps):
+    rng = np.random.default_rng(0)
+    frames = {}
+    for symbol in symbols:
+        close = 100 + np.cumsum(rng.normal(0, 1, len(timestamps)))
+        frames[symbol] = pd.DataFrame({"open": close, "high": close + 1, "low": close - 1, "close": close,
+                                       "volume": 1000.}, index=pd.DatetimeIndex(timestamps, name="timestamp"))
+    return pd.concat(frames, names=["symbol", "timestamp"])
+
+
+class PublishingSource(FrameBarSource):
+    # only serves the bars published so far, as a delayed feed would
+    def __init__(self, bars: pd.DataFrame):
+        super().__init__(bars)
+        self.published = bars.index.get_level_values(1).max()
+
+    def fetch(self, symbols, timeframe, start, end):
+        return super().fetch(symbols, timeframe, start, min(end, self.published))
+
+
+@pytest.fixture
+def daily_bars():
+    return make_bars(["AAA", "BBB"], pd.date_range("2021-01-04", periods=30, freq="B", tz="UTC"))
+
+
+def test_cached_range_is_not_fetched_again(tmp_path, daily_bars):
+    source = FrameBarSource(daily_bars)
+    store = BarStore(str(tmp_path), source, np.float64)
+    start, end = pd.Timestamp("2021-01-04", tz="UTC"), pd.Timestamp("2021-02-12", tz="UTC")
+
+    first = store.get_bars(["AAA", "BBB"], start, end, "1Day")
+    second = store.get_bars(["AAA", "BBB"], start, end, "1Day")
+
+    assert len(source.requests) == 1
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first[daily_bars.columns], daily_bars, check_freq=False)
+
+
+def test_only_missing_range_is_fetched(tmp_path, daily_bars):
+    source = FrameBarSource(daily_bars)
+    store = BarStore(str(tmp_path), source, np.float64)
+    store.get_bars(["AAA"], pd.Timestamp("2021-01-11", tz="UTC"), pd.Timestamp("2021-01-29", tz="UTC"), "1Day")
+    bars = store.get_bars(["AAA"], pd.Timestamp("2021-01-04", tz="UTC"), pd.Timestamp("2021-02-12", tz="UTC"), "1Day")
+
+    assert len(bars) == 30
+    # the range before and the range after what was cached
+    assert [(start.value, end.value) for _, start, end in source.requests[1:]] == [
+        (pd.Timestamp("2021-01-04", tz="UTC").value, pd.Timestamp("2021-01-11", tz="UTC").value - 1),
+        (pd.Timestamp("2021-01-29", tz="UTC").value + 1, pd.Timestamp("2021-02-12", tz="UTC").value)]
+
+
+def test_unpublished_bars_are_fetched_again(tmp_path):
+    now = pd.Timestamp.now(tz="UTC").floor("min")
+    bars = make_bars(["AAA"], pd.date_range(now - pd.Timedelta(minutes=60), periods=60, freq="min"))
+    source = PublishingSource(bars)
+    # bars are published 15 minutes after they end
+    source.published = now - pd.Timedelta(minutes=16)
+    store = BarStore(str(tmp_path), source, np.float64, feed_delay=pd.Timedelta(minutes=15))
+    start, end = now - pd.Timedelta(minutes=60), now
+
+    assert len(store.get_bars(["AAA"], start, end, "1Min")) == 45
+    source.published = now
+    assert len(store.get_bars(["AAA"], start, end, "1Min")) == 60
+
+
+def test_read_arrays_matches_bars(tmp_path, daily_bars):
+    store = BarStore(str(tmp_path), FrameBarSource(daily_bars), np.float64)
+    start, end = pd.Timestamp("2021-01-04", tz="UTC"), pd.Timestamp("2021-02-12", tz="UTC")
+    arrays = store.get_arrays(["AAA"], start, end, "1Day")["AAA"]
+
+    assert np.array_equal(arrays["timestamp"], daily_bars.loc["AAA"].index.asi8)
+    assert np.array_equal(arrays["close"], daily_bars.loc["AAA"]["close"].to_numpy())
+    assert store.availability("AAA", "1Day")[2] == 30
+    assert store.symbols("1Day") == ["AAA"]
+
+
+def test_prices_are_stored_in_float64_unless_asked_otherwise(tmp_path, daily_bars):
+    start, end = pd.Timestamp("2021-01-04", tz="UTC"), pd.Timestamp("2021-02-12", tz="UTC")
+    close = daily_bars.loc["AAA"]["close"].to_numpy()
+    arrays = BarStore(str(tmp_path / "default"), FrameBarSource(daily_bars)).get_arrays(["AAA"], start, end, "1Day")["AAA"]
+    assert arrays["close"].dtype == np.float64
+    assert np.array_equal(arrays["close"], close)
+
+    # float32 rounds the prices
+    arrays = BarStore(str(tmp_path / "float32"), FrameBarSource(daily_bars), np.float32).get_arrays(["AAA"], start, end, "1Day")["AAA"]
+    assert arrays["close"].dtype == np.float32
+    assert not np.array_equal(arrays["close"], close)
+    assert np.allclose(arrays["close"], close)
+
+def test_spreads_are_stored_over_the_whole_history(tmp_path, daily_bars):
+    store = BarStore(str(tmp_path), FrameBarSource(daily_bars), np.float64)
+    store.get_bars(["AAA"], pd.Timestamp("2021-01-11", tz="UTC"), pd.Timestamp("2021-01-29", tz="UTC"), "1Day")
+    bars = store.get_bars(["AAA"], pd.Timestamp("2021-01-04", tz="UTC"), pd.Timestamp("2021-02-12", tz="UTC"), "1Day").loc["AAA"]
+
+    expected = np.nan_to_num(corwin_schultz_spread(daily_bars.loc["AAA"]["high"], daily_bars.loc["AAA"]["low"]))
+    assert np.allclose(bars["spread"].to_numpy(), expected)
+    assert (expected > 0).any()
+
+
+def test_resampled_bars_get_their_own_spreads(tmp_path):
+    rng = np.random.default_rng(1)
+    bars = make_bars(["AAA"], pd.date_range("2021-01-04 14:30", periods=120, freq="min", tz="UTC"))
+    bars["high"] += rng.uniform(0, 1, len(bars))
+    store = BarStore(str(tmp_path), FrameBarSource(bars), np.float64, base_timeframe="1Min")
+    resampled = store.get_arrays(["AAA"], pd.Timestamp("2021-01-04", tz="UTC"), pd.Timestamp("2021-01-05", tz="UTC"), "5Min")["AAA"]
+
+    assert len(resampled["timestamp"]) == 24
+    expected = np.nan_to_num(corwin_schultz_spread(resampled["high"], resampled["low"]))
+    assert np.allclose(resampled["spread"], expected)
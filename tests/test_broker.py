@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from broker import Broker, SpreadEstimator, corwin_schultz_spread
+from position import TRADE_DTYPE, generate_signals
+from sw import SwingIndex
+from synthetic import make_bars
+
+BAR = {"open": 10.0, "high": 11.0, "low": 9.0, "close": 10.5}
+
+
+@pytest.mark.parametrize("side, stop, price", [
+    (1, 10.5, 10.5),    # buy stop reached by the high
+    (1, 11.5, -1),      # buy stop above the high
+    (1, 9.5, 10.0),     # the bar opened above the buy stop
+    (-1, 9.5, 9.5),     # sell stop reached by the low
+    (-1, 8.5, -1),      # sell stop below the low
+    (-1, 10.5, 10.0),   # the bar opened below the sell stop
+])
+def test_stop_order_is_triggered_on_its_side(side, stop, price):
+    assert Broker(order_type="STOP").submit_order_bar("AAA", BAR, stop, "STOP", side) == price
+
+
+def test_limit_and_market_orders():
+    broker = Broker(slippage=.01)
+    assert broker.submit_order_bar("AAA", BAR, 10.5, "LIMIT", 1) == 10.5
+    assert broker.submit_order_bar("AAA", BAR, 11.5, "LIMIT", 1) == -1
+    assert broker.submit_order_bar("AAA", BAR, 12.0, "MARKET", -1) == pytest.approx(12.0 * .99)
+
+
+def test_fill_trades_matches_submit_order():
+    bars = make_bars(["AAA"], 300).loc["AAA"]
+    broker = Broker(slippage=.001, spread=True, order_type="STOP")
+    broker.load({"AAA": bars})
+    trades = generate_signals(SwingIndex(["AAA"]).initialize_swing_df_demo(bars), {"order_type": "STOP"})
+    assert len(trades) > 1
+
+    filled = broker.fill_trades("AAA", trades)
+    for trade, filled_trade in zip(trades[1:], filled[1:]):
+        side = int(trade["side"])
+        # the order of a reversal to short is placed on the bar before the one it is recorded on
+        entry = broker.submit_order_at("AAA", trade["entry_index"] - (side == -1), trade["entry_price"], "STOP", side)
+        exit = broker.submit_order_at("AAA", trade["exit_index"] - (side == 1), trade["exit_price"], "STOP", -side)
+        assert filled_trade["entry_price"] == pytest.approx(entry)
+        assert filled_trade["exit_price"] == pytest.approx(exit)
+    assert np.array_equal(filled[0], trades[0])
+    assert filled.dtype == TRADE_DTYPE
+
+
+def test_load_uses_stored_spreads():
+    bars = make_bars(["AAA"], 100).loc["AAA"]
+    broker = Broker()
+    broker.load({"AAA": bars})
+    assert np.isnan(broker.spreads("AAA")[0])
+
+    broker.load({"AAA": bars.assign(spread=.01)})
+    assert np.array_equal(broker.spreads("AAA"), np.full(100, .01))
+    # the stored spreads were estimated over the default window only
+    other_window = Broker(window=5)
+    other_window.load({"AAA": bars.assign(spread=.01)})
+    assert not np.array_equal(other_window.spreads("AAA"), np.full(100, .01))
+
+
+def test_loaded_spreads_are_reused():
+    bars = make_bars(["AAA", "BBB"], 100)
+    broker = Broker()
+    broker.load(bars.assign(spread=.01))
+
+    broker.load({"AAA": bars.loc["AAA"]}, reload=False)
+    assert np.array_equal(broker.spreads("AAA"), np.full(100, .01))
+    # bars of another length are loaded again
+    broker.load({"AAA": bars.loc["AAA"].iloc[:50]}, reload=False)
+    assert len(broker.spreads("AAA")) == 50
+
+
+@pytest.mark.parametrize("window", [5, 20])
+def test_spread_estimator_matches_corwin_schultz_spread(window):
+    bars = make_bars(["AAA"], 100).loc["AAA"]
+    estimator = SpreadEstimator(window)
+    spreads = [estimator.update(high, low) for high, low in zip(bars["high"], bars["low"])]
+
+    expected = corwin_schultz_spread(bars["high"].to_numpy(), bars["low"].to_numpy(), window)
+    assert np.isnan(spreads[0])
+    assert np.allclose(spreads, expected, equal_nan=True)
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from broker import Broker
+from capital_manager import CapitalManager
+from portfolio import PortfolioSimulator
+from replay import ReplayJournal, OUTCOMES
+from sw import SwingIndex
+from synthetic import make_bars, to_arrays
+
+
+def test_buy_within_margins():
+    capital_manager = CapitalManager(1000, .6, .15)
+
+    assert capital_manager.submit_order_check(1, 150, "AAA")
+    capital_manager.buy(1, 150, "AAA")
+    assert capital_manager.allocated("AAA") == 150
+    assert capital_manager.total_capital_allocated == 150
+    assert capital_manager.buying_power == 850
+
+
+def test_order_breaking_margin_per_commodity_is_rejected():
+    capital_manager = CapitalManager(1000, .6, .15)
+
+    # there is enough buying power, but 160 is more than the 150 allowed to one commodity
+    assert not capital_manager.submit_order_check(1, 160, "AAA")
+    assert capital_manager.submit_order_check(1, 150, "AAA")
+
+
+def test_order_breaking_total_margin_is_rejected():
+    capital_manager = CapitalManager(1000, .6, .15)
+    for asset in ("AAA", "BBB", "CCC", "DDD"):
+        capital_manager.buy(1, 140, asset)
+
+    # 560 allocated, 600 allowed in total
+    assert not capital_manager.submit_order_check(1, 50, "EEE")
+    assert capital_manager.submit_order_check(1, 40, "EEE")
+    # reversing the position of an asset frees what it had allocated
+    assert capital_manager.submit_order_check(1, 150, "AAA")
+
+
+def test_short_entry_allocates_margin():
+    capital_manager = CapitalManager(1000, .6, .15)
+    capital_manager.sell_short(1, 150, "AAA")
+
+    assert capital_manager.allocated("AAA") == 150
+    assert capital_manager.total_capital_allocated == 150
+    assert capital_manager.buying_power == 850
+    assert capital_manager.total_capital == 1000
+
+
+@pytest.mark.parametrize("open_position", ["buy", "sell_short"])
+def test_close_books_profits_losses_and_frees_the_allocation(open_position):
+    capital_manager = CapitalManager(1000, .6, .15)
+    getattr(capital_manager, open_position)(1, 150, "AAA")
+    capital_manager.close(-10, "AAA")
+
+    assert capital_manager.allocated("AAA") == 0
+    assert capital_manager.total_capital_allocated == 0
+    assert capital_manager.total_capital == 990
+    assert capital_manager.buying_power == 990
+
+
+def test_portfolio_open_positions_stay_within_the_margins():
+    symbols = ["AAA", "BBB", "CCC"]
+    arrays = to_arrays(make_bars(symbols, 300))
+    # shares cost 9 to 41: the dearer ones break the margin per commodity, and three positions the total margin
+    total_margin, margin_per_commodity = 70, 35
+    capital_manager = CapitalManager(1000, total_margin / 1000, margin_per_commodity / 1000)
+    journal = ReplayJournal()
+    simulator = PortfolioSimulator(capital_manager, SwingIndex(symbols), Broker(order_type="MARKET"), journal=journal)
+    simulator.run(arrays)
+
+    # each filled order opens a position at its price, the one it reverses being closed
+    decisions = journal.decisions
+    open_positions = {}
+    for decision in decisions[decisions["outcome"] == OUTCOMES.index("filled")]:
+        open_positions[decision["asset_id"]] = decision["price"]
+        assert open_positions[decision["asset_id"]] <= margin_per_commodity
+        assert sum(open_positions.values()) <= total_margin
+    assert len(open_positions) >= 2
+    assert simulator.rejected_orders > 0
+    assert capital_manager.total_capital_allocated == pytest.approx(sum(open_positions.values()))
+
+
+def test_portfolio_rejects_orders_breaking_the_margin_per_commodity():
+    symbols = ["AAA", "BBB", "CCC"]
+    bars = make_bars(symbols, 300)
+    arrays = to_arrays(bars)
+    highest_price = float(bars["high"].max())
+
+    # plenty of buying power, but each commodity may only hold a fraction of the price of one share
+    unlimited = ReplayJournal()
+    PortfolioSimulator(CapitalManager(1e9, 1, 1), SwingIndex(symbols), journal=unlimited).run(arrays)
+    limited = ReplayJournal()
+    simulator = PortfolioSimulator(CapitalManager(100 * highest_price, 1, .001), SwingIndex(symbols), journal=limited)
+    simulator.run(arrays)
+
+    assert (unlimited.decisions["outcome"] == OUTCOMES.index("rejected")).sum() == 0
+    assert len(unlimited) > 0
+    # no position can be opened, long or short
+    assert simulator.rejected_orders == len(limited) > 0
+    assert np.all(limited.decisions["outcome"] == OUTCOMES.index("rejected"))
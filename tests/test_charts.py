@@ -0,0 +1,60 @@
+import matplotlib
+import numpy as np
+import pytest
+from charts import downsample, marker_series, render_charts
+from position import TRADE_DTYPE
+from synthetic import make_bars, SYMBOLS, START, END
+
+# nothing is shown
+matplotlib.use("Agg")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def test_marker_series_places_entries_on_their_bars():
+    trades = np.array([(0, 3, 0, 0., 0., 0), (3, 5, 1, 10., 11., 1), (5, 8, -1, 11., 12., 1),
+                       (8, 8, 1, 12., 13., 1), (8, 12, 1, 13., 14., 1), (12, 20, -1, 14., 15., 1)], dtype=TRADE_DTYPE)
+    long_markers, short_markers = marker_series(10, trades)
+
+    assert len(long_markers) == len(short_markers) == 10
+    assert np.flatnonzero(~np.isnan(long_markers)).tolist() == [3, 8]
+    assert np.flatnonzero(~np.isnan(short_markers)).tolist() == [5]
+    assert long_markers[3] == 10 and short_markers[5] == 11
+    # the last of the trades entered on the same bar is shown; the initial trade and later entries are not
+    assert long_markers[8] == 13
+
+
+def test_downsample_merges_consecutive_bars():
+    bars = make_bars(["AAA"], 103).loc["AAA"]
+    merged, step = downsample(bars, 10)
+
+    assert step == 11 and len(merged) == 10
+    assert merged.index.equals(bars.index[::11])
+    assert np.array_equal(merged["open"], bars["open"].to_numpy()[::11])
+    assert merged["close"].iloc[0] == bars["close"].iloc[10] and merged["close"].iloc[-1] == bars["close"].iloc[-1]
+    assert merged["high"].iloc[1] == bars["high"].iloc[11:22].max() and merged["low"].iloc[-1] == bars["low"].iloc[99:].min()
+    assert merged["volume"].sum() == bars["volume"].sum()
+    short, step = downsample(bars, 200)
+    assert short is bars and step == 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_charts_saves_one_image_per_asset(tmp_path, workers):
+    bars = make_bars(["AAA", "BBB"], 1000)
+    trades = np.array([(0, 100, 0, 0., 0., 0), (100, 400, 1, 25., 26., 1), (400, 900, -1, 26., 24., 1)], dtype=TRADE_DTYPE)
+    charts = {symbol: (bars.loc[symbol], trades) for symbol in ["AAA", "BBB"]}
+    # narrow enough for the bars to be downsampled
+    paths = render_charts(charts, str(tmp_path / "charts"), workers, width=800, height=450)
+
+    assert paths == [str(tmp_path / "charts" / "AAA.png"), str(tmp_path / "charts" / "BBB.png")]
+    for path in paths:
+        with open(path, "rb") as chart:
+            assert chart.read(8) == PNG_SIGNATURE
+
+
+def test_backtest_renders_charts(backtest, tmp_path):
+    backtest.backtest(SYMBOLS, 1e12, START, END, fast=True, seed=0, charts=str(tmp_path / "charts"))
+
+    for symbol in SYMBOLS:
+        with open(tmp_path / "charts" / f"{symbol}.png", "rb") as chart:
+            assert chart.read(8) == PNG_SIGNATURE
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from downloader import BarDownloader, TransportError
+
+START = pd.Timestamp("2021-01-01", tz="UTC")
+
+
+class FakeTransport:
+    # serves one daily bar per symbol and day of the requested range, `page_size` bars to a page
+    def __init__(self, page_size: int = 1000, delay: float = 0.0, failures: dict = None):
+        self.page_size = page_size
+        self.delay = delay
+        # number of times the requests of each chunk (by its first symbol) fail first, and with which status
+        self.failures = dict(failures or {})
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+        self.closed = False
+
+    async def get(self, path: str, params: dict) -> dict:
+        self.requests.append((time.monotonic(), path, dict(params)))
+        symbols = params["symbols"].split(",")
+        failure = self.failures.get(symbols[0])
+        failing = failure is not None and failure[0] > 0
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # failing requests are answered sooner
+            await asyncio.sleep(self.delay / 10 if failing else self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        if failing:
+            self.failures[symbols[0]] = (failure[0] - 1, failure[1])
+            raise TransportError(failure[1], "fake failure")
+
+        days = pd.date_range(pd.Timestamp(params["start"]).ceil("D"), pd.Timestamp(params["end"]), freq="D")
+        bars = [(symbol, day) for symbol in symbols for day in days]
+        first = int(params.get("page_token", 0))
+        page = {}
+        for symbol, day in bars[first:first + self.page_size]:
+            price = 100 + day.dayofyear + symbols.index(symbol)
+            page.setdefault(symbol, []).append({"t": day.isoformat(), "o": price, "h": price + 1, "l": price - 1,
+                                                "c": price, "v": 1000, "n": 10, "vw": price})
+        next_page = first + self.page_size
+        return {"bars": page, "next_page_token": str(next_page) if next_page < len(bars) else None}
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def test_fetch_splits_symbols_and_dates_into_chunks():
+    transport = FakeTransport(page_size=7)
+    downloader = BarDownloader(transport, symbols_per_request=2, period_per_request=pd.Timedelta(days=10), requests_per_minute=1e6)
+    symbols = ["AAA", "BBB", "CCC"]
+    df = downloader.fetch(symbols, "1Day", START, START + pd.Timedelta(days=29))
+    downloader.close()
+
+    chunks = {(params["symbols"], params["start"]) for _, _, params in transport.requests}
+    # 2 symbol chunks x 3 periods, each followed over its pages
+    assert len(chunks) == 6
+    assert {symbols for symbols, _ in chunks} == {"AAA,BBB", "CCC"}
+    assert len(transport.requests) > len(chunks)
+    assert transport.closed
+
+    assert df.index.names == ["symbol", "timestamp"]
+    assert list(df.columns) == ["open", "high", "low", "close", "volume", "trade_count", "vwap"]
+    assert len(df) == 3 * 30
+    assert df.index.is_monotonic_increasing and not df.index.duplicated().any()
+    bbb = df.loc["BBB"]
+    assert bbb.index[0] == START and bbb.index[-1] == START + pd.Timedelta(days=29)
+    assert np.array_equal(bbb["high"].to_numpy(), bbb["close"].to_numpy() + 1)
+
+
+def test_fetch_respects_concurrency_and_rate_limit():
+    transport = FakeTransport(delay=.05)
+    downloader = BarDownloader(transport, symbols_per_request=1, max_concurrency=2, requests_per_minute=1200)
+    downloader.fetch(["AAA", "BBB", "CCC", "DDD", "EEE", "FFF"], "1Day", START, START + pd.Timedelta(days=3))
+    downloader.close()
+
+    assert len(transport.requests) == 6
+    assert transport.max_in_flight == 2
+    # no more than 1200 requests a minute: they start at least 50ms apart
+    starts = np.array([started for started, _, _ in transport.requests])
+    assert np.all(np.diff(starts) >= .05 * .9)
+
+
+def test_failed_requests_are_retried_with_backoff():
+    transport = FakeTransport(failures={"AAA": (2, 503)})
+    downloader = BarDownloader(transport, requests_per_minute=1e6, retries=3, backoff=.05)
+    df = downloader.fetch(["AAA"], "1Day", START, START + pd.Timedelta(days=3))
+    downloader.close()
+
+    assert len(df) == 4
+    starts = np.array([started for started, _, _ in transport.requests])
+    assert len(starts) == 3
+    # waits 0.05s, then 0.1s
+    assert np.all(np.diff(starts) >= np.array([.05, .1]) * .9)
+
+
+@pytest.mark.parametrize("failure, requests", [((5, 503), 3), ((1, 400), 1)])
+def test_requests_failing_for_good_raise(failure, requests):
+    transport = FakeTransport(failures={"AAA": failure})
+    downloader = BarDownloader(transport, requests_per_minute=1e6, retries=2, backoff=.01)
+
+    with pytest.raises(TransportError) as error:
+        downloader.fetch(["AAA"], "1Day", START, START + pd.Timedelta(days=3))
+    downloader.close()
+    assert error.value.status == failure[1]
+    # bad requests are not retried
+    assert len(transport.requests) == requests
+
+
+def test_failed_chunk_cancels_the_others():
+    transport = FakeTransport(delay=.2, failures={"AAA": (1, 400)})
+    downloader = BarDownloader(transport, symbols_per_request=1, max_concurrency=4, requests_per_minute=1e6)
+
+    with pytest.raises(TransportError):
+        downloader.fetch(["AAA", "BBB", "CCC"], "1Day", START, START + pd.Timedelta(days=3))
+    downloader.close()
+    # the other two chunks were still waiting for their response
+    assert transport.cancelled == 2
+    assert transport.in_flight == 0
+
+
+def test_fetch_from_a_running_loop_raises():
+    downloader = BarDownloader(FakeTransport(), requests_per_minute=1e6)
+
+    async def fetch_in_loop():
+        with pytest.raises(RuntimeError):
+            downloader.fetch(["AAA"], "1Day", START, START + pd.Timedelta(days=3))
+        return await downloader.fetch_async(["AAA"], "1Day", START, START + pd.Timedelta(days=3))
+
+    assert len(asyncio.run(fetch_in_loop())) == 4
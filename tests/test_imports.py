@@ -0,0 +1,14 @@
+import os
+import pytest
+from benchmark import benchmark_imports
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("module", ["backtest_engine", "trading_engine", "live", "replay", "charts", "downloader"])
+def test_import_leaves_lazy_dependencies_out(monkeypatch, module):
+    # each module is imported in a fresh interpreter, started from the root of the repository
+    monkeypatch.chdir(ROOT)
+    imported = benchmark_imports(module, repeats=1)["imported"]
+
+    assert imported == [], f"{module} imports {imported}, which should only be imported on first use"
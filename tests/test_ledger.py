@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+from ledger import TradeLedger
+from position import TRADE_DTYPE
+
+
+def make_trades(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    trades = np.zeros(n, dtype=TRADE_DTYPE)
+    trades["entry_index"] = np.sort(rng.integers(2, 200, n))
+    trades["exit_index"] = trades["entry_index"] + rng.integers(1, 10, n)
+    trades["entry_price"] = np.round(rng.uniform(10, 20, n), 2)
+    trades["exit_price"] = np.round(rng.uniform(10, 20, n), 2)
+    trades["num_shares"] = 1
+    trades["side"] = rng.choice([-1, 1], n)
+    return trades
+
+
+def test_frame_columns_are_views_of_the_ledger():
+    ledger = TradeLedger(4)
+    ledger.append("AAA", make_trades(5, 0))
+    ledger.append("BBB", make_trades(7, 1))
+
+    df = ledger.to_frame({"AAA": pd.date_range("2020-01-01", periods=300, tz="UTC"),
+                          "BBB": pd.date_range("2020-01-01", periods=300, tz="UTC")})
+
+    assert np.shares_memory(df["buy_index"].to_numpy(), ledger.trades)
+    assert np.shares_memory(df["buy_price"].to_numpy(), ledger.trades)
+    np.testing.assert_array_equal(df["buy_index"].to_numpy(), ledger.trades["entry_index"])
+    np.testing.assert_allclose(df["profits_losses"].to_numpy(), ledger.profits_losses)
+    assert list(df["asset"]) == ["AAA"] * 5 + ["BBB"] * 7
+
+
+def test_sort_does_not_depend_on_append_order():
+    trades = {"AAA": make_trades(6, 0), "BBB": make_trades(6, 1), "CCC": make_trades(6, 2)}
+    by_asset = TradeLedger()
+    for asset in trades:
+        by_asset.append(asset, trades[asset])
+    interleaved = TradeLedger()
+    for k in range(6):
+        for asset in ("CCC", "AAA", "BBB"):
+            interleaved.append(asset, trades[asset][k:k + 1])
+
+    by_asset.sort()
+    interleaved.sort()
+    first, second = by_asset.to_frame(), interleaved.to_frame()
+
+    assert np.all(np.diff(first["buy_index"].to_numpy()) >= 0)
+    pd.testing.assert_frame_equal(first, second)
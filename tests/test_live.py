@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from broker import Broker
+from capital_manager import CapitalManager
+from live import LiveEngine, ReplayBarSource
+from portfolio import PortfolioSimulator
+from position import positions_to_trades
+from sw import SwingIndex
+from synthetic import make_bars, to_arrays
+
+SYMBOLS = ["AAA", "BBB", "CCC"]
+
+
+@pytest.mark.parametrize("order_type", ["MARKET", "STOP"])
+def test_live_fills_match_portfolio_with_the_spread(order_type):
+    bars = to_arrays(make_bars(SYMBOLS, 300, listed_every=7))
+    positions = PortfolioSimulator(CapitalManager(1e12, 1, 1), SwingIndex(SYMBOLS),
+                                   Broker(spread=True, order_type=order_type)).run(bars)
+    engine = LiveEngine(CapitalManager(1e12, 1, 1), SwingIndex(SYMBOLS), Broker(spread=True, order_type=order_type))
+    closed = engine.run(ReplayBarSource(bars))
+    without_spread = LiveEngine(CapitalManager(1e12, 1, 1), SwingIndex(SYMBOLS), Broker(order_type=order_type))
+    unspread = without_spread.run(ReplayBarSource(bars))
+
+    for symbol in SYMBOLS:
+        expected = positions_to_trades([position for position in positions if position.asset == symbol])
+        trades = positions_to_trades([position for position in closed if position.asset == symbol])
+        # the live engine also acts on the last bar, which the simulator never reaches as the current day
+        assert len(expected) > 0 and len(expected) <= len(trades) <= len(expected) + 1, symbol
+        for name in expected.dtype.names:
+            assert np.allclose(trades[name][:len(expected)], expected[name]), (symbol, name)
+
+        # the spread was charged
+        spread = engine.stream(symbol).bar(engine.stream(symbol).n_bars - 1)["spread"]
+        assert spread > 0
+        prices = positions_to_trades([position for position in unspread if position.asset == symbol])["entry_price"]
+        assert not np.allclose(trades["entry_price"], prices), symbol
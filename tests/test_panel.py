@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sw import SwingIndex
+from panel import Panel
+from position import generate_signals
+from synthetic import make_bars
+
+
+@pytest.mark.parametrize("parameters", [{}, {"c1": .3, "c7": 30, "adxr_sell_threshold": 25, "adxr_buy_threshold": 15}])
+def test_panel_trades_match_per_symbol(parameters):
+    symbols = ["AAA", "BBB", "CCC"]
+    bars = make_bars(symbols, 300, listed_every=5)
+    swing_index = SwingIndex(symbols, **parameters)
+
+    trades = Panel(bars, symbols).trades(**swing_index.parameters)
+    for symbol in symbols:
+        expected = generate_signals(swing_index.initialize_swing_df_demo(bars.loc[symbol]))
+        assert np.array_equal(trades[symbol], expected), symbol
+    assert sum(len(symbol_trades) for symbol_trades in trades.values()) > 0
@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+from broker import Broker
+from position import SIDES, SIGNAL_COLUMNS, TRADE_DTYPE, SwingIndexPosition, generate_signals, positions_to_trades
+from sw import SwingIndex
+from settings import LONG, SHORT, INITIAL
+from synthetic import make_bars, SYMBOLS, START, END
+
+PARAMETERS = {"c1": .3, "c2": .4, "c3": .6, "c4": .2, "c5": .35, "c6": 2, "c7": 30, "adxr_sell_threshold": 25, "adxr_buy_threshold": 15}
+
+
+def bar_by_bar(df, order_type: str) -> np.ndarray:
+    # asks a position for its signal on every bar, as the bar by bar backtest does
+    columns = {column: df[column].to_numpy() for column in SIGNAL_COLUMNS}
+    valid = ~df.isnull().any(axis=1).to_numpy()
+    high, low = columns["high"], columns["low"]
+    position = SwingIndexPosition(0, 0, None, 0, INITIAL)
+    trades = []
+    for i in range(2, len(valid)):
+        if not valid[i - 1]:
+            continue
+        signal, ask_price = position.signal_at(columns, i)
+        if signal == 1 and position.state != LONG:
+            sell_index = i - 1
+        elif signal == -1 and position.state != SHORT:
+            sell_index = i
+        else:
+            continue
+        if order_type == "LIMIT" and not high[i - 1] >= ask_price:
+            continue
+        if order_type == "STOP" and not (high[i - 1] >= ask_price if signal == 1 else low[i - 1] <= ask_price):
+            continue
+        position.sell(ask_price, sell_index)
+        trades.append(position)
+        position = SwingIndexPosition(1, ask_price, None, sell_index, LONG if signal == 1 else SHORT)
+    return positions_to_trades(trades)
+
+
+@pytest.mark.parametrize("order_type", ["LIMIT", "MARKET", "STOP"])
+@pytest.mark.parametrize("parameters", [{}, PARAMETERS])
+def test_generate_signals_matches_the_positions_bar_by_bar(order_type, parameters):
+    bars = make_bars(["AAA", "BBB", "CCC", "DDD"], 600, seed=2, listed_every=40)
+    n_trades = 0
+    for symbol in ["AAA", "BBB", "CCC", "DDD"]:
+        df = SwingIndex([symbol], **parameters).initialize_swing_df_demo(bars.loc[symbol])
+        expected = bar_by_bar(df, order_type)
+        trades = generate_signals(df, {"order_type": order_type})
+        assert trades.dtype == expected.dtype
+        assert np.array_equal(trades, expected), symbol
+        n_trades += len(trades)
+    assert n_trades > 20
+
+
+@pytest.mark.parametrize("order_type", ["LIMIT", "MARKET", "STOP"])
+def test_fast_backtest_passes_its_check(backtest, order_type):
+    # raises if the fast and bar by bar engines disagree on any asset
+    fast = backtest.backtest(SYMBOLS, 1e12, START, END, fast=True, check=True, seed=0, broker=Broker(order_type=order_type))
+    serial = backtest.backtest(SYMBOLS, 1e12, START, END, seed=0, broker=Broker(order_type=order_type))
+
+    assert len(fast) > 0
+    assert fast.equals(serial)
+
+
+def recomputed_signal(df, state: str, start_index: int) -> tuple:
+    # the signal of a position, from the swing variables recalculated over the whole dataframe and scanned in full
+    # on every bar: row n - 1 is the current day, and the rows before it are looked at
+    n = len(df)
+    if n - start_index <= 2:
+        return 0, 0
+    high, low, close, asi, hsp, lsp, hip, lop = (df[column].to_numpy() for column in ("high", "low", "close", "asi", "hsp", "lsp", "hip", "lop"))
+    buy, sell = df["adxr_buy_threshold"].to_numpy(), df["adxr_sell_threshold"].to_numpy()
+    m = n - 1
+
+    if state == INITIAL:
+        # the crossing is looked for on the last of the rows before the current day
+        if not buy[m - 1]:
+            return 0, 0
+        if not np.isnan(hsp[:m]).all():
+            k = np.nanargmax(hsp[:m])
+            if (asi[m - 1] > hsp[k] or asi[m - 1] > hsp[m - 1]) and high[m] >= hip[k]:
+                return 1, hip[k]
+        if not np.isnan(lsp[:m]).all():
+            k = np.nanargmax(lsp[:m])
+            if (asi[m - 1] < lsp[k] or asi[m - 1] < lsp[m - 1]) and low[m] <= lop[k]:
+                return -1, lop[k]
+        return 0, 0
+
+    # long: the extreme is the highest HSP of the trade, short: the highest LSP
+    swing, opposite, sar_prices, prices = (hsp, lsp, lop, low) if state == LONG else (lsp, hsp, hip, high)
+    trailing_sar = None
+    if not np.isnan(swing[start_index:m]).all():
+        k = start_index + np.nanargmax(swing[start_index:m])
+        for i in range(k, m):
+            if opposite[i] != opposite[i - 1]:
+                break
+            if (swing[k] - asi[i] if state == LONG else asi[i] - swing[k]) > 60:
+                trailing_sar = prices[i]
+                break
+    # the most recent change of the swing point of the trade followed by a change of the opposite one
+    sar = sar_prices[m - 1]
+    for i in range(m - 1, start_index, -1):
+        changes = [j for j in range(i, m) if opposite[j] != opposite[j - 1]] if swing[i] != swing[i - 1] else []
+        if changes:
+            j = changes[0]
+            if sar_prices[j] != sar_prices[j - 1]:
+                sar = sar_prices[j]
+            elif j + 1 < m and sar_prices[j + 1] != sar_prices[j]:
+                sar = sar_prices[j + 1]
+            else:
+                sar = prices[j]
+            break
+
+    if sell[m]:
+        return -1, close[m]
+    if not buy[m]:
+        return 0, 0
+    direction = 1 if state == SHORT else -1
+    for stop in (trailing_sar, sar):
+        if stop is not None and (high[m] >= stop if state == SHORT else low[m] <= stop):
+            return direction, stop
+    return 0, 0
+
+
+def recomputed_trades(bars, swing_index) -> np.ndarray:
+    # trades of limit orders, recalculating the swing variables over the history up to every bar
+    trades = []
+    state, start_index, entry_price, shares = INITIAL, 0, 0., 0
+    for i in range(2, len(bars)):
+        df = swing_index.initialize_swing_df_demo(bars.iloc[0:i])
+        if df.iloc[-1].isnull().any():
+            continue
+        signal, ask_price = recomputed_signal(df, state, start_index)
+        if signal == 1 and state != LONG:
+            sell_index = i - 1
+        elif signal == -1 and state != SHORT:
+            sell_index = i
+        else:
+            continue
+        if not df["high"].iloc[-1] >= ask_price:
+            continue
+        trades.append((start_index, sell_index, SIDES[state], entry_price, entry_price if state == INITIAL else ask_price, shares))
+        state, start_index, entry_price, shares = LONG if signal == 1 else SHORT, sell_index, ask_price, 1
+    return np.array(trades, dtype=TRADE_DTYPE)
+
+
+@pytest.mark.parametrize("parameters", [{}, PARAMETERS])
+def test_incremental_backtest_matches_full_recompute(backtest, parameters):
+    bars = make_bars(["AAA", "BBB"], 260, seed=6)
+    n_trades = 0
+    for symbol in ["AAA", "BBB"]:
+        swing_index = SwingIndex([symbol], **parameters)
+        expected = recomputed_trades(bars.loc[symbol], swing_index)
+        # streamed swing variables, with the SAR looked up in the index of swing events
+        orders, _ = backtest.backtest_asset(symbol, bars.loc[symbol], swing_index, Broker())
+        assert np.array_equal(positions_to_trades(orders), expected), symbol
+        # and in a single pass
+        orders, _ = backtest.backtest_asset(symbol, bars.loc[symbol], swing_index, Broker(), fast=True)
+        assert np.array_equal(positions_to_trades(orders), expected), symbol
+        n_trades += len(expected)
+    assert n_trades > 10
@@ -0,0 +1,46 @@
+import numpy as np
+from capital_manager import CapitalManager
+from portfolio import PortfolioSimulator
+from position import positions_to_trades
+from replay import Replay
+from sw import SwingIndex
+from synthetic import make_bars, to_arrays
+
+SYMBOLS = ["AAA", "BBB", "CCC", "DDD"]
+
+
+def replay(bars: dict):
+    return Replay(bars).run(CapitalManager(1e12, .6, .15), SwingIndex(list(bars)))
+
+
+def test_replay_has_no_regressions_against_itself():
+    bars = to_arrays(make_bars(SYMBOLS, 300, listed_every=7))
+    baseline = replay(bars).summary()
+    result = replay(bars)
+
+    assert baseline["decisions"] > 0 and baseline["trades"] > 0
+    assert result.summary()["digest"] == baseline["digest"]
+    # timings vary from run to run, so only the decisions are held to the baseline here
+    assert result.regressions(baseline, tolerance=1e9) == []
+
+
+def test_replay_reports_changed_decisions():
+    baseline = replay(to_arrays(make_bars(SYMBOLS, 300, seed=0))).summary()
+    result = replay(to_arrays(make_bars(SYMBOLS, 300, seed=1)))
+
+    regressions = result.regressions(baseline, tolerance=1e9)
+    assert len(regressions) == 1 and regressions[0].startswith("decisions changed")
+
+
+def test_replay_trades_match_portfolio_simulator():
+    bars = to_arrays(make_bars(SYMBOLS, 300, listed_every=7))
+    result = replay(bars)
+    positions = PortfolioSimulator(CapitalManager(1e12, .6, .15), SwingIndex(SYMBOLS)).run(bars)
+
+    for symbol in SYMBOLS:
+        expected = positions_to_trades([position for position in positions if position.asset == symbol])
+        trades = result.ledger.trades_of(symbol)
+        # the live engine also acts on the last bar, which the simulator never reaches as the current day
+        assert len(expected) <= len(trades) <= len(expected) + 1, symbol
+        for name in expected.dtype.names:
+            assert np.array_equal(trades[name][:len(expected)], expected[name]), (symbol, name)
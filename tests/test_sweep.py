@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from sweep import ParameterSweep
+from synthetic import make_bars, SYMBOLS, START, END
+
+PARAMETERS = {"c1": .3, "c2": .4, "c3": .6, "c4": .2, "c5": .35, "c6": 2, "c7": 30, "a1": 25, "a2": 15}
+
+
+@pytest.mark.parametrize("parameters", [{}, PARAMETERS])
+@pytest.mark.parametrize("fast", [False, True])
+def test_sweep_scores_parameters_as_the_backtest(backtest, parameters, fast):
+    df = backtest.backtest(SYMBOLS, 1e12, START, END, **parameters, fast=fast, seed=0)
+    sweep = backtest.parameter_sweep(sorted(set(df["asset"])), START, END, "1Day")
+
+    assert len(df) > 0
+    assert sweep.evaluate(**parameters) == pytest.approx(df["profits_losses"].sum())
+    for symbol, trades in sweep.trades(**parameters).items():
+        assert np.array_equal(np.sort(trades["entry_index"]), np.sort(df[df["asset"] == symbol]["buy_index"].to_numpy())), symbol
+
+
+def test_backtest_uses_its_parameters(backtest):
+    default = backtest.backtest(SYMBOLS, 1e12, START, END, fast=True, seed=0)
+    tuned = backtest.backtest(SYMBOLS, 1e12, START, END, **PARAMETERS, fast=True, seed=0)
+
+    assert not (len(default) == len(tuned) and np.array_equal(default["buy_index"], tuned["buy_index"]))
+
+
+def test_evaluate_batch_matches_evaluate():
+    bars = make_bars(SYMBOLS, 300, listed_every=10)
+    rng = np.random.default_rng(0)
+    parameters = np.column_stack([rng.uniform(.1, .9, (6, 5)), rng.integers(1, 5, 6), rng.integers(20, 80, 6),
+                                  rng.integers(10, 30, (6, 2))])
+    # the same constants with other thresholds, and a parameter set given twice
+    parameters = np.vstack([parameters, parameters[0] * [1, 1, 1, 1, 1, 1, 1, 0, 1] + [0, 0, 0, 0, 0, 0, 0, 22, 0], parameters[2]])
+
+    batch = ParameterSweep(bars).evaluate_batch(parameters)
+    one_by_one = ParameterSweep(bars)
+    expected = np.array([one_by_one.evaluate(*row) for row in parameters.tolist()])
+
+    assert np.allclose(batch, expected)
+    assert batch[-1] == batch[2]
+    assert len(set(np.round(expected, 6))) > 1
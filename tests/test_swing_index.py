@@ -0,0 +1,95 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from sw import SwingIndex, StreamingADXR, SWING_COLUMNS, calculate_adxr, calculate_asi, calculate_asi_batch
+
+
+def make_bars(n: int, seed: int = 0, flat_every: int = None) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    open = close + rng.normal(0, .3, n)
+    high = np.maximum(open, close) + rng.uniform(0, 1, n)
+    low = np.minimum(open, close) - rng.uniform(0, 1, n)
+    if flat_every is not None:
+        # runs of bars that do not move at all, as often happens with minute bars
+        for k in range(flat_every, n, flat_every):
+            open[k:k + 3] = high[k:k + 3] = low[k:k + 3] = close[k:k + 3] = close[k - 1]
+    return pd.DataFrame({"open": open, "high": high, "low": low, "close": close, "volume": 1000.})
+
+
+def stream(swing_index: SwingIndex, df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame([swing_index.update({column: float(value) for column, value in bar.items()})
+                         for bar in df.to_dict("records")])
+
+
+@pytest.mark.parametrize("flat_every", [None, 20])
+def test_streaming_matches_batch(flat_every):
+    df = make_bars(400, flat_every=flat_every)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        streamed = stream(SwingIndex(["A"]), df)
+    batch = SwingIndex(["A"]).initialize_swing_df_demo(df)
+
+    for column in SWING_COLUMNS:
+        expected = batch[column].to_numpy()
+        if column.startswith("adxr"):
+            assert np.array_equal(streamed[column].to_numpy(), expected), column
+        else:
+            assert np.allclose(streamed[column].to_numpy(dtype=np.float64), expected, equal_nan=True), column
+
+
+
+@pytest.mark.parametrize("parameters", [{}, {"c1": .3, "c2": .4, "c3": .6, "c4": .2, "c5": .35, "c6": 2, "c7": 30,
+                                             "adxr_sell_threshold": 25, "adxr_buy_threshold": 15}])
+@pytest.mark.parametrize("flat_every", [None, 20])
+def test_streaming_matches_calculate_arrays(parameters, flat_every):
+    df = make_bars(1000, seed=3, flat_every=flat_every)
+    swing_index = SwingIndex(["A"], **parameters)
+    streamed = stream(swing_index, df)
+    arrays = SwingIndex(["A"], **parameters).calculate_arrays({column: df[column].to_numpy() for column in df.columns})
+
+    assert list(arrays) == list(streamed.columns)
+    for column, expected in arrays.items():
+        if column.startswith("adxr"):
+            assert np.array_equal(streamed[column].to_numpy(), expected), column
+        else:
+            assert np.allclose(streamed[column].to_numpy(dtype=np.float64), expected, equal_nan=True), column
+    # the thresholds are crossed both ways over the history
+    assert 0 < arrays["adxr_buy_threshold"].sum() < len(df) and 0 < arrays["adxr_sell_threshold"].sum() < len(df)
+
+    # once reset, the same bars stream to the same columns
+    swing_index.reset()
+    assert stream(swing_index, df).equals(streamed)
+
+@pytest.mark.parametrize("period", [5, 14])
+@pytest.mark.parametrize("flat_every", [None, 20])
+def test_streaming_adxr_matches_batch(period, flat_every):
+    df = make_bars(300, seed=1, flat_every=flat_every)
+    # leading bars without prices are skipped by both
+    df.iloc[:3] = np.nan
+    high, low, close = (df[column].to_numpy() for column in ("high", "low", "close"))
+
+    adxr = StreamingADXR(period)
+    streamed = np.array([adxr.update(h, l, c) for h, l, c in zip(high, low, close)])
+
+    expected = calculate_adxr(high, low, close, period)
+    assert np.isnan(streamed).sum() == np.isnan(expected).sum() < len(df)
+    assert np.allclose(streamed, expected, equal_nan=True)
+
+
+def test_batch_asi_matches_each_parameter_set():
+    rng = np.random.default_rng(2)
+    # bars x symbols, flat bars included
+    frames = [make_bars(200, seed=seed, flat_every=25) for seed in range(3)]
+    high, low, close, open = (np.column_stack([df[column] for df in frames]) for column in ("high", "low", "close", "open"))
+    parameters = np.column_stack([rng.uniform(.1, .9, (5, 5)), rng.integers(1, 5, 5), rng.integers(20, 80, 5)])
+
+    batch = calculate_asi_batch(high, low, close, open, parameters)
+    assert batch.shape == (200, 3, 5)
+    for p, row in enumerate(parameters):
+        expected = calculate_asi(high, low, close, open, *row)
+        assert np.allclose(batch[..., p], expected, equal_nan=True), p
+        # and symbol by symbol
+        assert np.allclose(calculate_asi_batch(high[:, 1], low[:, 1], close[:, 1], open[:, 1], parameters)[:, p],
+                           expected[:, 1], equal_nan=True), p
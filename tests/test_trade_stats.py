@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+from position import TRADE_DTYPE
+from trade_stats import RunningStatistics, TradeStatistics, trade_statistics
+
+
+def random_trades(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    trades = np.zeros(n, dtype=TRADE_DTYPE)
+    trades["entry_index"] = np.sort(rng.integers(0, 1000, n))
+    trades["exit_index"] = trades["entry_index"] + rng.integers(1, 50, n)
+    trades["side"] = rng.choice([1, -1], n)
+    trades["entry_price"] = rng.uniform(10, 100, n)
+    trades["exit_price"] = trades["entry_price"] * rng.normal(1, .05, n)
+    trades["num_shares"] = rng.integers(1, 10, n)
+    # the initial position, which only counts towards all trades
+    trades[0] = (0, trades["entry_index"][1], 0, 0, 0, 0)
+    return trades
+
+
+def expected_statistics(trades: np.ndarray) -> dict:
+    # the same statistics from pandas
+    df = pd.DataFrame({"Profit/Losses": trades["num_shares"] * (trades["entry_price"] - trades["exit_price"]),
+                       "Time per Trade": trades["exit_index"] - trades["entry_index"], "side": trades["side"]})
+    by_side = df.groupby("side").agg(["mean", "std", "min", "max", "count"])
+    overall = df.drop(columns="side").agg(["mean", "std", "min", "max", "count"])
+    expected = {}
+    for name in ("Profit/Losses", "Time per Trade"):
+        for label, aggregates in ((" Long", by_side.loc[1, name]), (" Short", by_side.loc[-1, name]), ("", overall[name])):
+            for aggregate, function in (("Mean", "mean"), ("Standard Deviation", "std"), ("Minimum", "min"), ("Maximum", "max")):
+                expected[f"{name}{label} {aggregate}"] = aggregates[function]
+    return expected
+
+
+def test_trade_statistics_match_pandas():
+    trades = random_trades(500)
+    statistics = trade_statistics(trades["num_shares"] * (trades["entry_price"] - trades["exit_price"]),
+                                  trades["exit_index"] - trades["entry_index"], trades["side"])
+
+    expected = expected_statistics(trades)
+    assert statistics.keys() == expected.keys()
+    for name, value in expected.items():
+        assert statistics[name] == pytest.approx(value), name
+
+
+def test_trade_statistics_of_an_empty_side_are_nan():
+    trades = random_trades(50)
+    trades["side"][1:] = 1
+    statistics = trade_statistics(trades["num_shares"] * (trades["entry_price"] - trades["exit_price"]),
+                                  trades["exit_index"] - trades["entry_index"], trades["side"])
+
+    assert np.isnan(statistics["Profit/Losses Short Mean"]) and np.isnan(statistics["Time per Trade Short Maximum"])
+    assert not np.isnan(statistics["Profit/Losses Long Standard Deviation"])
+
+
+def test_trade_statistics_streamed_in_batches_match_pandas():
+    trades = random_trades(500)
+    # batches of every size, including single trades (Welford's update) and empty ones
+    bounds = [0, 1, 2, 2, 40, 41, 300, 500]
+    first, second = TradeStatistics(), TradeStatistics()
+    for k, (begin, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        (first if k % 2 else second).update(trades[begin:end])
+    first.merge(second)
+
+    one_pass = TradeStatistics()
+    one_pass.update(trades)
+    assert first.count == one_pass.count == 500
+    assert first.total == pytest.approx(one_pass.total)
+    expected = expected_statistics(trades)
+    for statistics in (first.to_dict(), one_pass.to_dict()):
+        for name, value in expected.items():
+            assert statistics[name] == pytest.approx(value), name
+
+
+def test_running_statistics_merged_from_batches_match_one_pass():
+    values = np.random.default_rng(1).normal(1e6, 3, 1000)
+    one_by_one = RunningStatistics()
+    for value in values:
+        one_by_one.update(value)
+    batches = RunningStatistics()
+    for batch in np.array_split(values, [1, 10, 11, 500]):
+        batches.update(batch)
+    merged = RunningStatistics()
+    for batch in np.array_split(values, 7):
+        part = RunningStatistics()
+        part.update(batch)
+        merged.merge(part)
+    merged.merge(RunningStatistics())
+
+    for statistics in (one_by_one, batches, merged):
+        assert statistics.count == 1000
+        assert statistics.sum == pytest.approx(values.sum())
+        assert statistics.mean == pytest.approx(values.mean(), rel=1e-12)
+        assert statistics.std == pytest.approx(values.std(ddof=1), rel=1e-9)
+        assert statistics.minimum == values.min() and statistics.maximum == values.max()
+    assert np.isnan(RunningStatistics().mean) and np.isnan(RunningStatistics().std)
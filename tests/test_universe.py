@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bar_store import BarStore, FrameBarSource
+from universe import Universe
+from backtest_engine import Backtest
+from synthetic import make_bars
+
+SYMBOLS = ["AAA", "BBB", "CCC"]
+
+
+@pytest.fixture
+def securities_file(tmp_path):
+    path = tmp_path / "securities.csv"
+    pd.DataFrame({"Ticker": SYMBOLS, "Name": SYMBOLS, "Exchange": "NYSE"}).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def bar_store(tmp_path):
+    return BarStore(str(tmp_path / "bars"), FrameBarSource(make_bars(SYMBOLS, 300)), np.float64)
+
+
+def test_universe_built_from_an_empty_store_has_nothing_to_sample(securities_file, bar_store):
+    universe = Universe.build(securities_file, bar_store=bar_store, timeframe="1Day")
+
+    assert universe.sample(10, "2020-01-01", "2020-12-31") == []
+
+
+def test_universe_built_over_a_range_fetches_the_availability(securities_file, bar_store):
+    universe = Universe.build(securities_file, bar_store=bar_store, timeframe="1Day", start_date="2020-01-01", end_date="2020-12-31")
+
+    assert sorted(universe.sample(10, "2020-01-01", "2020-12-31", seed=0)) == SYMBOLS
+    assert universe.availability("AAA")[2] == 262
+
+
+def test_sampling_refreshes_the_universe(securities_file, bar_store):
+    universe = Universe.build(securities_file, bar_store=bar_store, timeframe="1Day", start_date="2020-01-01", end_date="2020-06-30")
+    backtest = Backtest(bar_store, universe)
+
+    assert universe.availability("AAA")[2] == 130
+    # the second half of the year is downloaded when it is sampled
+    backtest.sample_data(pd.Timestamp("2020-01-01", tz="UTC"), pd.Timestamp("2020-12-31", tz="UTC"), "1Day")
+
+    assert universe.availability("AAA")[2] == 262
+
+
+def test_backtest_without_any_asset_raises(securities_file, bar_store):
+    backtest = Backtest(bar_store, Universe.build(securities_file, bar_store=bar_store, timeframe="1Day"))
+
+    with pytest.raises(ValueError, match="No assets"):
+        backtest.backtest(SYMBOLS, 1000, "2020-01-01", "2020-12-31", timeframe="1Day")
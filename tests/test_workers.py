@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from multiprocessing import shared_memory
+from shared_bars import SharedBars
+from synthetic import make_bars, SYMBOLS, START, END
+
+
+@pytest.mark.parametrize("engine", [
+    {},
+    {"fast": True},
+    {"shared": True},
+    {"memmap": True},
+])
+def test_workers_give_the_trades_of_the_serial_run(backtest, engine):
+    serial = backtest.backtest(SYMBOLS, 1e12, START, END, fast=engine.get("fast", False), seed=0)
+    parallel = backtest.backtest(SYMBOLS, 1e12, START, END, **engine, workers=2, seed=0)
+
+    assert len(serial) > 0
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_shared_bars_are_unlinked_once_closed():
+    bars = make_bars(SYMBOLS, 50)
+    shared_bars = SharedBars.create(bars, SYMBOLS)
+    names = [name for name, _ in shared_bars.handle["blocks"].values()]
+
+    # a worker detaching leaves the blocks to their owner
+    attached = SharedBars.attach(shared_bars.handle)
+    assert np.array_equal(attached.arrays("BBB")["close"], bars.loc["BBB"]["close"].to_numpy())
+    attached.close()
+    assert np.array_equal(shared_bars.arrays("CCC")["high"], bars.loc["CCC"]["high"].to_numpy())
+
+    shared_bars.close()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,189 @@
+import numpy as np
+
+# sides of the trades (see `position.SIDES`) the statistics are broken down by, and the label of each breakdown
+GROUPS = ((1, " Long"), (-1, " Short"), (None, ""))
+AGGREGATES = ("Mean", "Standard Deviation", "Minimum", "Maximum")
+
+
+def trade_statistics(profits_losses: np.ndarray, time_held: np.ndarray, sides: np.ndarray) -> dict:
+    '''
+    Mean, standard deviation (as pandas gives it, with one degree of freedom), minimum and maximum of the
+    profits/losses and holding time of long trades, short trades and all trades.
+
+    Every trade is counted in its side's group and in the overall group, and the aggregates of all the groups are
+    calculated together with `np.bincount` and `ufunc.at`, in one pass over the trades for each of them.
+
+    Parameters:
+        - profits_losses, time_held : one value per trade (see `TradeLedger.profits_losses`, `TradeLedger.time_held`)
+        - sides                     : side of each trade: 1 for LONG, -1 for SHORT and 0 for INITIAL
+    Returns:
+        - dict mapping the name of each statistic (e.g. 'Profit/Losses Long Mean') to its value, NaN for empty groups
+    '''
+    sides = np.asarray(sides)
+    n_trades = sides.shape[0]
+    # group 0 is long, 1 is short, 2 is overall; INITIAL trades only count towards the overall group
+    groups = np.concatenate([np.where(sides == 1, 0, np.where(sides == -1, 1, 3)), np.full(n_trades, 2)])
+    counted = groups < 3
+    groups = groups[counted]
+
+    statistics = {}
+    for name, values in (("Profit/Losses", profits_losses), ("Time per Trade", time_held)):
+        values = np.concatenate([values, values]).astype(np.float64)[counted]
+        count, mean, std, minimum, maximum = _grouped_aggregates(values, groups, len(GROUPS))
+        for group, (_, label) in enumerate(GROUPS):
+            for aggregate, value in zip(AGGREGATES, (mean[group], std[group], minimum[group], maximum[group])):
+                statistics[f"{name}{label} {aggregate}"] = value
+    return statistics
+
+
+def _grouped_aggregates(values: np.ndarray, groups: np.ndarray, n_groups: int) -> tuple:
+    count = np.bincount(groups, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(groups, values, minlength=n_groups) / count
+        # two passes, which is more accurate than the sum of squares
+        squares = np.bincount(groups, (values - mean[groups]) ** 2, minlength=n_groups)
+        std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+    minimum = np.full(n_groups, np.inf)
+    maximum = np.full(n_groups, -np.inf)
+    np.minimum.at(minimum, groups, values)
+    np.maximum.at(maximum, groups, values)
+    empty = count == 0
+    minimum[empty] = maximum[empty] = np.nan
+    return count, mean, std, minimum, maximum
+
+
+class RunningStatistics:
+
+    '''
+    Count, mean, variance, minimum and maximum of a stream of values, in O(1) memory. The mean and variance are
+    updated with Welford's algorithm; batches of values are merged in with Chan et al.'s parallel formula, so
+    `update()` can take a whole array of trades at once, and accumulators of separate runs can be `merge()`d.
+    '''
+    def __init__(self):
+        self.__count = 0
+        self.__sum = 0.0
+        self.__mean = 0.0
+        self.__m2 = 0.0
+        self.__minimum = np.inf
+        self.__maximum = -np.inf
+
+    def update(self, values) -> None:
+        '''
+        Adds a value, or an array of values, to the stream.
+        '''
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.shape[0] == 1:
+            # Welford's update
+            value = float(values[0])
+            self.__count += 1
+            self.__sum += value
+            delta = value - self.__mean
+            self.__mean += delta / self.__count
+            self.__m2 += delta * (value - self.__mean)
+            self.__minimum = min(self.__minimum, value)
+            self.__maximum = max(self.__maximum, value)
+        elif values.shape[0] > 1:
+            mean = values.mean()
+            self.__combine(values.shape[0], values.sum(), mean, float(np.sum((values - mean) ** 2)), values.min(), values.max())
+
+    def merge(self, other: "RunningStatistics") -> None:
+        '''
+        Adds every value seen by `other` to this stream.
+        '''
+        if other.count:
+            self.__combine(other.count, other.sum, other.mean, other.m2, other.minimum, other.maximum)
+
+    def __combine(self, count: int, values_sum: float, mean: float, m2: float, minimum: float, maximum: float) -> None:
+        self.__sum += float(values_sum)
+        total = self.__count + count
+        delta = mean - self.__mean
+        self.__mean += delta * count / total
+        self.__m2 += m2 + delta ** 2 * self.__count * count / total
+        self.__count = total
+        self.__minimum = min(self.__minimum, float(minimum))
+        self.__maximum = max(self.__maximum, float(maximum))
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    @property
+    def mean(self) -> float:
+        return self.__mean if self.__count else np.nan
+
+    @property
+    def m2(self) -> float:
+        # sum of the squared differences from the mean
+        return self.__m2
+
+    @property
+    def std(self) -> float:
+        # with one degree of freedom, as pandas
+        return np.sqrt(self.__m2 / (self.__count - 1)) if self.__count > 1 else np.nan
+
+    @property
+    def minimum(self) -> float:
+        return self.__minimum if self.__count else np.nan
+
+    @property
+    def maximum(self) -> float:
+        return self.__maximum if self.__count else np.nan
+
+
+class TradeStatistics:
+
+    '''
+    Streaming version of `trade_statistics()`: trades are added as they are generated (e.g. asset by asset in a
+    parameter sweep) and only the running aggregates are kept, never the trades themselves.
+    '''
+    def __init__(self):
+        self.__statistics = {(name, side): RunningStatistics() for name in ("Profit/Losses", "Time per Trade") for side, _ in GROUPS}
+
+    def update(self, trades: np.ndarray) -> None:
+        '''
+        Adds closed trades, a structured array of TRADE_DTYPE (see `position.generate_signals()`) or LEDGER_DTYPE.
+        '''
+        values = {
+            "Profit/Losses": trades["num_shares"] * (trades["entry_price"] - trades["exit_price"]),
+            "Time per Trade": trades["exit_index"] - trades["entry_index"],
+        }
+        for (name, side), statistics in self.__statistics.items():
+            statistics.update(values[name] if side is None else values[name][trades["side"] == side])
+
+    def merge(self, other: "TradeStatistics") -> None:
+        for key, statistics in self.__statistics.items():
+            statistics.merge(other.statistics(*key))
+
+    def statistics(self, name: str, side: int = None) -> RunningStatistics:
+        '''
+        Returns:
+            - running statistics of `name` ('Profit/Losses' or 'Time per Trade') for the trades of `side` (1 for
+              LONG, -1 for SHORT, None for all trades)
+        '''
+        return self.__statistics[(name, side)]
+
+    @property
+    def count(self) -> int:
+        # number of trades added
+        return self.__statistics[("Profit/Losses", None)].count
+
+    @property
+    def total(self) -> float:
+        # total profits/losses
+        return self.__statistics[("Profit/Losses", None)].sum
+
+    def to_dict(self) -> dict:
+        '''
+        Returns:
+            - the statistics under the same names as `trade_statistics()`
+        '''
+        summary = {}
+        for (name, side), statistics in self.__statistics.items():
+            label = dict(GROUPS)[side]
+            for aggregate, value in zip(AGGREGATES, (statistics.mean, statistics.std, statistics.minimum, statistics.maximum)):
+                summary[f"{name}{label} {aggregate}"] = value
+        return summary
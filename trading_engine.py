@@ -1,20 +1,28 @@
 import numpy as np
 import pandas as pd
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
 import datetime
 from sw import SwingIndex
 from datetime import timedelta
 from broker import Broker
 from capital_manager import CapitalManager
 from position import SwingIndexPosition
-import mplfinance as mpf
-import yfinance as yf
-from settings import LONG, SHORT, INITIAL, api, tz
+from settings import LONG, SHORT, INITIAL, KEY_ID, SECRET_KEY, tz
+from downloader import BarDownloader, AiohttpTransport
+from bar_store import default_timeframe
+from live import LiveEngine, AlpacaBarStream
 
+# downloader used for fetching historical data, created on first use rather than on every call
+_downloader = None
 
-def get_data_bars(symbols: list, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=TimeFrame.Day):
+
+def get_downloader() -> BarDownloader:
+    global _downloader
+    if _downloader is None:
+        _downloader = BarDownloader(AiohttpTransport(KEY_ID, SECRET_KEY))
+    return _downloader
+
+
+def get_data_bars(symbols: list, start_date: pd.Timestamp, end_date: pd.Timestamp, timeframe=None):
 
     '''
     This method will get data for symbols starting on start_date. The timeframe is by default 1 day
@@ -30,23 +38,12 @@ def get_data_bars(symbols: list, start_date: pd.Timestamp, end_date: pd.Timestam
     '''
 
 
-    # Instantiate client used for fetching historical data
-    client = StockHistoricalDataClient("PKO3PXBNSZ2T56DJ43LX","xNiiXnClkbfWHgzoox1vpOjqcNyS7Y5jOI0djt2D")
-
     # Convert start_date to datetime object
     #start_time = pd.to_datetime(start_date).tz_localize('America/New_York')
     #end_time   = pd.to_datetime(end_date).tz_localize('America/New_York')
 
-    # Define parameters to send to the server
-
-    request_params = StockBarsRequest(
-                    symbol_or_symbols=symbols,
-                    timeframe=timeframe,
-                    start=start_date,
-                    end=end_date
-    )
-    # Send request to the server, convert to dataframe
-    bars = client.get_stock_bars(request_params).df
+    # Send the requests to the server in chunks, convert to dataframe
+    bars = get_downloader().fetch(symbols, default_timeframe(timeframe), start_date, end_date)
 
     '''
     data = yf.download(symbols, start=start_date.strftime('%Y-%m-%d'), end=end_date.strftime('%Y-%m-%d'))
@@ -88,19 +85,12 @@ def get_test_data():
 
 def get_data_bars_1m(symbols: list):
 
-    today = datetime.today()
+    today = pd.Timestamp.now(tz=tz).normalize()
 
-    # Instantiate client used for fetching historical data
-    client = StockHistoricalDataClient("PKO3PXBNSZ2T56DJ43LX","xNiiXnClkbfWHgzoox1vpOjqcNyS7Y5jOI0djt2D")
+    from alpaca.data.timeframe import TimeFrame
 
-    # Define parameters to send to the server
-    request_params = StockBarsRequest(
-                    symbol_or_symbols=symbols,
-                    timeframe=TimeFrame.Minute,
-                    start=today
-    )
-    # Send request to the server, convert to dataframe
-    bars = client.get_stock_bars(request_params).df
+    # Send the requests to the server, convert to dataframe
+    bars = get_downloader().fetch(symbols, TimeFrame.Minute, today, pd.Timestamp.now(tz="UTC"))
     return bars
 
 
@@ -123,60 +113,29 @@ def time_to_open(current_time: datetime):
     seconds = (next_day - current_time).total_seconds()
     return seconds
 
-'''
-def trade(stocklist, df):
+def trade(stocklist: list, total_capital: float, key_id: str = KEY_ID, secret_key: str = SECRET_KEY, swing_index: SwingIndex = None) -> LiveEngine:
+    '''
+    Trades the Swing Index System on the minute bars of `stocklist`. Today's bars are downloaded once to bring the
+    indicators up to date, then every new bar from Alpaca's websocket is processed as it arrives (see `LiveEngine`),
+    rather than re-downloading the session every minute. Runs until interrupted.
 
-    # Global position variable
-    position = Initial()
+    Returns:
+        - the engine, holding the closed positions and the per-bar latency
+    '''
+    capital_manager = CapitalManager(total_capital, .6, .15)
+    engine = LiveEngine(capital_manager, swing_index if swing_index is not None else SwingIndex(stocklist), Broker())
+    engine.warm_up(get_data_bars_1m(stocklist))
     print('run_checker started')
-    entry_point = entry_sar = sar = trailing_sar = 0
-    while True:
-
-        # Check if Monday-Friday
-        if datetime.datetime.now(tz).weekday() >= 0 and datetime.datetime.now(tz).weekday() <= 4:
-            print('Trading day')
-
-            # Check if it is time to conduct pre-trade calculations
-            if datetime.datetime.now(tz).time() > datetime.time(9, 00) and datetime.datetime.now(tz).time() <= datetime.time(9, 30):
-                print("Pre-Trade Calculations")
-
-                # If we are in an initial position, find our entry point and entry sar
-                if isinstance(position, Initial):
-                    sar = trailing_sar = 0 # invalid
-                    entry_point, entry_sar = position.initial_to_long(df)
-
-                # If we are in a long position, find our SAR and trailing SAR
-                elif isinstance(position, Long):
-                    entry_point = entry_sar = 0 # invalid
-                    sar = position.new_sar(df)
-                    trailing_sar = position.trailing_sar(df)
-
-            # Check if it is time to carry out orders
-            if datetime.datetime.now(tz).time() > datetime.time(9, 30) and datetime.datetime.now(tz).time() <= datetime.time(15, 30):
-                
-                # get today's 1m bars
-                today_bars_1m = get_data_bars_1m(df)
-
-                # If we are in an initial position, check to see if we should initiate a position
-                if isinstance(position, Initial):
-                    pass
-
-                # If we are in a long position, check to see if we should reverse our position
-                elif isinstance(position, Long):
-                    # get current price
-                    pass
-                
-                # we run in cycles
-                time.sleep(60)
-            else:
-                # Get time amount until open, sleep that amount
-                print('Market closed ({})'.format(datetime.datetime.now(tz)))
-                print('Sleeping', round(time_to_open(datetime.datetime.now(tz))/60/60, 2), 'hours')
-                time.sleep(time_to_open(datetime.datetime.now(tz)))
-        else:
-            # If not trading day, find out how much until open, sleep that amount
-            print('Market closed ({})'.format(datetime.datetime.now(tz)))
-            print('Sleeping', round(time_to_open(datetime.datetime.now(tz))/60/60, 2), 'hours')
-            time.sleep(time_to_open(datetime.datetime.now(tz)))
-'''
 
+    source = AlpacaBarStream(key_id, secret_key, stocklist).start()
+    try:
+        for asset, timestamp, bar in source:
+            closed = engine.on_bar(asset, timestamp, bar)
+            if closed is not None:
+                print('{} {} closed, P/L {}'.format(pd.Timestamp(timestamp, tz="UTC").tz_convert(tz), asset, closed.profits_losses))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+    print('Latency per bar: mean {:.6f}s, max {:.6f}s'.format(engine.latency.mean, engine.latency.maximum))
+    return engine
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+class Universe:
+
+    '''
+    Persisted index of the tradable universe: one row per symbol of `list_of_securities.csv`, with the asset metadata
+    from Alpaca ('tradable,' 'shortable') and the bars available in the bar store ('first_bar,' 'last_bar,' 'n_bars').
+    It is built once with `build()` (the only step that needs the network) and saved, so sampling assets and
+    filtering those with data in a date range are lookups in memory.
+
+     - securities : dataframe with one row per symbol, as saved by `save()`
+    '''
+    def __init__(self, securities: pd.DataFrame):
+        self.__securities = securities.reset_index(drop=True)
+        self.__rows = {symbol: row for row, symbol in enumerate(self.__securities["symbol"])}
+        self.__tradable = np.array(self.__securities["tradable"], dtype=bool)
+        # naive UTC, so the availability can be compared without any timezone handling
+        self.__first_bar = np.array(pd.to_datetime(self.__securities["first_bar"], utc=True).dt.tz_localize(None), dtype="datetime64[ns]")
+        self.__last_bar = np.array(pd.to_datetime(self.__securities["last_bar"], utc=True).dt.tz_localize(None), dtype="datetime64[ns]")
+        self.__n_bars = np.array(self.__securities["n_bars"], dtype=np.int64)
+
+    @classmethod
+    def build(cls, securities_file: str, assets: list = None, bar_store=None, timeframe=None, start_date: pd.Timestamp = None,
+              end_date: pd.Timestamp = None) -> "Universe":
+        '''
+        Builds the index from the list of securities.
+
+        Parameters:
+            - securities_file : csv with a 'Ticker,' 'Name,' and 'Exchange' column (see `list_of_securities.csv`)
+            - assets          : asset metadata, as returned by `api.list_assets(status='active')`. Symbols without an
+                                active asset are marked as not tradable. By default every symbol is tradable.
+            - bar_store       : `BarStore` the availability of each symbol is read from (none is recorded by default)
+            - timeframe       : timeframe of the bars in `bar_store`
+            - start_date, end_date : when given, the bars of every tradable symbol between them are fetched into
+                                `bar_store` first (only what is missing is downloaded), so the availability is that of
+                                the data source rather than of whatever happened to be cached
+        '''
+        # tickers such as "NA" are not missing values
+        securities = pd.read_csv(securities_file, keep_default_na=False, na_values=[""])
+        securities = securities.rename(columns={"Ticker": "symbol", "Name": "name", "Exchange": "exchange"})
+        securities = securities.dropna(subset=["symbol"]).drop_duplicates(subset=["symbol"])
+
+        if assets is None:
+            securities["tradable"] = True
+            securities["shortable"] = True
+        else:
+            metadata = {asset.symbol: asset for asset in assets}
+            securities["tradable"] = [symbol in metadata and bool(metadata[symbol].tradable) for symbol in securities["symbol"]]
+            securities["shortable"] = [symbol in metadata and bool(getattr(metadata[symbol], "shortable", False)) for symbol in securities["symbol"]]
+
+        universe = cls(securities.assign(first_bar=pd.NaT, last_bar=pd.NaT, n_bars=0))
+        if bar_store is not None:
+            if start_date is not None and end_date is not None:
+                bar_store.prefetch(universe.symbols(), start_date, end_date, timeframe)
+            universe.refresh(bar_store, timeframe)
+        return universe
+
+    @classmethod
+    def load(cls, path: str) -> "Universe":
+        return cls(pd.read_csv(path, keep_default_na=False, na_values=[""]))
+
+    def save(self, path: str) -> None:
+        self.to_frame().to_csv(path, index=False)
+
+    def to_frame(self) -> pd.DataFrame:
+        securities = self.__securities.copy()
+        securities["first_bar"] = pd.to_datetime(self.__first_bar, utc=True)
+        securities["last_bar"] = pd.to_datetime(self.__last_bar, utc=True)
+        securities["n_bars"] = self.__n_bars
+        return securities
+
+    def refresh(self, bar_store, timeframe, symbols: list = None) -> None:
+        '''
+        Records the bars `bar_store` holds for `symbols` (by default, every symbol of the universe).
+        '''
+        for symbol in (self.__securities["symbol"] if symbols is None else symbols):
+            if symbol not in self.__rows:
+                continue
+            row = self.__rows[symbol]
+            first, last, n_bars = bar_store.availability(symbol, timeframe)
+            self.__first_bar[row] = np.datetime64("NaT") if first is None else first.tz_convert(None).to_datetime64()
+            self.__last_bar[row] = np.datetime64("NaT") if last is None else last.tz_convert(None).to_datetime64()
+            self.__n_bars[row] = n_bars
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.__rows
+
+    def __len__(self) -> int:
+        return len(self.__rows)
+
+    def availability(self, symbol: str) -> tuple:
+        '''
+        Returns:
+            - first and last bar of `symbol` (NaT if none is recorded), and its number of bars
+        '''
+        row = self.__rows[symbol]
+        return pd.Timestamp(self.__first_bar[row], tz="UTC"), pd.Timestamp(self.__last_bar[row], tz="UTC"), int(self.__n_bars[row])
+
+    def symbols(self, start_date: pd.Timestamp = None, end_date: pd.Timestamp = None, tradable=True, min_bars=0) -> list:
+        '''
+        Returns:
+            - symbols of the universe (the tradable ones by default). With `start_date` and `end_date`, only those
+              with bars between them are kept; with `min_bars`, only those with at least that many bars in the store.
+        '''
+        return list(self.__securities["symbol"].to_numpy()[self.__mask(start_date, end_date, tradable, min_bars)])
+
+    def sample(self, n: int, start_date: pd.Timestamp = None, end_date: pd.Timestamp = None, seed=None, tradable=True, min_bars=0) -> list:
+        '''
+        Randomly samples `n` symbols (all of them if there are fewer) among `symbols(start_date, end_date, tradable, min_bars)`.
+
+        Parameters:
+            - seed : seed or `np.random.Generator` of the sampling, so a backtest can be run again on the same assets
+        '''
+        candidates = self.__securities["symbol"].to_numpy()[self.__mask(start_date, end_date, tradable, min_bars)]
+        rng = np.random.default_rng(seed)
+        return list(rng.choice(candidates, size=min(n, len(candidates)), replace=False))
+
+    def __mask(self, start_date, end_date, tradable, min_bars) -> np.ndarray:
+        mask = self.__n_bars >= min_bars
+        if tradable:
+            mask &= self.__tradable
+        # NaT comparisons are False, so symbols without recorded bars never have data in a range
+        if end_date is not None:
+            mask &= self.__first_bar <= self.__to_datetime64(end_date)
+        if start_date is not None:
+            mask &= self.__last_bar >= self.__to_datetime64(start_date)
+        return mask
+
+    def __to_datetime64(self, timestamp) -> np.datetime64:
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+        return timestamp.to_datetime64()